@@ -12,6 +12,7 @@ from .data_handler import DataHandler
 from .query_runner import QueryRunner
 from .intent_classifier import IntentClassifier
 from .prompt_enhancer import PromptEnhancer
+from .registry import AgentRegistry, get_agent_registry
 
 
 __all__ = [
@@ -19,4 +20,6 @@ __all__ = [
     'QueryRunner', 
     'IntentClassifier',
     'PromptEnhancer',
+    'AgentRegistry',
+    'get_agent_registry',
 ]
\ No newline at end of file
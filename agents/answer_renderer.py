@@ -0,0 +1,250 @@
+'''
+answer_renderer.py
+'''
+import logging
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Any, List, Optional
+from agents.sql_compiler import CompiledQuery
+
+logger = logging.getLogger(__name__)
+
+MONEY_KEYWORDS = ['amount', 'total', 'sum', 'spent', 'income', 'expense', 'planned', 'actual', 'budget', 'net', 'balance', 'average']
+COUNT_KEYWORDS = ['count', 'number']
+TEXT_LABELS = {
+    'display_name': 'name',
+    'business_name': 'business name',
+    'role_name': 'role',
+    'email': 'email',
+    'admin_display_name': 'admin',
+    'admin_user_email': "admin's email",
+    'admin_email': "admin's email",
+    'occupation': 'occupation',
+}
+MAX_LISTED = 10
+
+
+def _is_money_column(column: str) -> bool:
+    column = column.lower()
+    return any(keyword in column for keyword in MONEY_KEYWORDS) and not _is_count_column(column)
+
+
+def _is_count_column(column: str) -> bool:
+    return any(keyword in column.lower() for keyword in COUNT_KEYWORDS)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def _money(value: Any) -> str:
+    amount = float(value)
+    return f"-${abs(amount):,.2f}" if amount < 0 else f"${amount:,.2f}"
+
+
+def _format_value(column: str, value: Any) -> str:
+    if value is None:
+        return "none"
+    if isinstance(value, datetime):
+        return value.strftime('%b %d, %Y') if value.time() == datetime.min.time() else value.strftime('%b %d, %Y %H:%M')
+    if isinstance(value, date):
+        return value.strftime('%b %d, %Y')
+    if _is_number(value):
+        if _is_money_column(column):
+            return _money(value)
+        if _is_count_column(column) or float(value) == int(value):
+            return f"{int(value):,}"
+        return f"{float(value):,.2f}"
+    return str(value)
+
+
+def _humanize(column: str) -> str:
+    return TEXT_LABELS.get(column.lower(), column.replace('_', ' '))
+
+
+def _month_label(value: Any) -> str:
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%B %Y')
+    return str(value)
+
+
+def _context(compiled: Optional[CompiledQuery]) -> str:
+    """' on Food & Dining last month' style suffix for compiled questions"""
+    if compiled is None:
+        return ""
+    parts = []
+    if compiled.category:
+        parts.append(f"{'from' if compiled.kind == 'income' else 'on'} {compiled.category}")
+    if compiled.period:
+        parts.append(compiled.period)
+    return (" " + " ".join(parts)) if parts else ""
+
+
+def _subject(question: str, compiled: Optional[CompiledQuery]) -> str:
+    kind = compiled.kind if compiled else None
+    question = question.lower()
+    if kind == 'expense' or (kind is None and any(word in question for word in ['spent', 'spend', 'expense', 'cost'])):
+        return 'expense'
+    if kind == 'income' or (kind is None and any(word in question for word in ['income', 'earned', 'earn', 'revenue'])):
+        return 'income'
+    if kind is None and 'budget' in question:
+        return 'budget'
+    return 'other'
+
+
+class AnswerRenderer:
+    """
+    Template-based answers for query results.
+
+    Results are recognized from their column names (and the compiled shape,
+    when the SQL came from the compiler); anything that does not fit a
+    template returns None so the caller can ask the LLM instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rendered = 0
+        self.deferred = 0
+
+    def render(self, question: str, raw_data: Dict[str, Any], compiled: Optional[CompiledQuery] = None) -> Optional[str]:
+        try:
+            answer = self._render(question, raw_data.get("columns", []), raw_data.get("data", []), compiled,
+                                  truncated=raw_data.get("truncated", False))
+        except Exception as e:
+            logger.warning(f"Answer rendering failed, deferring to LLM: {e}")
+            answer = None
+
+        with self._lock:
+            if answer is None:
+                self.deferred += 1
+            else:
+                self.rendered += 1
+        return answer
+
+    def _render(self, question: str, columns: List[str], data: List[Any], compiled: Optional[CompiledQuery],
+                truncated: bool = False) -> Optional[str]:
+        subject = _subject(question, compiled)
+        context = _context(compiled)
+
+        if not columns:
+            return None
+
+        if not data:
+            noun = {'expense': 'expenses', 'income': 'income', 'budget': 'budget information'}.get(subject, 'records')
+            return f"No {noun} found{context}."
+
+        if len(data) == 1:
+            row = dict(zip(columns, data[0]))
+            if len(columns) == 1:
+                return self._render_scalar(columns[0], data[0][0], subject, context)
+            return self._render_single_row(row, subject, context)
+
+        return self._render_rows(columns, data, subject, context, compiled, truncated)
+
+    def _render_scalar(self, column: str, value: Any, subject: str, context: str) -> Optional[str]:
+        if value is None:
+            if _is_money_column(column):
+                noun = {'expense': 'expenses', 'income': 'income'}.get(subject, 'matching transactions')
+                return f"No {noun} found{context}."
+            return f"No {_humanize(column)} found."
+
+        if _is_count_column(column) and _is_number(value):
+            count = int(value)
+            return f"You have {count:,} transaction{'s' if count != 1 else ''}{context}."
+
+        if _is_number(value) and _is_money_column(column):
+            if subject == 'expense':
+                return f"You spent {_money(abs(float(value)))}{context}."
+            if subject == 'income':
+                return f"Your income was {_money(abs(float(value)))}{context}."
+            if subject == 'budget':
+                return f"Your budget is {_money(value)}{context}."
+            return f"The total is {_money(value)}{context}."
+
+        if isinstance(value, str):
+            return f"Your {_humanize(column)} is {value}."
+
+        return None
+
+    def _render_single_row(self, row: Dict[str, Any], subject: str, context: str) -> Optional[str]:
+        if {'total_income', 'total_expenses', 'net_amount'} <= set(row):
+            return (f"Income{context}: {_money(row['total_income'] or 0)}, expenses: {_money(row['total_expenses'] or 0)}, "
+                    f"net: {_money(row['net_amount'] or 0)}.")
+
+        if 'average_amount' in row:
+            if row['average_amount'] is None:
+                return f"No transactions found{context}."
+            count = int(row.get('transaction_count') or 0)
+            noun = {'expense': 'expense', 'income': 'income'}.get(subject, 'transaction')
+            return f"Your average {noun} was {_money(row['average_amount'])} across {count:,} transaction{'s' if count != 1 else ''}{context}."
+
+        if len(row) > 6:
+            return None
+        details = ", ".join(f"{_humanize(column)}: {_format_value(column, value)}" for column, value in row.items())
+        return f"{details[0].upper()}{details[1:]}."
+
+    def _render_rows(self, columns: List[str], data: List[Any], subject: str, context: str,
+                     compiled: Optional[CompiledQuery], truncated: bool = False) -> Optional[str]:
+        rows = [dict(zip(columns, row)) for row in data]
+        shown = rows[:MAX_LISTED]
+        more = f" and {len(rows) - MAX_LISTED} more" if len(rows) > MAX_LISTED else ""
+        if truncated:
+            # The fetch stopped at the row cap, so only a lower bound is known
+            more = f" and more than {len(rows) - len(shown)} more" if len(rows) > len(shown) else " and more"
+
+        if 'category_name' in columns and 'total_amount' in columns:
+            noun = {'expense': 'Spending', 'income': 'Income'}.get(subject, 'Totals')
+            items = ", ".join(f"{row['category_name']} {_money(row['total_amount'])}" for row in shown)
+            return f"{noun} by category{context}: {items}{more}."
+
+        if 'month' in columns and ('total_amount' in columns or 'net_amount' in columns):
+            if 'net_amount' in columns:
+                items = "; ".join(
+                    f"{_month_label(row['month'])}: income {_money(row['total_income'] or 0)}, "
+                    f"expenses {_money(row['total_expenses'] or 0)}, net {_money(row['net_amount'] or 0)}"
+                    for row in shown
+                )
+            else:
+                items = "; ".join(f"{_month_label(row['month'])}: {_money(row['total_amount'])}" for row in shown)
+            return f"{items}{more}."
+
+        if 'amount' in columns and 'created_at' in columns:
+            lines = []
+            for row in shown:
+                line = f"- {_format_value('created_at', row['created_at'])}: {_money(row['amount'])}"
+                if row.get('category_name'):
+                    line += f" ({row['category_name']})"
+                lines.append(line)
+            if more:
+                lines.append(f"...{more}")
+            noun = {'expense': 'expenses', 'income': 'income transactions'}.get(subject, 'transactions')
+            return f"Your {noun}{context}:\n" + "\n".join(lines)
+
+        if len(columns) == 1:
+            values = [_format_value(columns[0], row[columns[0]]) for row in shown if row[columns[0]] is not None]
+            if not values:
+                return None
+            return f"Found: {', '.join(values)}{more}."
+
+        # Small tables read fine as one line per row; anything wider is left to the LLM
+        if len(columns) <= 4:
+            lines = ["- " + ", ".join(f"{_humanize(column)}: {_format_value(column, row[column])}" for column in columns)
+                     for row in shown]
+            if more:
+                lines.append(f"...{more}")
+            return "\n".join(lines)
+
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.rendered + self.deferred
+            return {
+                "rendered": self.rendered,
+                "deferred_to_llm": self.deferred,
+                "render_rate": round(self.rendered / total, 3) if total else 0.0,
+            }
+
+
+answer_renderer = AnswerRenderer()
@@ -0,0 +1,105 @@
+'''
+chat_history.py
+'''
+import base64
+import json
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import select, tuple_
+from agents.chat_log import llmlogs
+
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(timestamp: datetime, log_id: int) -> str:
+    """Opaque cursor for the (timestamp, id) position of one llmlogs row"""
+    raw = json.dumps([timestamp.isoformat(), log_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError for anything it did not produce"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, log_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except Exception as e:
+        raise ValueError(f"Invalid history cursor: {cursor!r}") from e
+
+
+def _position():
+    # Row-value comparison, so Postgres uses it as a bound on the (timestamp, id) index columns
+    return tuple_(llmlogs.c.timestamp, llmlogs.c.id)
+
+
+def fetch_history_page(conn, user_id: int, limit: int = 50, session_id: Optional[str] = None,
+                       before: Optional[str] = None, after: Optional[str] = None) -> Dict[str, Any]:
+    """
+    One page of a user's chat turns, newest first.
+
+    Without a cursor this is the latest `limit` turns. `before` pages back
+    to older turns and `after` forward to newer ones; pass the page's
+    before_cursor / after_cursor. has_more says whether another page exists
+    in the direction being read. `conn` is a Connection or Session.
+
+    Each page is an index range scan on llmlogs(user_id[, session_id],
+    timestamp, id) that stops after limit + 1 rows, so its cost does not
+    grow with the length of the history. Rows without a timestamp have no
+    position and are not listed.
+    """
+    if before and after:
+        raise ValueError("Pass either before or after, not both")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    query = select(
+        llmlogs.c.id, llmlogs.c.session_id, llmlogs.c.prompt, llmlogs.c.response, llmlogs.c.timestamp
+    ).where(llmlogs.c.user_id == user_id, llmlogs.c.timestamp.is_not(None))
+    if session_id:
+        query = query.where(llmlogs.c.session_id == session_id)
+
+    if after:
+        # Read forward from the cursor, then flip so the page is still newest first
+        query = query.where(_position() > tuple_(*decode_cursor(after))).order_by(llmlogs.c.timestamp.asc(), llmlogs.c.id.asc())
+    else:
+        if before:
+            query = query.where(_position() < tuple_(*decode_cursor(before)))
+        query = query.order_by(llmlogs.c.timestamp.desc(), llmlogs.c.id.desc())
+
+    rows = conn.execute(query.limit(limit + 1)).mappings().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after:
+        rows = rows[::-1]
+
+    turns = [dict(row) for row in rows]
+    return {
+        "turns": turns,
+        "has_more": has_more,
+        "before_cursor": encode_cursor(turns[-1]["timestamp"], turns[-1]["id"]) if turns else before,
+        "after_cursor": encode_cursor(turns[0]["timestamp"], turns[0]["id"]) if turns else after,
+    }
+
+
+def as_messages(turns: List[Dict[str, Any]], id_prefix: str = "") -> List[Dict[str, Any]]:
+    """
+    Flatten turns into the chat UI's user/agent messages, oldest first.
+
+    Both messages of a turn share its timestamp; ids are `user_{id}` and
+    `agent_{id}` after an optional prefix.
+    """
+    messages = []
+    for turn in reversed(turns):
+        timestamp = turn["timestamp"].isoformat() if turn["timestamp"] else ""
+        messages.append({
+            "id": f"user_{id_prefix}{turn['id']}",
+            "role": "user",
+            "content": turn["prompt"],
+            "timestamp": timestamp
+        })
+        messages.append({
+            "id": f"agent_{id_prefix}{turn['id']}",
+            "role": "agent",
+            "content": turn["response"],
+            "timestamp": timestamp
+        })
+    return messages
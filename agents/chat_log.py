@@ -0,0 +1,224 @@
+'''
+chat_log.py
+'''
+import atexit
+import contextvars
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional
+from sqlalchemy import Column, Index, Integer, MetaData, String, Table, Text, TIMESTAMP, insert, text
+from sqlalchemy.exc import IntegrityError
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+llmlogs = Table(
+    "llmlogs", MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, nullable=False),
+    Column("session_id", String(100)),
+    Column("prompt", Text),
+    Column("response", Text),
+    Column("timestamp", TIMESTAMP),
+    # History pages (agents.chat_history) for one session and across all of a user's sessions
+    Index("ix_llmlogs_user_session_timestamp_id", "user_id", "session_id", "timestamp", "id"),
+    Index("ix_llmlogs_user_timestamp_id", "user_id", "timestamp", "id"),
+)
+
+# Seeds that insert explicit ids leave the serial behind; point it past MAX(id)
+RESYNC_SEQUENCE = """
+    SELECT setval(pg_get_serial_sequence('llmlogs', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM llmlogs
+"""
+
+_in_turn: contextvars.ContextVar = contextvars.ContextVar("chat_turn", default=False)
+
+
+@contextmanager
+def chat_turn():
+    """
+    Mark a chat turn whose caller logs it once when it finishes.
+
+    Agent-side log_interaction calls made inside the block are dropped, so a
+    turn is one llmlogs row instead of two.
+    """
+    token = _in_turn.set(True)
+    try:
+        yield
+    finally:
+        _in_turn.reset(token)
+
+
+def iter_in_turn(iterator: Iterator):
+    """chat_turn for generators whose steps run on different worker threads"""
+    try:
+        while True:
+            with chat_turn():
+                try:
+                    item = next(iterator)
+                except StopIteration as stop:
+                    return stop.value
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+class ChatLogSink:
+    """
+    Queues llmlogs rows and writes them from a background thread.
+
+    Rows are inserted in batches of up to batch_size, one multi-row INSERT
+    per batch, at least every flush_seconds. The queue holds at most
+    max_queue rows; beyond that the oldest are dropped and counted. close()
+    (run at shutdown) flushes what is left.
+    """
+
+    def __init__(self, engine=None, batch_size: int = 100, flush_seconds: float = 1.0, max_queue: int = 10000):
+        self._engine = engine
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue: deque = deque()
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.deduplicated = 0
+        self.failed_batches = 0
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from backend.database.connection import engine
+            self._engine = engine
+        return self._engine
+
+    def submit(self, user_id: int, prompt: str, response: str, session_id: Optional[str] = None,
+               source: str = "router"):
+        """Queue one row; returns immediately"""
+        row = {
+            "user_id": user_id,
+            "session_id": session_id,
+            "prompt": prompt,
+            "response": response,
+            "timestamp": datetime.utcnow(),
+        }
+        with self._cond:
+            if source == "agent" and _in_turn.get():
+                self.deduplicated += 1
+                return
+            closed = self._closed
+            if not closed:
+                self._enqueue(row)
+        if closed:
+            # After shutdown there is no flusher left; write inline rather than lose the row
+            self._write([row])
+
+    def _enqueue(self, row: Dict[str, Any]):
+        if len(self._queue) >= self.max_queue:
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append(row)
+        self.submitted += 1
+        self._ensure_thread()
+        if len(self._queue) >= self.batch_size:
+            self._cond.notify()
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="chat-log-sink", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # A partial batch goes out after flush_seconds
+                self._cond.wait_for(lambda: len(self._queue) >= self.batch_size or self._closed, self.flush_seconds)
+                batch = self._take()
+                closed = self._closed
+            if batch:
+                self._write(batch)
+            elif closed:
+                return
+
+    def _take(self) -> List[Dict[str, Any]]:
+        count = min(len(self._queue), self.batch_size)
+        return [self._queue.popleft() for _ in range(count)]
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        for attempt in range(2):
+            try:
+                with self.engine.begin() as conn:
+                    # executemany of one INSERT is sent as multi-row VALUES batches
+                    conn.execute(insert(llmlogs), batch)
+                with self._cond:
+                    self.written += len(batch)
+                return
+            except IntegrityError as e:
+                if attempt == 0 and "llmlogs_pkey" in str(e) and self.engine.dialect.name == "postgresql":
+                    self._resync_sequence()
+                    continue
+                self._fail(batch, e)
+                return
+            except Exception as e:
+                self._fail(batch, e)
+                return
+
+    def _resync_sequence(self):
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(text(RESYNC_SEQUENCE))
+            logger.info("Resynced llmlogs id sequence")
+        except Exception as e:
+            logger.error(f"Failed to resync llmlogs sequence: {e}")
+
+    def _fail(self, batch: List[Dict[str, Any]], error: Exception):
+        with self._cond:
+            self.failed_batches += 1
+            self.dropped += len(batch)
+        logger.warning(f"Could not write {len(batch)} chat log rows: {error}")
+
+    def flush(self):
+        """Write everything queued so far on the calling thread"""
+        while True:
+            with self._cond:
+                batch = self._take()
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self, timeout: float = 5.0):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "submitted": self.submitted,
+                "written": self.written,
+                "dropped": self.dropped,
+                "deduplicated": self.deduplicated,
+                "failed_batches": self.failed_batches,
+            }
+
+
+chat_log_sink = ChatLogSink(
+    batch_size=settings.CHAT_LOG_BATCH_SIZE,
+    flush_seconds=settings.CHAT_LOG_FLUSH_SECONDS,
+    max_queue=settings.CHAT_LOG_MAX_QUEUE
+)
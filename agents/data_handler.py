@@ -1,7 +1,15 @@
+import asyncio
 import logging
-from typing import Dict, Any,List
+import re
+from typing import Dict, Any, List, Optional
 from langchain_ollama import OllamaLLM
 from agents.query_runner import QueryRunner
+from agents.llm_backends import create_llm
+from agents.metrics import invoke_llm, ainvoke_llm
+from agents.pending_store import get_pending_store
+from agents.chat_log import chat_log_sink
+from agents.chat_history import as_messages, fetch_history_page
+from backend.core.reference_data import reference_data
 import json
 from datetime import datetime
 import sys
@@ -66,25 +74,11 @@ logger = logging.getLogger(__name__)
 #tables the user is allowed to modify
 ALLOWED_USER_MOD_TABLES = ['transactions','budgetentries']
 
-class DataHandler:
-    def __init__(self):
-        # Handle different settings types
-        llm_model = getattr(settings, 'LLM_MODEL', None) or os.getenv('LLM_MODEL', 'llama2')
-        self.llm = OllamaLLM(model=llm_model)
-        self.query_runner = QueryRunner()
-        self.pending_deletes = {}  # Store pending delete operations: {user_id: {session_id: delete_info}}
-
-
-    def process_natural_language_create(self, enhanced_query: str, original_user_query: str, user_id: int) -> Dict[str, Any]:
-        """
-        Process natural language to generate INSERT SQL statements
-        """
-        
-        prompt = f"""
+# Static prompt prefixes: identical for every user and request so the model
+# server can reuse their evaluated prefix; the request goes in a short suffix.
+CREATE_PROMPT_PREFIX = """
         Convert this user request into a PostgreSQL INSERT statement.
         
-        USER REQUEST: "{original_user_query}"
-        USER ID: {user_id}
         DATABASE SCHEMA:
         - transactions table: id (INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY), user_id (integer), category_id (integer), amount (numeric), created_at (timestamp)
         - budgetentries table: id (INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY), budget_id (integer), category_id (integer), planned (numeric), user_id (integer)
@@ -97,46 +91,144 @@ class DataHandler:
         4. For transactions: only include user_id, category_id, amount
         5. Expense amounts are NEGATIVE: -75.00
         6. Income amounts are POSITIVE: 200.00
-
-        CATEGORY ID MAPPING:
-        - Dining Out / dinner / restaurant: category_id = 10
-        - Groceries / food shopping: category_id = 4
-        - Freelance income: category_id = 12
-        - Salary income: category_id = 11
-        - Rent: category_id = 2
-        - Utilities: category_id = 3
-        - Transportation: category_id = 5
-        - Entertainment: category_id = 6
-        - Healthcare: category_id = 7
-        - Insurance: category_id = 8
-        - Travel: category_id = 14
-        - Education: category_id = 15
+        7. Take category_id from the CATEGORY IDS list below; the ids in the examples are only illustrations
 
         EXAMPLES:
         User says: "log $75 dinner expense"
-        SQL: INSERT INTO transactions (user_id, category_id, amount) VALUES ({user_id}, 10, -75.00)
+        SQL: INSERT INTO transactions (user_id, category_id, amount) VALUES (:user_id, 10, -75.00)
 
         User says: "add $500 grocery budget"
-        SQL: INSERT INTO budgetentries (user_id, category_id, planned) VALUES ({user_id}, 4, 500.00)
+        SQL: INSERT INTO budgetentries (user_id, category_id, planned) VALUES (:user_id, 4, 500.00)
 
         User says: "record $200 freelance income"
-        SQL: INSERT INTO transactions (user_id, category_id, amount) VALUES ({user_id}, 12, 200.00)
+        SQL: INSERT INTO transactions (user_id, category_id, amount) VALUES (:user_id, 12, 200.00)
 
         User says: "set $5000 vacation savings goal"
-        SQL: INSERT INTO goals (user_id, name, type, target_amount) VALUES ({user_id}, 'Vacation fund', 'savings', 5000.00)
+        SQL: INSERT INTO goals (user_id, name, type, target_amount) VALUES (:user_id, 'Vacation fund', 'savings', 5000.00)
 
         CRITICAL: Output ONLY the SQL statement, nothing else. No explanations, no markdown.
 
-        Generate SQL for: "{original_user_query}"
-        SQL:
+"""
+
+UPDATE_PROMPT_PREFIX = """
+        Convert this to a PostgreSQL UPDATE statement.
+
+        RULES:
+        1. Start with UPDATE table_name
+        2. Use SET column = value
+        3. MUST include: WHERE user_id = :user_id
+        4. Output ONLY the SQL
+        5. Take category_id from the CATEGORY IDS list below; the ids in the examples are only illustrations
+
+        Example: "change grocery budget to $600" → UPDATE budgetentries SET planned = 600.00 WHERE user_id = :user_id AND category_id = 4
+
+"""
+
+DELETE_PROMPT_PREFIX = """
+        Convert this user request into a PostgreSQL DELETE statement.
+
+        DATABASE SCHEMA:
+        - transactions table: id (INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY), user_id (integer), category_id (integer), amount (numeric), created_at (timestamp)
+        
+        IMPORTANT SAFETY RULES:
+        1. ONLY allow DELETE FROM transactions table
+        2. MUST include WHERE user_id = :user_id to ensure user only deletes their own data
+        3. For deleting specific transactions, include transaction ID if mentioned
+        4. For deleting by date, use DATE(created_at) = 'YYYY-MM-DD'
+        5. For deleting by category, include category_id condition
+        6. ALWAYS use LIMIT 1 when deleting single records mentioned in natural language
+        7. Be specific - don't delete all records unless explicitly requested
+        8. Take category_id from the CATEGORY IDS list below; the ids in the examples are only illustrations
+        
+        EXAMPLES:
+        User says: "delete my last transaction"
+        SQL: DELETE FROM transactions WHERE id = (SELECT id FROM transactions ORDER BY created_at DESC LIMIT 1) and user_id = :user_id;
+        
+        User says: "remove the dinner expense from yesterday"
+        SQL: DELETE FROM transactions WHERE user_id = :user_id AND category_id = 10 -- Assuming 10 is the ID for 'dinner' AND created_at >= current_date - INTERVAL '1 day' AND created_at < current_date LIMIT 1;
+
+        
+        User says: "delete transaction with ID 5"
+        SQL: DELETE FROM transactions WHERE user_id = :user_id AND id = 5
+        
+        User says: "remove all grocery expenses from this month"
+        SQL: DELETE FROM transactions WHERE user_id = :user_id AND category_id = 4 AND EXTRACT(MONTH FROM created_at) = EXTRACT(MONTH FROM CURRENT_DATE) AND EXTRACT(YEAR FROM created_at) = EXTRACT(YEAR FROM CURRENT_DATE)
+        
+        User says: "delete the $75 expense I just added"
+        SQL: DELETE FROM transactions WHERE user_id = :user_id AND amount = -75.00 ORDER BY created_at DESC LIMIT 1
+        
+        CRITICAL: Output ONLY the SQL statement, nothing else. No explanations, no markdown.
+        WARNING: Be extremely cautious with DELETE statements. Always include user_id constraint.
+
+"""
+
+# Stands in for the format_category_ids() block when the categories cannot be loaded
+CATEGORY_IDS_UNAVAILABLE = """
+        CATEGORY IDS: unavailable, use NULL for category_id
+"""
+
+PREVIEW_SAMPLE_SIZE = 5
+
+# Largest delete a confirmation can carry out: the preview keeps every matched id up to this
+# many, and confirming deletes exactly those ids. Bigger matches have to be narrowed down.
+DELETE_CONFIRM_MAX_ROWS = 500
+
+# Budget answers come from llm_budget_overview_mv when BUDGET_OVERVIEW_MATERIALIZED is on
+REFRESH_BUDGET_OVERVIEW = "SELECT public.refresh_budget_overview()"
+
+# Everything after the table name: WHERE, and the ORDER BY/LIMIT the model sometimes adds
+DELETE_TAIL = re.compile(r'^\s*DELETE\s+FROM\s+transactions\b(?P<condition>.*?)[\s;]*$', re.IGNORECASE | re.DOTALL)
+
+DELETE_PREVIEW_QUERY = """
+    WITH matched AS (
+        SELECT id, amount, category_id, created_at FROM transactions {condition}
+    ), counted AS (
+        SELECT *, COUNT(*) OVER () AS record_count,
+               ROW_NUMBER() OVER (ORDER BY created_at DESC, id DESC) AS position
+        FROM matched
+    )
+    SELECT id, amount, category_id, created_at, record_count
+    FROM counted
+    WHERE position <= :row_limit
+    ORDER BY position
+"""
+
+
+def format_category_ids(refs) -> str:
+    """CATEGORY IDS block for the create/update/delete prompts, one line per category in id order"""
+    lines = [f"        - {c.name} ({c.kind}): category_id = {c.id}" for c in refs.categories.values()]
+    if not lines:
+        return CATEGORY_IDS_UNAVAILABLE
+    return "\n        CATEGORY IDS:\n" + "\n".join(lines) + "\n"
+
+
+class DataHandler:
+    def __init__(self, llm: Optional[OllamaLLM] = None, query_runner: Optional[QueryRunner] = None,
+                 pending_store=None):
+        if llm is None:
+            # Handle different settings types
+            llm_model = getattr(settings, 'LLM_MODEL', None) or os.getenv('LLM_MODEL', 'llama2')
+            llm = create_llm(llm_model)
+        self.llm = llm
+        self.query_runner = query_runner or QueryRunner(llm=self.llm)
+        # Pending delete confirmations by (user_id, confirmation_id); shared by every DataHandler in the process,
+        # or across workers with PENDING_STORE_BACKEND=sql
+        self.pending_deletes = pending_store or get_pending_store()
+
+
+    def process_natural_language_create(self, enhanced_query: str, original_user_query: str, user_id: int,
+                                        llm_response: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Process natural language to generate INSERT SQL statements
         """
+        prompt = self._create_prompt(original_user_query)
 
         try:
-            sql_query = self.llm.invoke(prompt).strip()
+            sql_query = (llm_response if llm_response is not None else invoke_llm(self.llm, prompt, "create")).strip()
             logger.info(f"Generated SQL: {sql_query}")
             
             # Clean up SQL
-            sql_query = sql_query.replace('```sql', '').replace('```', '').strip()
+            sql_query = self._bind_user_id(sql_query.replace('```sql', '').replace('```', '').strip(), user_id)
             
             # Remove any quotes around SQL
             if sql_query.startswith('"') and sql_query.endswith('"'):
@@ -186,6 +278,7 @@ class DataHandler:
             try:
                 result = self.query_runner.execute_query(sql_query)
                 logger.info(f"SQL executed successfully: {result.get('message', '')}")
+                self._refresh_materialized()
                 
                 # Log interaction
                 self.log_interaction(
@@ -216,35 +309,19 @@ class DataHandler:
                 "message": f"Failed to process request: {str(e)}"
             }
 
-    def process_natural_language_update(self, enhanced_query: str, original_user_query: str, user_id: int) -> Dict[str, Any]:
+    def process_natural_language_update(self, enhanced_query: str, original_user_query: str, user_id: int,
+                                        llm_response: Optional[str] = None) -> Dict[str, Any]:
         """
         Process natural language to generate UPDATE SQL statements
         """
-        prompt = f"""
-        Convert this to a PostgreSQL UPDATE statement.
-
-        USER: "{original_user_query}"
-        USER_ID: {user_id}
-
-        RULES:
-        1. Start with UPDATE table_name
-        2. Use SET column = value
-        3. MUST include: WHERE user_id = {user_id}
-        4. Output ONLY the SQL
-
-        Example: "change grocery budget to $600" → UPDATE budgetentries SET planned = 600.00 WHERE user_id = {user_id} AND category_id = 4
-
-        Generate SQL for: "{original_user_query}"
-
-        SQL:
-        """
+        prompt = self._update_prompt(original_user_query)
 
         try:
-            sql_query = self.llm.invoke(prompt).strip()
+            sql_query = (llm_response if llm_response is not None else invoke_llm(self.llm, prompt, "update")).strip()
             logger.info(f"Generated UPDATE SQL: {sql_query}")
             
             # Clean up
-            sql_query = sql_query.replace('```sql', '').replace('```', '').strip()
+            sql_query = self._bind_user_id(sql_query.replace('```sql', '').replace('```', '').strip(), user_id)
             
             if not sql_query.upper().startswith('UPDATE'):
                 raise ValueError("Must be UPDATE statement")
@@ -266,73 +343,20 @@ class DataHandler:
                 "message": f"Failed to process update request: {str(e)}"
             }
 
-    def process_natural_language_delete(self, enhanced_query: str, original_user_query: str, user_id: int, session_id: str = '') -> Dict[str, Any]:
+    def process_natural_language_delete(self, enhanced_query: str, original_user_query: str, user_id: int, session_id: str = '',
+                                        llm_response: Optional[str] = None) -> Dict[str, Any]:
         """
         Process natural language to generate DELETE SQL statements
         Focus on transaction deletions with strict safety measures
         """
-        prompt = f"""
-        Convert this user request into a PostgreSQL DELETE statement.
-
-        USER REQUEST: "{original_user_query}"
-        USER ID: {user_id}
-        
-        DATABASE SCHEMA:
-        - transactions table: id (INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY), user_id (integer), category_id (integer), amount (numeric), created_at (timestamp)
-        
-        IMPORTANT SAFETY RULES:
-        1. ONLY allow DELETE FROM transactions table
-        2. MUST include WHERE user_id = {user_id} to ensure user only deletes their own data
-        3. For deleting specific transactions, include transaction ID if mentioned
-        4. For deleting by date, use DATE(created_at) = 'YYYY-MM-DD'
-        5. For deleting by category, include category_id condition
-        6. ALWAYS use LIMIT 1 when deleting single records mentioned in natural language
-        7. Be specific - don't delete all records unless explicitly requested
-        
-        CATEGORY ID MAPPING:
-        - Dining Out / dinner / restaurant: category_id = 10
-        - Groceries / food shopping: category_id = 4
-        - Freelance income: category_id = 12
-        - Salary income: category_id = 11
-        - Rent: category_id = 2
-        - Utilities: category_id = 3
-        - Transportation: category_id = 5
-        - Entertainment: category_id = 6
-        - Healthcare: category_id = 7
-        - Insurance: category_id = 8
-        - Travel: category_id = 14
-        - Education: category_id = 15
-
-        EXAMPLES:
-        User says: "delete my last transaction"
-        SQL: DELETE FROM transactions WHERE id = (SELECT id FROM transactions ORDER BY created_at DESC LIMIT 1) and user_id = 1;
-        
-        User says: "remove the dinner expense from yesterday"
-        SQL: DELETE FROM transactions WHERE user_id = {user_id} AND category_id = 10 -- Assuming 10 is the ID for 'dinner' AND created_at >= current_date - INTERVAL '1 day' AND created_at < current_date LIMIT 1;
-
-        
-        User says: "delete transaction with ID 5"
-        SQL: DELETE FROM transactions WHERE user_id = {user_id} AND id = 5
-        
-        User says: "remove all grocery expenses from this month"
-        SQL: DELETE FROM transactions WHERE user_id = {user_id} AND category_id = 4 AND EXTRACT(MONTH FROM created_at) = EXTRACT(MONTH FROM CURRENT_DATE) AND EXTRACT(YEAR FROM created_at) = EXTRACT(YEAR FROM CURRENT_DATE)
-        
-        User says: "delete the $75 expense I just added"
-        SQL: DELETE FROM transactions WHERE user_id = {user_id} AND amount = -75.00 ORDER BY created_at DESC LIMIT 1
-        
-        CRITICAL: Output ONLY the SQL statement, nothing else. No explanations, no markdown.
-        WARNING: Be extremely cautious with DELETE statements. Always include user_id constraint.
-
-        Generate SQL for: "{original_user_query}"
-        SQL:
-        """
+        prompt = self._delete_prompt(original_user_query)
 
         try:
-            sql_query = self.llm.invoke(prompt).strip()
+            sql_query = (llm_response if llm_response is not None else invoke_llm(self.llm, prompt, "delete")).strip()
             logger.info(f"Generated DELETE SQL: {sql_query}")
             
             # Clean SQL
-            sql_query = sql_query.replace('```sql', '').replace('```', '').strip()
+            sql_query = self._bind_user_id(sql_query.replace('```sql', '').replace('```', '').strip(), user_id)
             
             # Remove quotes around SQL
             if sql_query.startswith('"') and sql_query.endswith('"'):
@@ -365,20 +389,14 @@ class DataHandler:
             import uuid
             confirmation_id = str(uuid.uuid4())[:8]
             
-            # Store pending delete
-            if user_id not in self.pending_deletes:
-                self.pending_deletes[user_id] = {}
-            
-            self.pending_deletes[user_id][confirmation_id] = {
+            # Store pending delete; the store drops it after PENDING_DELETE_TTL_SECONDS
+            self.pending_deletes.put(user_id, confirmation_id, {
                 'sql_query': sql_query,
                 'original_query': original_user_query,
                 'preview': preview_info,
                 'created_at': datetime.now(),
                 'session_id': session_id
-            }
-            
-            # Clean up old pending deletes
-            self._cleanup_old_pending_deletes()
+            }, settings.PENDING_DELETE_TTL_SECONDS)
             
             # Return confirmation request
             return {
@@ -397,6 +415,89 @@ class DataHandler:
                 "message": f"Failed to process delete request: {str(e)}"
             }
         
+    async def aprocess_natural_language_create(self, enhanced_query: str, original_user_query: str, user_id: int) -> Dict[str, Any]:
+        """Async variant: awaits the LLM, then validates and writes in a worker thread"""
+        return await self._awith_llm_response(
+            self._create_prompt(original_user_query), "create",
+            self.process_natural_language_create, enhanced_query, original_user_query, user_id
+        )
+
+    async def aprocess_natural_language_update(self, enhanced_query: str, original_user_query: str, user_id: int) -> Dict[str, Any]:
+        """Async variant of process_natural_language_update"""
+        return await self._awith_llm_response(
+            self._update_prompt(original_user_query), "update",
+            self.process_natural_language_update, enhanced_query, original_user_query, user_id
+        )
+
+    async def aprocess_natural_language_delete(self, enhanced_query: str, original_user_query: str, user_id: int, session_id: str = '') -> Dict[str, Any]:
+        """Async variant of process_natural_language_delete"""
+        return await self._awith_llm_response(
+            self._delete_prompt(original_user_query), "delete",
+            self.process_natural_language_delete, enhanced_query, original_user_query, user_id, session_id
+        )
+
+    async def _awith_llm_response(self, prompt: str, stage: str, handler, *args) -> Dict[str, Any]:
+        """
+        Await the LLM for a handler's prompt, then hand the response to the sync handler.
+
+        Validation and the single write are quick, so they run in a thread;
+        only the long LLM wait needs to be async.
+        """
+        try:
+            llm_response = await ainvoke_llm(self.llm, prompt, stage)
+        except Exception as e:
+            logger.error(f"{handler.__name__} failed: {e}")
+            return {
+                "status": "ERROR",
+                "sql": None,
+                "message": f"Failed to process request: {str(e)}"
+            }
+        return await asyncio.to_thread(handler, *args, llm_response=llm_response)
+
+    def _category_ids(self) -> str:
+        """
+        The CATEGORY IDS block, built from the cached categories table. It only
+        changes when categories do, so the prompt prefix stays reusable.
+        """
+        try:
+            from backend.database.connection import engine
+            refs = reference_data.get(engine)
+        except Exception as e:
+            logger.warning(f"Could not load categories for the prompt: {e}")
+            return CATEGORY_IDS_UNAVAILABLE
+        return format_category_ids(refs)
+
+    def _create_prompt(self, original_user_query: str) -> str:
+        return CREATE_PROMPT_PREFIX + self._category_ids() + f"""
+        Generate SQL for: "{original_user_query}"
+        SQL:
+        """
+
+    def _update_prompt(self, original_user_query: str) -> str:
+        return UPDATE_PROMPT_PREFIX + self._category_ids() + f"""
+        Generate SQL for: "{original_user_query}"
+        SQL:
+        """
+
+    def _delete_prompt(self, original_user_query: str) -> str:
+        return DELETE_PROMPT_PREFIX + self._category_ids() + f"""
+        Generate SQL for: "{original_user_query}"
+        SQL:
+        """
+
+    def _refresh_materialized(self):
+        """Bring llm_budget_overview_mv up to date after a write, so the next budget answer sees it"""
+        if not settings.BUDGET_OVERVIEW_MATERIALIZED:
+            return
+        try:
+            self.query_runner.execute_query(REFRESH_BUDGET_OVERVIEW)
+        except Exception as e:
+            logger.warning(f"Could not refresh llm_budget_overview_mv: {e}")
+
+    def _bind_user_id(self, sql_query: str, user_id: int) -> str:
+        """Put the caller's id in place of the :user_id the static prompt examples teach"""
+        return re.sub(r":user_id\b", str(int(user_id)), sql_query)
+
     def confirm_delete(self, user_id: int, confirmation_id: str, confirm: bool = True, session_id: str = '') -> Dict[str, Any]:
         """
         Confirm or cancel a pending delete operation
@@ -411,21 +512,19 @@ class DataHandler:
             Dict with operation result
         """
         try:
-            # Check if user has pending deletes
-            if user_id not in self.pending_deletes or confirmation_id not in self.pending_deletes[user_id]:
+            # Claim the pending delete; with a shared store only one worker gets it
+            delete_info = self.pending_deletes.pop(user_id, confirmation_id)
+            if delete_info is None:
                 return {
                     "status": "ERROR",
                     "message": f"No pending delete found with confirmation ID: {confirmation_id}"
                 }
             
-            delete_info = self.pending_deletes[user_id][confirmation_id]
             sql_query = delete_info['sql_query']
             original_query = delete_info['original_query']
             
             if not confirm:
                 # Cancel delete
-                del self.pending_deletes[user_id][confirmation_id]
-                
                 # Log cancellation
                 self.log_interaction(
                     user_id=user_id,
@@ -439,10 +538,27 @@ class DataHandler:
                     "confirmation_id": confirmation_id
                 }
             
+            # Only ever delete the rows the user was shown, even if matching rows changed since;
+            # never fall back to the generated predicate
+            matched_ids = (delete_info.get('preview') or {}).get('matched_ids')
+            if matched_ids is None:
+                return {
+                    "status": "ERROR",
+                    "sql": sql_query,
+                    "message": (f"Cannot confirm this delete: the matching records could not be listed "
+                                f"(at most {DELETE_CONFIRM_MAX_ROWS} can be deleted at once). Please narrow the request."),
+                    "confirmation_id": confirmation_id
+                }
+            
             # Execute delete
             try:
-                result = self.query_runner.execute_query(sql_query)
+                if matched_ids:
+                    sql_query, params = self._delete_by_ids(user_id, matched_ids)
+                    result = self.query_runner.execute_query_with_params(sql_query, params)
+                else:
+                    result = {"rowcount": 0}
                 logger.info(f"DELETE executed successfully: {result.get('message', '')}")
+                self._refresh_materialized()
                 
                 rowcount = result.get('rowcount', 0)
                 
@@ -453,9 +569,6 @@ class DataHandler:
                     response=f"CONFIRMED and executed DELETE: {sql_query} (Deleted {rowcount} rows)"
                 )
                 
-                # Clean up pending delete
-                del self.pending_deletes[user_id][confirmation_id]
-                
                 if rowcount == 0:
                     message = "No records found to delete with the specified criteria."
                 else:
@@ -472,10 +585,6 @@ class DataHandler:
             except Exception as exec_error:
                 logger.error(f"DELETE execution failed: {exec_error}")
                 
-                # Clean up pending delete even on error
-                if confirmation_id in self.pending_deletes.get(user_id, {}):
-                    del self.pending_deletes[user_id][confirmation_id]
-                
                 return {
                     "status": "ERROR",
                     "sql": sql_query,
@@ -492,7 +601,7 @@ class DataHandler:
 
     def _preview_delete(self, sql_query: str, user_id: int) -> Dict[str, Any]:
         """
-        Preview what will be deleted by running a SELECT first
+        Preview what will be deleted with one bounded SELECT
         
         Args:
             sql_query: The DELETE SQL query
@@ -502,33 +611,30 @@ class DataHandler:
             Dict with preview information
         """
         try:
-            # Convert DELETE to SELECT for preview
-            preview_sql = sql_query.replace('DELETE FROM', 'SELECT * FROM')
+            match = DELETE_TAIL.match(sql_query)
+            if not match:
+                raise ValueError("Not a DELETE FROM transactions statement")
             
-            count_sql = preview_sql
-            if 'LIMIT' in count_sql.upper():
-                count_sql = count_sql[:count_sql.upper().index('LIMIT')].strip()
+            # Total count and every matched row (up to DELETE_CONFIRM_MAX_ROWS) in one round trip;
+            # the newline ends any trailing -- comment
+            preview_sql = DELETE_PREVIEW_QUERY.format(condition=match.group('condition'))
+            preview_result = self.query_runner.execute_read_only(
+                preview_sql, {"row_limit": DELETE_CONFIRM_MAX_ROWS}, max_rows=DELETE_CONFIRM_MAX_ROWS
+            )
             
-            # Add COUNT for total
-            count_sql = f"SELECT COUNT(*) as record_count FROM ({count_sql}) as subquery"
-            
-            # Execute preview queries
-            preview_result = self.query_runner.execute_query(preview_sql)
-            count_result = self.query_runner.execute_query(count_sql)
-            
-            record_count = count_result.get('data', [{}])[0].get('record_count', 0) if count_result.get('data') else 0
+            rows = [dict(zip(preview_result['columns'], row)) for row in preview_result.get('data', [])]
+            record_count = rows[0]['record_count'] if rows else 0
             
             # Get sample records
             sample_records = []
-            if preview_result.get('data'):
-                for i, record in enumerate(preview_result['data'][:5]):
-                    formatted = {
-                        'id': record.get('id'),
-                        'amount': f"${abs(float(record.get('amount', 0))):.2f}",
-                        'category_id': record.get('category_id'),
-                        'created_at': record.get('created_at')
-                    }
-                    sample_records.append(formatted)
+            for record in rows[:PREVIEW_SAMPLE_SIZE]:
+                formatted = {
+                    'id': record['id'],
+                    'amount': f"${abs(float(record['amount'] or 0)):.2f}",
+                    'category_id': record['category_id'],
+                    'created_at': record['created_at']
+                }
+                sample_records.append(formatted)
             
             # Generate human summary
             if record_count == 0:
@@ -538,7 +644,7 @@ class DataHandler:
                 if sample_records:
                     amount = sample_records[0].get('amount', 'unknown')
                     message += f" This is a {amount} transaction."
-            elif record_count <= 5:
+            elif record_count <= PREVIEW_SAMPLE_SIZE:
                 message = f"{record_count} records will be deleted."
                 if sample_records:
                     amounts = [r['amount'] for r in sample_records]
@@ -547,11 +653,15 @@ class DataHandler:
                 message = f"{record_count} records will be deleted."
                 if sample_records:
                     amounts = [r['amount'] for r in sample_records]
-                    message += f" First few: {', '.join(amounts)} and {record_count - 5} more."
+                    message += f" First few: {', '.join(amounts)} and {record_count - len(sample_records)} more."
+                if record_count > DELETE_CONFIRM_MAX_ROWS:
+                    message += f" That is more than {DELETE_CONFIRM_MAX_ROWS} records, so it cannot be confirmed; please narrow the request."
             
             return {
                 'record_count': record_count,
                 'sample_records': sample_records,
+                # Every matched id; confirm deletes exactly these rows. None when there are too many to keep
+                'matched_ids': [r['id'] for r in rows] if record_count <= len(rows) else None,
                 'message': message,
                 'preview_sql': preview_sql
             }
@@ -565,31 +675,17 @@ class DataHandler:
                 'error': str(e)
             }
     
-    def _cleanup_old_pending_deletes(self, max_age_minutes: int = 10):
-        """Clean up pending deletes older than max_age_minutes"""
-        try:
-            from datetime import datetime, timedelta
-            cutoff_time = datetime.now() - timedelta(minutes=max_age_minutes)
-            
-            for user_id in list(self.pending_deletes.keys()):
-                for confirmation_id in list(self.pending_deletes[user_id].keys()):
-                    delete_info = self.pending_deletes[user_id][confirmation_id]
-                    if delete_info['created_at'] < cutoff_time:
-                        del self.pending_deletes[user_id][confirmation_id]
-                        logger.info(f"Cleaned up expired pending delete: {confirmation_id}")
-                
-                # Remove empty user entries
-                if not self.pending_deletes[user_id]:
-                    del self.pending_deletes[user_id]
-                    
-        except Exception as e:
-            logger.error(f"Error cleaning up pending deletes: {e}")
-
-
+    def _delete_by_ids(self, user_id: int, ids: List[int]):
+        placeholders = ", ".join(f":id_{i}" for i in range(len(ids)))
+        params = {f"id_{i}": id_ for i, id_ in enumerate(ids)}
+        params["user_id"] = user_id
+        return f"DELETE FROM transactions WHERE user_id = :user_id AND id IN ({placeholders})", params
+    
     def list_pending_deletes(self, user_id: int) -> Dict[str, Any]:
         """List all pending delete operations for a user"""
         try:
-            if user_id not in self.pending_deletes or not self.pending_deletes[user_id]:
+            pending = self.pending_deletes.list(user_id)
+            if not pending:
                 return {
                     "status": "NO_PENDING",
                     "message": "No pending delete operations.",
@@ -597,7 +693,7 @@ class DataHandler:
                 }
             
             pending_list = []
-            for conf_id, delete_info in self.pending_deletes[user_id].items():
+            for conf_id, delete_info in pending.items():
                 pending_list.append({
                     'confirmation_id': conf_id,
                     'original_query': delete_info['original_query'],
@@ -623,26 +719,24 @@ class DataHandler:
     def cancel_all_pending_deletes(self, user_id: int) -> Dict[str, Any]:
         """Cancel all pending delete operations for a user"""
         try:
-            if user_id not in self.pending_deletes:
+            pending = self.pending_deletes.pop_all(user_id)
+            if not pending:
                 return {
                     "status": "NO_PENDING",
                     "message": "No pending delete operations to cancel.",
                     "cancelled_count": 0
                 }
             
-            cancelled_count = len(self.pending_deletes[user_id])
+            cancelled_count = len(pending)
             
             # Log each cancellation
-            for conf_id, delete_info in self.pending_deletes[user_id].items():
+            for conf_id, delete_info in pending.items():
                 self.log_interaction(
                     user_id=user_id,
                     original_prompt=f"AUTO-CANCELLED: {delete_info['original_query']}",
                     response=f"Cancelled all pending deletes. Included confirmation ID: {conf_id}"
                 )
             
-            # Clear all pending deletes for this user
-            del self.pending_deletes[user_id]
-            
             return {
                 "status": "CANCELLED",
                 "message": f"Cancelled {cancelled_count} pending delete operation(s).",
@@ -658,97 +752,19 @@ class DataHandler:
 
 
     def log_interaction(self, user_id: int, original_prompt: str, response: str):
-        """Log interaction to database with proper escaping and commit"""
-        try:
-            # Use parameterized query
-            sql_query = """
-            INSERT INTO llmlogs (user_id, prompt, response) 
-            VALUES (:user_id, :prompt, :response)
-            """
-            
-            # Execute with parameters
-            params = {
-                'user_id': user_id,
-                'prompt': original_prompt,
-                'response': response
-            }
-            
-            result = self.query_runner.execute_query_with_params(sql_query, params)
-            logger.info(f"Logged interaction for user {user_id}")
-            
-        except Exception as e:
-            logger.warning(f"Could not log interaction: {e}")
-            # Try to fix sequence for duplicate key error
-            if "duplicate key" in str(e) and "llmlogs_pkey" in str(e):
-                self._fix_llmlogs_sequence()
+        """Queue the interaction for the batched llmlogs writer"""
+        # Inside a router chat turn this is a no-op; the router logs the turn itself
+        chat_log_sink.submit(user_id, original_prompt, response, source="agent")
     
-    def _fix_llmlogs_sequence(self):
-        """Fix the llmlogs sequence if it's out of sync"""
+    def get_chat_history(self, user_id: int, limit: int = 50, session_id: Optional[str] = None,
+                         before: Optional[str] = None) -> List[Dict[str, Any]]:
+        """The user's latest `limit` turns (or those older than `before`) as chat messages, oldest first"""
         try:
-            fix_sql = """
-            SELECT setval('llmlogs_id_seq1', 
-                        (SELECT COALESCE(MAX(id), 0) + 1 FROM llmlogs),
-                        false);
-            """
-            self.query_runner.execute_query(fix_sql)
-            logger.info("Fixed llmlogs sequence")
-        except Exception as e:
-            logger.error(f"Failed to fix sequence: {e}")
-    
-    def get_chat_history(self, user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
-   
-        try:
-            # Use parameterized query
-            sql_query = """
-            SELECT id, prompt, response, timestamp 
-            FROM llmlogs 
-            WHERE user_id = :user_id 
-            ORDER BY timestamp ASC 
-            LIMIT :limit
-            """
-            
-            params = {
-                'user_id': user_id,
-                'limit': limit
-            }
-            
-            result = self.query_runner.execute_query_with_params(sql_query, params)
-            
-            # Format data for frontend
-            history = []
-            if result.get("data"):
-                for row in result["data"]:
-                    log_id = row[0]
-                    prompt = row[1]
-                    response = row[2]
-                    timestamp = row[3]
-                    
-                    # Convert timestamp to string for JSON
-                    if hasattr(timestamp, 'isoformat'):
-                        timestamp_str = timestamp.isoformat()
-                    else:
-                        timestamp_str = str(timestamp)
-                    
-                    # 1. User Message
-                    history.append({
-                        "id": f"user_log_{log_id}",
-                        "role": "user",
-                        "content": prompt,
-                        "timestamp": timestamp_str
-                    })
-                    
-                    # 2. Agent Response
-                    history.append({
-                        "id": f"agent_log_{log_id}",
-                        "role": "agent",
-                        "content": response,
-                        "timestamp": timestamp_str
-                    })
-            
-            return history
+            from backend.database.connection import engine
+            with engine.connect() as conn:
+                page = fetch_history_page(conn, user_id, limit=limit, session_id=session_id, before=before)
+            return as_messages(page["turns"], id_prefix="log_")
             
         except Exception as e:
             logger.error(f"Could not retrieve chat history for user {user_id}: {e}")
             return []
-        
-        
\ No newline at end of file
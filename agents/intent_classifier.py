@@ -1,20 +1,61 @@
 # file name: intent_classifier.py (updated version)
+import asyncio
 import logging
 import re
 import json
-from typing import Dict, Any
+import threading
+from typing import Dict, Any, Iterator, Optional, Tuple
 from langchain_ollama import OllamaLLM
 from backend.core.config import settings
 from agents.query_runner import QueryRunner
 from agents.data_handler import DataHandler
+from agents.speculation import Speculation, speculative_enhancer
+from agents.sql_compiler import compile_question
+from agents.llm_backends import create_llm
+from agents.metrics import invoke_llm, ainvoke_llm
+from agents.llm_scheduler import iter_as_user, llm_user
 
 logger = logging.getLogger(__name__)
 
+# Static so the model server can reuse the evaluated prefix; the query goes last
+CLASSIFICATION_PROMPT_PREFIX = """
+        Analyze the user query given at the end and classify its intent for a financial database system.
+        
+        INTENT CATEGORIES:
+        1. VIEW - User wants to see, check, or retrieve existing information
+           Examples: "how much did I spend", "show my expenses", "what is my balance"
+        
+        2. CREATE - User wants to add new records (expenses, income, goals, budgets)
+           Examples: "I spent $60 on shoes", "add $75 dinner expense", "record $200 income"
+                
+        4. DELETE - User wants to remove existing records
+           Examples: "delete my last transaction", "remove the expense from yesterday"
+        
+        IMPORTANT: Queries about spending money or receiving income are ALWAYS CREATE intent.
+        Examples: "I spent $60", "paid $30 for lunch", "got $500" are CREATE.
+        
+        Respond in JSON format with:
+        {
+            "intent": "VIEW|CREATE|UPDATE|DELETE",
+            "confidence": 0.0 to 1.0,
+            "reason": "Brief explanation"
+        }
+        
+        Return ONLY valid JSON, nothing else.
+        
+"""
+
+
 class IntentClassifier:
-    def __init__(self):
-        self.llm = OllamaLLM(model=settings.LLM_MODEL)
-        self.query_runner = QueryRunner()
-        self.data_handler = DataHandler()
+    def __init__(
+        self,
+        llm: Optional[OllamaLLM] = None,
+        query_runner: Optional[QueryRunner] = None,
+        data_handler: Optional[DataHandler] = None
+    ):
+        self.llm = llm or create_llm(settings.LLM_MODEL)
+        self.query_runner = query_runner or QueryRunner(llm=self.llm)
+        self.data_handler = data_handler or DataHandler(llm=self.llm, query_runner=self.query_runner)
         
         # Enhanced keywords for different intents
         self.insert_keywords = [
@@ -54,109 +95,356 @@ class IntentClassifier:
             r'\$?\d+\s+(from)\s+\w+',
             r'(i|I)\s+(earned|made|received|got)\s+\$?\d+'
         ]
+        
+        # Keyword-only answers at or above this confidence skip the LLM round trip
+        self.llm_confidence_threshold = settings.INTENT_LLM_CONFIDENCE_THRESHOLD
+        self._intent_matcher = self._compile_intent_matcher()
+        self._stats_lock = threading.Lock()
+        self.gate_stats = {"classified": 0, "llm_skipped": 0, "llm_called": 0}
 
     def classify_intent(self, user_query: str, user_id: int) -> Dict[str, Any]:
         """
         Classify user intent and route to appropriate handler
         """
+        with llm_user(user_id):
+            return self._classify_intent(user_query, user_id)
+    
+    def _classify_intent(self, user_query: str, user_id: int) -> Dict[str, Any]:
+        keyword_result = self._score_intent(user_query)
+        speculation = self._start_speculation(user_query, keyword_result)
         try:
-            if self._is_spending_or_income_query(user_query):
-                logger.info(f"Detected spending/income pattern in query: '{user_query}'")
+            final_intent, confidence, spending_pattern = self._decide_intent(user_query, keyword_result)
+            
+            if spending_pattern:
                 # Route to CREATE handler
                 handler_result = self.data_handler.process_natural_language_create(
                     enhanced_query=user_query,
                     original_user_query=user_query,
                     user_id=user_id
                 )
-                
-                return {
-                    "intent": "CREATE",
-                    "handler": "data_handler",
-                    "result": handler_result,
-                    "confidence": 0.9,
-                    "original_query": user_query
-                }
-            
-            # 1: Use LLM for primary intent classification
-            intent_result = self._llm_classify_intent(user_query)
+            else:
+                # 3: Route to appropriate handler
+                handler_result = self._route_to_handler(user_query, user_id, final_intent, speculation)
             
-            # 2: Use keyword matching as fallback/verification
-            keyword_intent = self._keyword_classify_intent(user_query)
+            return self._build_response(user_query, final_intent, confidence, handler_result)
             
-            # 3: Resolve conflicts and get final intent
-            final_intent = self._resolve_intent_conflict(intent_result, keyword_intent)
+        except Exception as e:
+            logger.error(f"Intent classification failed: {e}")
+            return self._fallback_response(user_query, user_id)
+        finally:
+            if speculation is not None:
+                speculation.discard()
+    
+    def iter_intent(self, user_query: str, user_id: int) -> Iterator[Tuple[str, Any]]:
+        """
+        Streaming counterpart of classify_intent.
+        
+        Yields ("intent", ...) as soon as the intent is decided, then the
+        QueryRunner stage events and answer tokens for VIEW queries, and
+        finally ("result", response) with the same dict classify_intent returns.
+        """
+        return iter_as_user(user_id, self._iter_intent(user_query, user_id))
+    
+    def _iter_intent(self, user_query: str, user_id: int) -> Iterator[Tuple[str, Any]]:
+        keyword_result = self._score_intent(user_query)
+        speculation = self._start_speculation(user_query, keyword_result)
+        try:
+            final_intent, confidence, spending_pattern = self._decide_intent(user_query, keyword_result)
+            yield "intent", {"intent": final_intent, "confidence": confidence}
             
-            # 4: Route to appropriate handler
-            handler_result = self._route_to_handler(user_query, user_id, final_intent)
+            if final_intent == "VIEW" and not spending_pattern:
+                answer, sql = None, None
+                for event, payload in self.query_runner.iter_natural_language_query(
+                    user_query, user_id, stream_answer=True, speculation=speculation
+                ):
+                    if event == "answer":
+                        answer, sql = payload["answer"], payload["sql"]
+                    else:
+                        yield event, payload
+                handler_result = {
+                    "status": "COMPLETE",
+                    "answer": answer,
+                    "sql": sql,
+                    "message": "Query executed successfully"
+                }
+            elif spending_pattern:
+                handler_result = self.data_handler.process_natural_language_create(
+                    enhanced_query=user_query,
+                    original_user_query=user_query,
+                    user_id=user_id
+                )
+            else:
+                handler_result = self._route_to_handler(user_query, user_id, final_intent)
             
-            return {
-                "intent": final_intent,
-                "handler": "data_handler" if final_intent in ['CREATE', 'UPDATE', 'DELETE'] else "query_runner",
-                "result": handler_result,
-                "confidence": intent_result.get("confidence", 0.7),
-                "original_query": user_query
-            }
+            yield "result", self._build_response(user_query, final_intent, confidence, handler_result)
             
         except Exception as e:
             logger.error(f"Intent classification failed: {e}")
-            return self._fallback_response(user_query, user_id)
+            yield "result", self._fallback_response(user_query, user_id)
+        finally:
+            if speculation is not None:
+                speculation.discard()
     
-    def _is_spending_or_income_query(self, user_query: str) -> bool:
-        """Check if query indicates spending or income (CREATE intent)"""
-        query_lower = user_query.lower()
+    def _start_speculation(self, user_query: str, keyword_result: Dict[str, Any]) -> Optional[Speculation]:
+        """
+        Start enhancing the query while the LLM classifies it.
         
-        # Check for spending patterns
-        for pattern in self.spending_patterns:
-            if re.search(pattern, query_lower):
-                return True
+        Only worth it when classification will actually wait on the LLM and
+        the VIEW path would need the enhancement (compiled questions do not).
+        """
+        if keyword_result["source"] == "spending_pattern" or keyword_result["confidence"] >= self.llm_confidence_threshold:
+            return None
+        if compile_question(user_query) is not None:
+            return None
+        return speculative_enhancer.start(self.query_runner, user_query)
+    
+    def _decide_intent(self, user_query: str, keyword_result: Dict[str, Any]) -> Tuple[str, float, bool]:
+        """Return (intent, confidence, matched_spending_pattern), asking the LLM only when keyword_result is unsure"""
+        
+        if keyword_result["source"] == "spending_pattern":
+            logger.info(f"Detected spending/income pattern in query: '{user_query}'")
+            self._count_gate(llm_called=False)
+            return "CREATE", 0.9, True
+        
+        if keyword_result["confidence"] >= self.llm_confidence_threshold:
+            # 1: Deterministic match is unambiguous, the LLM answer would be discarded anyway
+            final_intent = keyword_result["intent"]
+            confidence = keyword_result["confidence"]
+            self._count_gate(llm_called=False)
+            logger.info(f"Keyword classified intent: {final_intent} (confidence: {confidence}, {keyword_result['source']})")
+            return final_intent, confidence, False
+        
+        # 1: Use LLM for primary intent classification
+        intent_result = self._llm_classify_intent(user_query)
+        self._count_gate(llm_called=True)
+        
+        # 2: Resolve conflicts between LLM and keyword matching
+        final_intent = self._resolve_intent_conflict(intent_result, keyword_result["intent"])
+        return final_intent, intent_result.get("confidence", 0.7), False
+    
+    async def aclassify_intent(self, user_query: str, user_id: int) -> Dict[str, Any]:
+        """Async variant of classify_intent built on ainvoke and the async handlers"""
+        with llm_user(user_id):
+            return await self._aclassify_intent(user_query, user_id)
+    
+    async def _aclassify_intent(self, user_query: str, user_id: int) -> Dict[str, Any]:
+        try:
+            final_intent, confidence, spending_pattern = await self._adecide_intent(user_query)
+            
+            if spending_pattern:
+                handler_result = await self.data_handler.aprocess_natural_language_create(
+                    enhanced_query=user_query,
+                    original_user_query=user_query,
+                    user_id=user_id
+                )
+            else:
+                handler_result = await self._aroute_to_handler(user_query, user_id, final_intent)
+            
+            return self._build_response(user_query, final_intent, confidence, handler_result)
+            
+        except Exception as e:
+            logger.error(f"Intent classification failed: {e}")
+            return await asyncio.to_thread(self._fallback_response, user_query, user_id)
+    
+    async def _adecide_intent(self, user_query: str) -> Tuple[str, float, bool]:
+        """Async variant of _decide_intent"""
+        keyword_result = self._score_intent(user_query)
+        
+        if keyword_result["source"] == "spending_pattern":
+            self._count_gate(llm_called=False)
+            return "CREATE", 0.9, True
+        
+        if keyword_result["confidence"] >= self.llm_confidence_threshold:
+            self._count_gate(llm_called=False)
+            return keyword_result["intent"], keyword_result["confidence"], False
+        
+        intent_result = await self._allm_classify_intent(user_query)
+        self._count_gate(llm_called=True)
+        final_intent = self._resolve_intent_conflict(intent_result, keyword_result["intent"])
+        return final_intent, intent_result.get("confidence", 0.7), False
+    
+    async def _aroute_to_handler(self, user_query: str, user_id: int, intent: str) -> Dict[str, Any]:
+        """Async variant of _route_to_handler"""
+        enhanced_query = self._enhance_for_handler(user_query, intent)
         
-        # Check for income patterns
-        for pattern in self.income_patterns:
-            if re.search(pattern, query_lower):
-                return True
+        if intent == "CREATE":
+            return await self.data_handler.aprocess_natural_language_create(
+                enhanced_query=enhanced_query,
+                original_user_query=self._prepare_create_query(user_query),
+                user_id=user_id
+            )
         
-        if re.search(r'\$?\d+(\.\d{2})?\s+(on|for)', query_lower):
-            return True
+        if intent == "UPDATE":
+            return await self.data_handler.aprocess_natural_language_update(
+                enhanced_query=enhanced_query,
+                original_user_query=user_query,
+                user_id=user_id
+            )
         
-        if re.search(r'^i\s+(spent|bought|paid|cost)\s+', query_lower):
-            return True
+        if intent == "DELETE":
+            return await self.data_handler.aprocess_natural_language_delete(
+                enhanced_query=user_query,
+                original_user_query=user_query,
+                user_id=user_id
+            )
         
-        return False
+        answer, sql = await self.query_runner.aprocess_natural_language_query(
+            user_query=user_query,
+            user_id=user_id
+        )
+        return {
+            "status": "COMPLETE",
+            "answer": answer,
+            "sql": sql,
+            "message": "Query executed successfully"
+        }
+    
+    def _build_response(self, user_query: str, intent: str, confidence: float, handler_result: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "intent": intent,
+            "handler": "data_handler" if intent in ['CREATE', 'UPDATE', 'DELETE'] else "query_runner",
+            "result": handler_result,
+            "confidence": confidence,
+            "original_query": user_query
+        }
+    
+    def _is_spending_or_income_query(self, user_query: str) -> bool:
+        """Check if query indicates spending or income (CREATE intent)"""
+        return "spending_pattern" in self._match_groups(user_query)
 
-    def _llm_classify_intent(self, user_query: str) -> Dict[str, Any]:
-        """Use LLM to classify intent with better prompt and error handling"""
-        prompt = f"""
-        Analyze this user query and classify its intent for a financial database system.
-        
-        USER QUERY: "{user_query}"
+    def _compile_intent_matcher(self) -> re.Pattern:
+        """
+        Compile the keyword lists and spending/income patterns into one regex.
         
-        INTENT CATEGORIES:
-        1. VIEW - User wants to see, check, or retrieve existing information
-           Examples: "how much did I spend", "show my expenses", "what is my balance"
+        Each alternative is a named group so a single finditer pass tells us
+        which intent families a query touches. Multi-word phrases are listed
+        before the single words they start with so they win at a position.
+        Keywords match whole words, allowing simple inflections ("expenses",
+        "deleted"), so "address" is not "add" and "settings" is not "set".
+        """
+        def words(keywords):
+            unique = sorted(set(keywords), key=len, reverse=True)
+            return r'\b(?:' + '|'.join(re.escape(keyword) for keyword in unique) + r')(?:s|es|d|ed|ing)?\b'
         
-        2. CREATE - User wants to add new records (expenses, income, goals, budgets)
-           Examples: "I spent $60 on shoes", "add $75 dinner expense", "record $200 income"
-                
-        4. DELETE - User wants to remove existing records
-           Examples: "delete my last transaction", "remove the expense from yesterday"
+        spending = self.spending_patterns + self.income_patterns + [
+            r'\$?\d+(\.\d{2})?\s+(on|for)',
+            r'^i\s+(spent|bought|paid|cost)\s+',
+        ]
+        groups = [
+            ("spending_pattern", '|'.join(f'(?:{pattern})' for pattern in spending)),
+            ("aggregate", words(['add up', 'total', 'sum'])),
+            ("setup", words(['set up', 'setup'])),
+            ("question", words(['how much', 'what is', 'what was'])),
+            ("delete", words(self.delete_keywords)),
+            ("update", words(self.update_keywords)),
+            ("insert", words(self.insert_keywords)),
+            ("view", words(self.view_keywords)),
+            ("amount", r'\$?\d+(?:\.\d{2})?'),
+        ]
+        return re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in groups))
+
+    def _match_groups(self, user_query: str) -> set:
+        """Names of the matcher groups that occur in the query"""
+        return {match.lastgroup for match in self._intent_matcher.finditer(user_query.lower())}
+
+    def _score_intent(self, user_query: str) -> Dict[str, Any]:
+        """
+        Deterministic first-stage classification with a self-reported confidence.
         
-        IMPORTANT: Queries about spending money or receiving income are ALWAYS CREATE intent.
-        Examples: "I spent $60", "paid $30 for lunch", "got $500" are CREATE.
+        Confidence is high when exactly one intent family is present and drops
+        as families compete; the fallbacks for keyword-free text stay low so
+        those queries still go to the LLM.
+        """
+        query_lower = user_query.lower().strip()
+        hits = self._match_groups(query_lower)
+        
+        if "spending_pattern" in hits:
+            return {"intent": "CREATE", "confidence": 0.95, "source": "spending_pattern"}
+        
+        families = set()
+        if "delete" in hits:
+            families.add("DELETE")
+        if "update" in hits:
+            families.add("UPDATE")
+        if hits & {"insert", "setup"}:
+            families.add("CREATE")
+        if hits & {"view", "aggregate", "question"}:
+            families.add("VIEW")
+        confidence = {1: 0.9, 2: 0.65}.get(len(families), 0.5)
+        
+        if "delete" in hits:
+            return {"intent": "DELETE", "confidence": confidence, "source": "keywords"}
+        
+        if "update" in hits:
+            if "setup" in hits:
+                return {"intent": "CREATE", "confidence": min(confidence, 0.65), "source": "keywords"}
+            return {"intent": "UPDATE", "confidence": confidence, "source": "keywords"}
+        
+        if families == {"CREATE", "VIEW"} and "amount" not in hits:
+            # "what is my income", "how much did the purchase cost": nouns shared with CREATE
+            if "aggregate" in hits or query_lower.startswith(('what', 'how', 'where', 'when', 'who', 'which')):
+                return {"intent": "VIEW", "confidence": 0.85, "source": "keywords"}
+        
+        if "CREATE" in families:
+            if "aggregate" in hits:
+                return {"intent": "VIEW", "confidence": confidence, "source": "keywords"}
+            return {"intent": "CREATE", "confidence": confidence, "source": "keywords"}
+        
+        if "VIEW" in families:
+            return {"intent": "VIEW", "confidence": confidence, "source": "keywords"}
+        
+        if "amount" in hits:
+            return {"intent": "CREATE", "confidence": 0.6, "source": "amount"}
         
-        Respond in JSON format with:
-        {{
-            "intent": "VIEW|CREATE|UPDATE|DELETE",
-            "confidence": 0.0 to 1.0,
-            "reason": "Brief explanation"
-        }}
+        if query_lower.endswith('?') or 'can you' in query_lower or 'could you' in query_lower:
+            return {"intent": "VIEW", "confidence": 0.6, "source": "question_form"}
         
-        Return ONLY valid JSON, nothing else.
+        # Statements more likely to be CREATE
+        if '.' in query_lower or len(query_lower.split()) <= 10:
+            return {"intent": "CREATE", "confidence": 0.4, "source": "default"}
         
+        return {"intent": "VIEW", "confidence": 0.3, "source": "default"}
+
+    def _count_gate(self, llm_called: bool):
+        with self._stats_lock:
+            self.gate_stats["classified"] += 1
+            self.gate_stats["llm_called" if llm_called else "llm_skipped"] += 1
+
+    def gating_stats(self) -> Dict[str, Any]:
+        """How often the deterministic stage made the LLM classification unnecessary"""
+        with self._stats_lock:
+            stats = dict(self.gate_stats)
+        stats["llm_skip_rate"] = round(stats["llm_skipped"] / stats["classified"], 3) if stats["classified"] else 0.0
+        stats["confidence_threshold"] = self.llm_confidence_threshold
+        return stats
+
+    def _llm_classify_intent(self, user_query: str) -> Dict[str, Any]:
+        """Use LLM to classify intent with better prompt and error handling"""
+        try:
+            response = invoke_llm(self.llm, self._classification_prompt(user_query), "classify").strip()
+        except Exception as e:
+            logger.warning(f"LLM classification failed: {e}")
+            return {"intent": "VIEW", "confidence": 0.3, "reason": f"LLM error: {str(e)}"}
+        return self._parse_llm_classification(response)
+
+    async def _allm_classify_intent(self, user_query: str) -> Dict[str, Any]:
+        """Async variant of _llm_classify_intent"""
+        try:
+            response = (await ainvoke_llm(self.llm, self._classification_prompt(user_query), "classify")).strip()
+        except Exception as e:
+            logger.warning(f"LLM classification failed: {e}")
+            return {"intent": "VIEW", "confidence": 0.3, "reason": f"LLM error: {str(e)}"}
+        return self._parse_llm_classification(response)
+
+    def _classification_prompt(self, user_query: str) -> str:
+        return CLASSIFICATION_PROMPT_PREFIX + f"""
+        USER QUERY: "{user_query}"
+
         Response:
         """
-        
+
+    def _parse_llm_classification(self, response: str) -> Dict[str, Any]:
         try:
-            response = self.llm.invoke(prompt).strip()
             logger.debug(f"LLM raw response: {response}")
             
             # Clean and parse JSON
@@ -204,45 +492,7 @@ class IntentClassifier:
 
     def _keyword_classify_intent(self, user_query: str) -> str:
         """Classify intent using enhanced keyword matching"""
-        query_lower = user_query.lower()
-        
-        if self._is_spending_or_income_query(user_query):
-            return "CREATE"
-        
-        # Check for action keywords
-        if any(keyword in query_lower for keyword in self.delete_keywords):
-            return "DELETE"
-        
-        if any(keyword in query_lower for keyword in self.update_keywords):
-            if 'set up' in query_lower or 'setup' in query_lower:
-                return "CREATE"
-            return "UPDATE"
-        
-        if any(keyword in query_lower for keyword in self.insert_keywords):
-            if 'add up' in query_lower or 'total' in query_lower or 'sum' in query_lower:
-                return "VIEW"
-            return "CREATE"
-        
-        if any(keyword in query_lower for keyword in self.view_keywords):
-            return "VIEW"
-        
-        if re.search(r'\$?\d+(\.\d{2})?', query_lower):
-            if any(word in query_lower for word in ['how much', 'what is', 'what was']):
-                return "VIEW"
-            return "CREATE"
-        
-        # Default to VIEW for questions
-        if any(query_lower.startswith(word) for word in ['what', 'how', 'where', 'when', 'who', 'which']):
-            return "VIEW"
-        
-        if query_lower.endswith('?') or 'can you' in query_lower or 'could you' in query_lower:
-            return "VIEW"
-        
-        # Statements more likely to be CREATE
-        if '.' in query_lower or query_lower.endswith('.') or len(query_lower.split()) <= 10:
-            return "CREATE"
-        
-        return "VIEW"  # Default fallback
+        return self._score_intent(user_query)["intent"]
 
     def _resolve_intent_conflict(self, llm_result: Dict[str, Any], keyword_intent: str) -> str:
         """Resolve conflicts between LLM and keyword classification"""
@@ -264,7 +514,8 @@ class IntentClassifier:
         
         return keyword_intent
 
-    def _route_to_handler(self, user_query: str, user_id: int, intent: str) -> Dict[str, Any]:
+    def _route_to_handler(self, user_query: str, user_id: int, intent: str,
+                          speculation: Optional[Speculation] = None) -> Dict[str, Any]:
         """Route the query to appropriate handler with improved CREATE handling"""
         
         # Enhanced query for better understanding
@@ -291,7 +542,8 @@ class IntentClassifier:
         else:  
             answer, sql = self.query_runner.process_natural_language_query(
                 user_query=user_query,
-                user_id=user_id
+                user_id=user_id,
+                speculation=speculation
             )
             
             return {
@@ -427,5 +679,6 @@ class IntentClassifier:
 
 
 def get_intent_classifier() -> IntentClassifier:
-    """Get a singleton instance of IntentClassifier"""
-    return IntentClassifier()
\ No newline at end of file
+    """Get the process-wide IntentClassifier from the agent registry"""
+    from agents.registry import get_agent_registry
+    return get_agent_registry().intent_classifier
\ No newline at end of file
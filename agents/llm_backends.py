@@ -0,0 +1,224 @@
+'''
+llm_backends.py
+'''
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("ollama", "record", "replay", "fake")
+
+
+def prompt_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+def _chunks(text: str) -> List[str]:
+    """Split a response into word-sized pieces the way a streaming model would send it"""
+    return re.findall(r"\S+\s*|\s+", text) or [""]
+
+
+class RecordingLLM:
+    """
+    Passes calls through to a real LLM and appends each prompt/response pair,
+    with its wall time, to a JSONL file that ReplayLLM can serve later.
+    """
+
+    def __init__(self, inner, path: str):
+        self.inner = inner
+        self.model = getattr(inner, "model", "unknown")
+        self.path = path
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    def invoke(self, prompt: str) -> str:
+        start = time.perf_counter()
+        response = self.inner.invoke(prompt)
+        self._record(prompt, response, start)
+        return response
+
+    async def ainvoke(self, prompt: str) -> str:
+        start = time.perf_counter()
+        response = await self.inner.ainvoke(prompt)
+        self._record(prompt, response, start)
+        return response
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        start = time.perf_counter()
+        chunks = []
+        for chunk in self.inner.stream(prompt):
+            chunks.append(chunk)
+            yield chunk
+        self._record(prompt, "".join(chunks), start)
+
+    def _record(self, prompt: str, response: str, start: float):
+        entry = {
+            "key": prompt_key(self.model, prompt),
+            "model": self.model,
+            "prompt": prompt,
+            "response": response,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            self.recorded += 1
+
+
+class ReplayLLM:
+    """
+    Serves responses recorded by RecordingLLM, keyed by model and exact prompt.
+
+    Each call sleeps for latency_ms (or the recorded wall time when
+    use_recorded_timing is set) so pipeline benchmarks see a steady,
+    repeatable model. Prompts that were never recorded raise LookupError,
+    unless a fallback LLM is given.
+    """
+
+    def __init__(self, path: str, model: str = "replay", latency_ms: float = 0.0,
+                 use_recorded_timing: bool = False, fallback=None):
+        self.model = model
+        self.latency_ms = latency_ms
+        self.use_recorded_timing = use_recorded_timing
+        self.fallback = fallback
+        self._responses: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load(path)
+
+    def _load(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                # Later recordings of the same prompt win
+                self._responses[entry["key"]] = (entry["response"], entry.get("elapsed_ms", 0.0))
+        logger.info(f"Loaded {len(self._responses)} recorded LLM responses from {path}")
+
+    def _lookup(self, prompt: str) -> Tuple[Optional[str], float]:
+        recorded = self._responses.get(prompt_key(self.model, prompt))
+        with self._lock:
+            if recorded is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if recorded is None:
+            if self.fallback is None:
+                raise LookupError(f"No recorded response for prompt {prompt_key(self.model, prompt)[:12]}")
+            return None, self.latency_ms
+        response, elapsed_ms = recorded
+        return response, elapsed_ms if self.use_recorded_timing else self.latency_ms
+
+    def invoke(self, prompt: str) -> str:
+        response, delay_ms = self._lookup(prompt)
+        if response is None:
+            return self.fallback.invoke(prompt)
+        time.sleep(delay_ms / 1000)
+        return response
+
+    async def ainvoke(self, prompt: str) -> str:
+        response, delay_ms = self._lookup(prompt)
+        if response is None:
+            return await self.fallback.ainvoke(prompt)
+        await asyncio.sleep(delay_ms / 1000)
+        return response
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        # All of the delay goes before the first chunk, like prompt evaluation on a real model
+        yield from _chunks(self.invoke(prompt))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"recorded_prompts": len(self._responses), "hits": self.hits, "misses": self.misses}
+
+
+class FakeLLM:
+    """
+    Scripted stand-in that answers each pipeline prompt from its shape.
+
+    Good enough to drive a VIEW question end to end with no model server:
+    intent JSON for classification, the question itself for enhancement, a
+    SUM over llm_transaction_summary for SQL generation and a fixed sentence
+    for everything else.
+    """
+
+    def __init__(self, model: str = "fake", latency_ms: float = 0.0):
+        self.model = model
+        self.latency_ms = latency_ms
+
+    def respond(self, prompt: str) -> str:
+        if "classify its intent" in prompt:
+            query = self._quoted(prompt, "USER QUERY") or ""
+            return json.dumps({"intent": self._intent(query.lower()), "confidence": 0.9, "reason": "scripted"})
+        if "enhancing a financial query" in prompt:
+            return self._quoted(prompt, "USER QUESTION") or ""
+        if "SQL query generator" in prompt:
+            return "SELECT SUM(amount) AS total_spent FROM llm_transaction_summary WHERE user_id = :user_id AND amount < 0"
+        if "Answer with ONLY: YES or NO" in prompt:
+            return "YES"
+        return "Here is what I found in your records."
+
+    @staticmethod
+    def _quoted(prompt: str, label: str) -> Optional[str]:
+        match = re.search(rf'{label}:\s*"(.*?)"', prompt, re.DOTALL)
+        return match.group(1) if match else None
+
+    @staticmethod
+    def _intent(query: str) -> str:
+        if any(word in query for word in ["delete", "remove"]):
+            return "DELETE"
+        if any(word in query for word in ["change", "update", "edit"]):
+            return "UPDATE"
+        if re.search(r"\b(add|record|spent|paid|got)\b.*\$?\d", query):
+            return "CREATE"
+        return "VIEW"
+
+    def invoke(self, prompt: str) -> str:
+        time.sleep(self.latency_ms / 1000)
+        return self.respond(prompt)
+
+    async def ainvoke(self, prompt: str) -> str:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self.respond(prompt)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        yield from _chunks(self.invoke(prompt))
+
+
+def create_llm(model: Optional[str] = None, backend: Optional[str] = None):
+    """
+    Build the LLM client for LLM_BACKEND:
+
+    - ollama: the model server (default)
+    - record: the model server, recording every call to LLM_RECORDING_PATH
+    - replay: recorded responses from LLM_RECORDING_PATH, LLM_REPLAY_LATENCY_MS each
+    - fake: scripted FakeLLM, LLM_REPLAY_LATENCY_MS each
+    """
+    model = model or settings.LLM_MODEL
+    backend = (backend or settings.LLM_BACKEND).lower()
+
+    if backend == "ollama":
+        from langchain_ollama import OllamaLLM
+        # Keeping the model loaded keeps the server's cache of the static prompt prefixes warm
+        return OllamaLLM(model=model, keep_alive=settings.LLM_KEEP_ALIVE or None)
+    if backend == "record":
+        return RecordingLLM(create_llm(model, "ollama"), settings.LLM_RECORDING_PATH)
+    if backend == "replay":
+        return ReplayLLM(
+            settings.LLM_RECORDING_PATH,
+            model=model,
+            latency_ms=settings.LLM_REPLAY_LATENCY_MS,
+            use_recorded_timing=settings.LLM_REPLAY_RECORDED_TIMING
+        )
+    if backend == "fake":
+        return FakeLLM(model=model, latency_ms=settings.LLM_REPLAY_LATENCY_MS)
+    raise ValueError(f"Unknown LLM_BACKEND '{backend}', expected one of {', '.join(BACKENDS)}")
@@ -0,0 +1,252 @@
+'''
+llm_scheduler.py
+'''
+import asyncio
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Any, Iterator, List, Optional
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first: finish chats already in progress before starting new ones
+STAGE_PRIORITIES = {
+    "answer": 0,
+    "answer_retry": 0,
+    "validate": 0,
+    "sql_gen": 1,
+    "create": 1,
+    "update": 1,
+    "delete": 1,
+    "enhance": 2,
+    "classify": 3,
+    "warm_up": 4,
+}
+DEFAULT_PRIORITY = 2
+
+_current_user: contextvars.ContextVar = contextvars.ContextVar("llm_user", default=None)
+
+
+class LLMOverloadedError(BaseException):
+    """
+    Raised when an LLM call is shed because the queue is full or the wait ran out.
+
+    Derives from BaseException, like asyncio.CancelledError, so the agents'
+    catch-all fallbacks do not swallow it and retry the pipeline; the router
+    turns it into a 503.
+    """
+
+    def __init__(self, stage: str, reason: str):
+        super().__init__(f"LLM call for stage '{stage}' shed: {reason}")
+        self.stage = stage
+        self.reason = reason
+
+
+@contextmanager
+def llm_user(user_id: Optional[int]):
+    """Attribute LLM calls made inside the block to a user, for fair queueing"""
+    token = _current_user.set(user_id)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+
+def iter_as_user(user_id: Optional[int], iterator: Iterator):
+    """
+    llm_user for generators.
+
+    Each next() of a streaming response can run on a different worker thread
+    with a fresh context, so the user is set around every step instead of once.
+    """
+    try:
+        while True:
+            with llm_user(user_id):
+                try:
+                    item = next(iterator)
+                except StopIteration as stop:
+                    return stop.value
+            yield item
+    finally:
+        # A client that disconnects mid-stream closes us; release the inner pipeline's slots now, not at GC
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+class _Waiter:
+    __slots__ = ("stage", "priority", "user", "seq", "granted", "event", "future", "loop")
+
+    def __init__(self, stage: str, user, seq: int):
+        self.stage = stage
+        self.priority = STAGE_PRIORITIES.get(stage, DEFAULT_PRIORITY)
+        self.user = user
+        self.seq = seq
+        self.granted = False
+        self.event: Optional[threading.Event] = None
+        self.future: Optional[asyncio.Future] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LLMScheduler:
+    """
+    Bounds the LLM calls in flight to the model server.
+
+    Calls beyond LLM_MAX_IN_FLIGHT wait in a queue ordered by stage priority,
+    then by how many calls the same user already has in flight, then by
+    arrival. A call is shed with LLMOverloadedError when LLM_MAX_QUEUE calls
+    are already waiting or it waited longer than LLM_QUEUE_TIMEOUT_SECONDS.
+    A max_in_flight of 0 disables scheduling.
+    """
+
+    def __init__(self, max_in_flight: int = 4, max_queue: int = 64, queue_timeout_seconds: float = 30.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._waiters: List[_Waiter] = []
+        self._in_flight_by_user: Counter = Counter()
+        self.in_flight = 0
+        self.granted = 0
+        self.queued = 0
+        self.shed: Counter = Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_in_flight > 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    @contextmanager
+    def slot(self, stage: str) -> Iterator[float]:
+        """Hold one in-flight slot for a blocking call; yields the seconds spent queueing"""
+        if not self.enabled:
+            yield 0.0
+            return
+
+        start = time.perf_counter()
+        user = _current_user.get()
+        waiter = self._admit(stage, user, is_async=False)
+        if waiter is not None:
+            waiter.event.wait(self.queue_timeout_seconds)
+            self._settle(waiter)
+        try:
+            yield time.perf_counter() - start
+        finally:
+            self._release(user)
+
+    @asynccontextmanager
+    async def aslot(self, stage: str):
+        """Async variant of slot; waiting does not block the event loop"""
+        if not self.enabled:
+            yield 0.0
+            return
+
+        start = time.perf_counter()
+        user = _current_user.get()
+        waiter = self._admit(stage, user, is_async=True)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(waiter.future, self.queue_timeout_seconds)
+            except asyncio.TimeoutError:
+                pass
+            except BaseException:
+                # Cancelled while queued (client went away): give back a slot granted in the meantime
+                if self._abandon(waiter):
+                    self._release(user)
+                raise
+            self._settle(waiter)
+        try:
+            yield time.perf_counter() - start
+        finally:
+            self._release(user)
+
+    def _admit(self, stage: str, user, is_async: bool) -> Optional[_Waiter]:
+        """Take a slot now (returns None) or join the queue (returns the waiter)"""
+        with self._lock:
+            if self.in_flight < self.max_in_flight and not self._waiters:
+                self._grant(user)
+                return None
+            if len(self._waiters) >= self.max_queue:
+                self.shed["queue_full"] += 1
+                raise LLMOverloadedError(stage, "queue_full")
+
+            waiter = _Waiter(stage, user, next(self._seq))
+            if is_async:
+                waiter.loop = asyncio.get_running_loop()
+                waiter.future = waiter.loop.create_future()
+            else:
+                waiter.event = threading.Event()
+            self._waiters.append(waiter)
+            self.queued += 1
+            return waiter
+
+    def _settle(self, waiter: _Waiter):
+        """After a wait: keep the granted slot, or leave the queue and shed"""
+        if self._abandon(waiter):
+            return
+        with self._lock:
+            self.shed["timeout"] += 1
+        raise LLMOverloadedError(waiter.stage, "timeout")
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Remove a waiter from the queue; True if it had already been granted a slot"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def _grant(self, user):
+        self.in_flight += 1
+        self._in_flight_by_user[user] += 1
+        self.granted += 1
+
+    def _release(self, user):
+        with self._lock:
+            self.in_flight -= 1
+            self._in_flight_by_user[user] -= 1
+            if self._in_flight_by_user[user] <= 0:
+                del self._in_flight_by_user[user]
+
+            while self._waiters and self.in_flight < self.max_in_flight:
+                waiter = min(self._waiters, key=lambda w: (w.priority, self._in_flight_by_user[w.user], w.seq))
+                self._waiters.remove(waiter)
+                waiter.granted = True
+                self._grant(waiter.user)
+                if waiter.event is not None:
+                    waiter.event.set()
+                else:
+                    waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queue_depth": len(self._waiters),
+                "granted": self.granted,
+                "queued": self.queued,
+                "shed": dict(self.shed),
+            }
+
+
+llm_scheduler = LLMScheduler(
+    max_in_flight=settings.LLM_MAX_IN_FLIGHT,
+    max_queue=settings.LLM_MAX_QUEUE,
+    queue_timeout_seconds=settings.LLM_QUEUE_TIMEOUT_SECONDS
+)
@@ -0,0 +1,235 @@
+'''
+metrics.py
+'''
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+from agents.prompt_builder import estimate_tokens
+from agents.llm_scheduler import LLMOverloadedError, llm_scheduler
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+WINDOW_SIZE = 2048
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Summary:
+    """count/sum over all time plus quantiles over a sliding window of recent observations"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.window = deque(maxlen=WINDOW_SIZE)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.window.append(value)
+
+    def quantiles(self) -> List[Tuple[float, float]]:
+        ordered = sorted(self.window)
+        if not ordered:
+            return [(q, float("nan")) for q in QUANTILES]
+        return [(q, ordered[min(len(ordered) - 1, int(q * len(ordered)))]) for q in QUANTILES]
+
+
+class MetricsRegistry:
+    """
+    In-process counters and summaries for the chat pipeline.
+
+    Rendered in the Prometheus text exposition format by render_prometheus().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._summaries: Dict[str, Dict[LabelKey, _Summary]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def register_gauge(self, name: str, read: Callable[[], float]):
+        """A gauge whose value is read when metrics are rendered"""
+        self._gauges[name] = read
+
+    def observe(self, name: str, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._summaries.setdefault(name, {})
+            summary = series.get(key)
+            if summary is None:
+                summary = series[key] = _Summary()
+            summary.observe(value)
+
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name in sorted(self._summaries):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} summary")
+                for key, summary in sorted(self._summaries[name].items()):
+                    for quantile, value in summary.quantiles():
+                        lines.append(f"{name}{_format_labels(key, ('quantile', str(quantile)))} {value}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {summary.total}")
+                    lines.append(f"{name}_count{_format_labels(key)} {summary.count}")
+            for name in sorted(self._counters):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name in sorted(self._gauges):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {self._gauges[name]()}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """p50/p95/p99 and counts per series, for JSON status endpoints"""
+        with self._lock:
+            return {
+                name: {
+                    ",".join(f"{label}={value}" for label, value in key) or "all": {
+                        "count": summary.count,
+                        **{f"p{int(q * 100)}": round(value, 4) for q, value in summary.quantiles()},
+                    }
+                    for key, summary in series.items()
+                }
+                for name, series in self._summaries.items()
+            }
+
+
+metrics = MetricsRegistry()
+metrics.describe("chat_llm_call_seconds", "Wall time of one LLM call by pipeline stage and model")
+metrics.describe("chat_llm_prompt_chars", "Prompt size in characters by stage")
+metrics.describe("chat_llm_prompt_tokens", "Estimated prompt tokens by stage")
+metrics.describe("chat_llm_response_chars", "Response size in characters by stage")
+metrics.describe("chat_llm_first_token_seconds", "Time to the first streamed token by stage and model")
+metrics.describe("chat_llm_errors_total", "LLM calls that raised, by stage and model")
+metrics.describe("chat_llm_queue_wait_seconds", "Time an LLM call waited for a scheduler slot, by stage")
+metrics.describe("chat_llm_shed_total", "LLM calls shed by the scheduler, by stage and reason")
+metrics.describe("chat_llm_in_flight", "LLM calls currently running against the model server")
+metrics.describe("chat_llm_queue_depth", "LLM calls waiting for a scheduler slot")
+metrics.register_gauge("chat_llm_in_flight", lambda: llm_scheduler.in_flight)
+metrics.register_gauge("chat_llm_queue_depth", lambda: llm_scheduler.queue_depth)
+metrics.describe("chat_db_query_seconds", "Wall time of one database round trip by operation")
+metrics.describe("chat_db_errors_total", "Database round trips that raised, by operation")
+
+
+def _model_name(llm) -> str:
+    return str(getattr(llm, "model", None) or type(llm).__name__)
+
+
+def _record_llm(stage: str, model: str, prompt: str, response: Optional[str], start: float, failed: bool):
+    elapsed = time.perf_counter() - start
+    metrics.observe("chat_llm_call_seconds", elapsed, stage=stage, model=model)
+    metrics.observe("chat_llm_prompt_chars", len(prompt), stage=stage)
+    metrics.observe("chat_llm_prompt_tokens", estimate_tokens(prompt), stage=stage)
+    if failed:
+        metrics.inc("chat_llm_errors_total", stage=stage, model=model)
+    else:
+        metrics.observe("chat_llm_response_chars", len(response or ""), stage=stage)
+    logger.debug(f"LLM {stage} on {model}: {elapsed * 1000:.0f} ms, prompt ~{estimate_tokens(prompt)} tokens")
+
+
+@contextmanager
+def _llm_slot(stage: str):
+    try:
+        with llm_scheduler.slot(stage) as waited:
+            metrics.observe("chat_llm_queue_wait_seconds", waited, stage=stage)
+            yield
+    except LLMOverloadedError as e:
+        metrics.inc("chat_llm_shed_total", stage=stage, reason=e.reason)
+        raise
+
+
+@asynccontextmanager
+async def _allm_slot(stage: str):
+    try:
+        async with llm_scheduler.aslot(stage) as waited:
+            metrics.observe("chat_llm_queue_wait_seconds", waited, stage=stage)
+            yield
+    except LLMOverloadedError as e:
+        metrics.inc("chat_llm_shed_total", stage=stage, reason=e.reason)
+        raise
+
+
+def invoke_llm(llm, prompt: str, stage: str) -> str:
+    """llm.invoke through the scheduler, in a timing span tagged with the pipeline stage and model"""
+    with _llm_slot(stage):
+        start = time.perf_counter()
+        response = None
+        try:
+            response = llm.invoke(prompt)
+            return response
+        finally:
+            _record_llm(stage, _model_name(llm), prompt, response, start, failed=response is None)
+
+
+async def ainvoke_llm(llm, prompt: str, stage: str) -> str:
+    """Async variant of invoke_llm"""
+    async with _allm_slot(stage):
+        start = time.perf_counter()
+        response = None
+        try:
+            response = await llm.ainvoke(prompt)
+            return response
+        finally:
+            _record_llm(stage, _model_name(llm), prompt, response, start, failed=response is None)
+
+
+def stream_llm(llm, prompt: str, stage: str) -> Iterator[str]:
+    """llm.stream inside a span that also records time to first token; holds its slot until the stream ends"""
+    with _llm_slot(stage):
+        start = time.perf_counter()
+        chunks = []
+        failed = True
+        try:
+            for chunk in llm.stream(prompt):
+                if not chunks:
+                    metrics.observe("chat_llm_first_token_seconds", time.perf_counter() - start, stage=stage, model=_model_name(llm))
+                chunks.append(chunk)
+                yield chunk
+            failed = False
+        finally:
+            _record_llm(stage, _model_name(llm), prompt, "".join(chunks), start, failed=failed)
+
+
+@contextmanager
+def db_span(operation: str):
+    """Time one database round trip"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        metrics.inc("chat_db_errors_total", operation=operation)
+        raise
+    finally:
+        metrics.observe("chat_db_query_seconds", time.perf_counter() - start, operation=operation)
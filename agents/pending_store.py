@@ -0,0 +1,211 @@
+'''
+pending_store.py
+'''
+import heapq
+import json
+import logging
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import Column, Float, Index, Integer, MetaData, String, Table, Text, create_engine, delete, func, insert, select
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("memory", "sql")
+
+
+class MemoryPendingStore:
+    """
+    Pending operations (delete confirmations) for this process, keyed by
+    (user_id, confirmation_id) and dropped after their TTL.
+
+    Expiry pops a heap ordered by expiry time, so purging costs O(log n) per
+    expired entry instead of a scan. Entries removed early stay in the heap
+    until they surface and are skipped then.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[int, str], Tuple[float, Dict[str, Any]]] = {}
+        self._by_user: Dict[int, Dict[str, None]] = {}
+        self._expiry: List[Tuple[float, int, str]] = []
+
+    def put(self, user_id: int, confirmation_id: str, info: Dict[str, Any], ttl_seconds: float):
+        expires_at = time.time() + ttl_seconds
+        with self._lock:
+            self._purge(time.time())
+            self._entries[(user_id, confirmation_id)] = (expires_at, info)
+            self._by_user.setdefault(user_id, {})[confirmation_id] = None
+            heapq.heappush(self._expiry, (expires_at, user_id, confirmation_id))
+
+    def get(self, user_id: int, confirmation_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._purge(time.time())
+            entry = self._entries.get((user_id, confirmation_id))
+            return entry[1] if entry else None
+
+    def pop(self, user_id: int, confirmation_id: str) -> Optional[Dict[str, Any]]:
+        """Remove and return an entry; only one caller gets it"""
+        with self._lock:
+            self._purge(time.time())
+            entry = self._remove(user_id, confirmation_id)
+            return entry[1] if entry else None
+
+    def list(self, user_id: int) -> Dict[str, Dict[str, Any]]:
+        """The user's live entries, oldest first"""
+        with self._lock:
+            self._purge(time.time())
+            return {cid: self._entries[(user_id, cid)][1] for cid in self._by_user.get(user_id, {})}
+
+    def pop_all(self, user_id: int) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            self._purge(time.time())
+            return {cid: self._remove(user_id, cid)[1] for cid in list(self._by_user.get(user_id, {}))}
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._purge(time.time())
+
+    def _remove(self, user_id: int, confirmation_id: str):
+        entry = self._entries.pop((user_id, confirmation_id), None)
+        if entry is not None:
+            user_entries = self._by_user[user_id]
+            del user_entries[confirmation_id]
+            if not user_entries:
+                del self._by_user[user_id]
+        return entry
+
+    def _purge(self, now: float) -> int:
+        purged = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, user_id, confirmation_id = heapq.heappop(self._expiry)
+            entry = self._entries.get((user_id, confirmation_id))
+            # Skip heap entries for confirmations already popped (or re-put with a later expiry)
+            if entry is not None and entry[0] == expires_at:
+                self._remove(user_id, confirmation_id)
+                purged += 1
+                logger.info(f"Cleaned up expired pending operation: {confirmation_id}")
+        return purged
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": "memory", "pending": len(self._entries), "heap_size": len(self._expiry)}
+
+
+class SQLPendingStore:
+    """
+    Pending operations in a SQLite or Postgres table, shared by every worker
+    that points at the same database.
+
+    Expiry deletes through an index on expires_at, and pop is a single
+    DELETE ... RETURNING, so two workers can never both claim a confirmation.
+    Entries are stored as JSON; datetimes come back as ISO strings.
+    """
+
+    def __init__(self, url: str, table_name: str = "pending_operations"):
+        self.engine = create_engine(url, pool_pre_ping=True)
+        metadata = MetaData()
+        self.table = Table(
+            table_name, metadata,
+            Column("user_id", Integer, primary_key=True),
+            Column("confirmation_id", String(64), primary_key=True),
+            Column("payload", Text, nullable=False),
+            Column("created_at", Float, nullable=False),
+            Column("expires_at", Float, nullable=False),
+            Index(f"ix_{table_name}_expires_at", "expires_at"),
+        )
+        metadata.create_all(self.engine, checkfirst=True)
+
+    def put(self, user_id: int, confirmation_id: str, info: Dict[str, Any], ttl_seconds: float):
+        now = time.time()
+        with self.engine.begin() as conn:
+            self._purge(conn, now)
+            conn.execute(insert(self.table).values(
+                user_id=user_id,
+                confirmation_id=confirmation_id,
+                payload=json.dumps(info, default=str),
+                created_at=now,
+                expires_at=now + ttl_seconds,
+            ))
+
+    def get(self, user_id: int, confirmation_id: str) -> Optional[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            payload = conn.execute(
+                select(self.table.c.payload).where(*self._live(user_id, time.time()),
+                                                   self.table.c.confirmation_id == confirmation_id)
+            ).scalar()
+        return json.loads(payload) if payload is not None else None
+
+    def pop(self, user_id: int, confirmation_id: str) -> Optional[Dict[str, Any]]:
+        with self.engine.begin() as conn:
+            payload = conn.execute(
+                delete(self.table)
+                .where(*self._live(user_id, time.time()), self.table.c.confirmation_id == confirmation_id)
+                .returning(self.table.c.payload)
+            ).scalar()
+        return json.loads(payload) if payload is not None else None
+
+    def list(self, user_id: int) -> Dict[str, Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(self.table.c.confirmation_id, self.table.c.payload)
+                .where(*self._live(user_id, time.time()))
+                .order_by(self.table.c.created_at)
+            ).all()
+        return {cid: json.loads(payload) for cid, payload in rows}
+
+    def pop_all(self, user_id: int) -> Dict[str, Dict[str, Any]]:
+        with self.engine.begin() as conn:
+            rows = conn.execute(
+                delete(self.table)
+                .where(*self._live(user_id, time.time()))
+                .returning(self.table.c.confirmation_id, self.table.c.payload)
+            ).all()
+        return {cid: json.loads(payload) for cid, payload in rows}
+
+    def purge_expired(self) -> int:
+        with self.engine.begin() as conn:
+            return self._purge(conn, time.time())
+
+    def _live(self, user_id: int, now: float):
+        return self.table.c.user_id == user_id, self.table.c.expires_at > now
+
+    def _purge(self, conn, now: float) -> int:
+        return conn.execute(delete(self.table).where(self.table.c.expires_at <= now)).rowcount or 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self.engine.connect() as conn:
+            pending = conn.execute(
+                select(func.count()).select_from(self.table).where(self.table.c.expires_at > time.time())
+            ).scalar()
+        return {"backend": "sql", "pending": pending}
+
+
+def create_pending_store(backend: Optional[str] = None, url: Optional[str] = None):
+    """
+    Build the store for PENDING_STORE_BACKEND:
+
+    - memory: this process only (default)
+    - sql: a table in PENDING_STORE_URL, or DATABASE_URL when that is empty
+    """
+    backend = (backend or settings.PENDING_STORE_BACKEND).lower()
+    if backend == "memory":
+        return MemoryPendingStore()
+    if backend == "sql":
+        return SQLPendingStore(url or settings.PENDING_STORE_URL or settings.DATABASE_URL)
+    raise ValueError(f"Unknown PENDING_STORE_BACKEND '{backend}', expected one of {', '.join(BACKENDS)}")
+
+
+_pending_store = None
+_pending_store_lock = threading.Lock()
+
+
+def get_pending_store():
+    """The process-wide store, so every DataHandler sees the same confirmations"""
+    global _pending_store
+    if _pending_store is None:
+        with _pending_store_lock:
+            if _pending_store is None:
+                _pending_store = create_pending_store()
+    return _pending_store
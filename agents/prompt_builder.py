@@ -0,0 +1,185 @@
+'''
+prompt_builder.py
+'''
+import logging
+import re
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Roughly four characters per token for English prose and SQL identifiers;
+# close enough to budget a prompt without shipping the model's tokenizer.
+CHARS_PER_TOKEN = 4
+
+# Words a user would type for a view that do not appear in its column names
+VIEW_KEYWORDS = {
+    'llm_transaction_summary': [
+        'spend', 'spent', 'spending', 'expense', 'expenses', 'cost', 'paid', 'pay', 'income', 'earn', 'earned',
+        'revenue', 'transaction', 'transactions', 'purchase', 'purchases', 'money', 'salary', 'food', 'groceries',
+        'rent', 'housing', 'transport', 'gas', 'utilities', 'entertainment', 'freelance', 'investment', 'dividends',
+        'category', 'categories', 'month', 'week', 'year', 'today', 'yesterday', 'latest', 'recent', 'last', 'total',
+    ],
+    'llm_budget_overview': ['budget', 'budgets', 'budgeted', 'planned', 'plan', 'over', 'under', 'limit', 'remaining', 'left'],
+    'llm_financial_overview': ['budget', 'performance', 'doing', 'overview', 'summary', 'compare', 'versus', 'vs'],
+    'llm_user_profile': [
+        'name', 'who', 'role', 'admin', 'business', 'company', 'occupation', 'job', 'profile', 'account', 'email',
+    ],
+    'llm_business_hierarchy': [
+        'who', 'work', 'works', 'team', 'employees', 'employee', 'staff', 'under', 'report', 'reports', 'manager',
+        'admin', 'members', 'subusers',
+    ],
+}
+
+# Per-view slices of SCHEMA_USAGE_GUIDE, so a pruned prompt keeps the guidance for the views it kept
+VIEW_GUIDES = {
+    'llm_transaction_summary': """    llm_transaction_summary - use for spending, income and transaction questions:
+    • amount → negative = expense, positive = income; absolute_amount is always positive
+    • category_name, category_kind ('expense' or 'income'), created_at = transaction date
+""",
+    'llm_financial_overview': """    llm_financial_overview - use for "how am I doing vs budget", "budget performance":
+    • budgeted_amount, actual_income, actual_expenses, category_name, month
+""",
+    'llm_budget_overview': """    llm_budget_overview - use for "what's my budget", "am I over budget":
+    • budgeted_amount = planned amount; actual_expenses, actual_income; month = budget month
+""",
+    'llm_user_profile': """    llm_user_profile - use for name, role and business questions:
+    • display_name → "what is my name"; role_name → "what is my role"; business_name → "my business name"
+""",
+    'llm_business_hierarchy': """    llm_business_hierarchy - use for business relationships:
+    • admin_display_name, admin_user_email → "who is my admin"; display_name, email → "who works under me"
+""",
+}
+
+DATE_NOTES = """    FILTERING NOTES:
+    - Current month: DATE_TRUNC('month', created_at) = DATE_TRUNC('month', CURRENT_DATE)
+    - Specific month: EXTRACT(MONTH FROM created_at) = 3 AND EXTRACT(YEAR FROM created_at) = 2024
+    - By category: category_name = 'Food & Dining'
+"""
+
+# Tokens that appear in most views' column names and say nothing about relevance
+IGNORED_TOKENS = {'llm', 'id', 'at', 'user', 'is', 'the', 'a', 'my', 'me', 'i', 'of', 'for', 'and', 'to', 'in', 'what', 'how'}
+
+TOKEN_PATTERN = re.compile(r"[a-z]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a prompt"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _tokens(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in IGNORED_TOKENS]
+
+
+def _stem(token: str) -> str:
+    return token[:-1] if len(token) > 3 and token.endswith('s') else token
+
+
+class SchemaPromptBuilder:
+    """
+    Builds the schema fragment for SQL generation and query enhancement from
+    only the views relevant to a question.
+
+    Each view is indexed by the words in its name and columns (weight 1) and
+    by VIEW_KEYWORDS (weight 2). Views that match are added best-first until
+    SCHEMA_PROMPT_TOKEN_BUDGET is spent; the best match is always kept, so a
+    question that matches nothing still gets llm_transaction_summary.
+    """
+
+    def __init__(self, token_budget: Optional[int] = None):
+        self.token_budget = settings.SCHEMA_PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+        self._lock = threading.Lock()
+        self._index_key: Optional[Tuple[str, ...]] = None
+        self._index: Dict[str, Dict[str, int]] = {}
+        self.builds = 0
+        self.tokens_built = 0
+        self.views_kept = 0
+        self.views_offered = 0
+
+    def build(self, question: str, views: Dict[str, List[Tuple[str, str, str]]]) -> str:
+        """Return the schema fragment for a question"""
+        ranked = self.rank_views(question, self._get_index(views))
+
+        parts = ["LLM-OPTIMIZED VIEWS (USE THESE INSTEAD OF BASE TABLES):\n\n"]
+        used = estimate_tokens(parts[0])
+        kept = []
+        for view, score in ranked:
+            # Weak matches (a shared column name, say) are noise next to a strong one
+            if kept and (score == 0 or score * 2 <= ranked[0][1]):
+                break
+            section = self._view_section(view, views[view])
+            cost = estimate_tokens(section)
+            if kept and used + cost > self.token_budget:
+                continue
+            parts.append(section)
+            used += cost
+            kept.append(view)
+
+        guides = [VIEW_GUIDES[view] for view in kept if view in VIEW_GUIDES]
+        if any(view in kept for view in ('llm_transaction_summary', 'llm_budget_overview', 'llm_financial_overview')):
+            guides.append(DATE_NOTES)
+        for guide in guides:
+            cost = estimate_tokens(guide)
+            if used + cost > self.token_budget:
+                break
+            parts.append(guide)
+            used += cost
+
+        schema_info = "".join(parts)
+        with self._lock:
+            self.builds += 1
+            self.tokens_built += used
+            self.views_kept += len(kept)
+            self.views_offered += len(views)
+        logger.debug(f"Schema prompt for '{question}': {kept}, ~{used} tokens")
+        return schema_info
+
+    def rank_views(self, question: str, index: Dict[str, Dict[str, int]]) -> List[Tuple[str, int]]:
+        """(view, score) pairs, most relevant first"""
+        words = {_stem(token) for token in _tokens(question)}
+        scores = {view: sum(weights.get(word, 0) for word in words) for view, weights in index.items()}
+        # llm_transaction_summary answers most questions, so it wins ties (including all-zero)
+        ranked = sorted(index, key=lambda view: (-scores[view], view != 'llm_transaction_summary', view))
+        return [(view, scores[view]) for view in ranked]
+
+    def _get_index(self, views: Dict[str, List[Tuple[str, str, str]]]) -> Dict[str, Dict[str, int]]:
+        key = tuple(f"{view}:{','.join(column for column, _, _ in columns)}" for view, columns in sorted(views.items()))
+        with self._lock:
+            if key != self._index_key:
+                self._index = {view: self._index_view(view, columns) for view, columns in views.items()}
+                self._index_key = key
+            return self._index
+
+    @staticmethod
+    def _index_view(view: str, columns: List[Tuple[str, str, str]]) -> Dict[str, int]:
+        weights: Dict[str, int] = {}
+        for name in [view] + [column for column, _, _ in columns]:
+            for token in _tokens(name.replace('_', ' ')):
+                weights[_stem(token)] = 1
+        for keyword in VIEW_KEYWORDS.get(view, []):
+            weights[_stem(keyword)] = 2
+        return weights
+
+    @staticmethod
+    def _view_section(view: str, columns: List[Tuple[str, str, str]]) -> str:
+        lines = [f"VIEW: {view}\nColumns:\n"]
+        for column_name, data_type, is_nullable in columns:
+            nullable = " (nullable)" if is_nullable == 'YES' else ""
+            lines.append(f"  - {column_name} ({data_type}){nullable}\n")
+        lines.append("\n")
+        return "".join(lines)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "token_budget": self.token_budget,
+                "builds": self.builds,
+                "avg_tokens": round(self.tokens_built / self.builds, 1) if self.builds else 0.0,
+                "avg_views_kept": round(self.views_kept / self.builds, 2) if self.builds else 0.0,
+                "avg_views_offered": round(self.views_offered / self.builds, 2) if self.builds else 0.0,
+            }
+
+
+schema_prompt_builder = SchemaPromptBuilder()
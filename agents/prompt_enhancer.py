@@ -2,44 +2,65 @@
 prompt_enhancer.py
 '''
 import logging
+from typing import Optional
 from langchain_ollama import OllamaLLM
 from backend.core.config import settings
+from agents.llm_backends import create_llm
+from agents.metrics import invoke_llm, ainvoke_llm
 
 logger = logging.getLogger(__name__)
 
-class PromptEnhancer:
-    def __init__(self):
-        self.llm = OllamaLLM(model=settings.LLM_MODEL)
-    
-    def enhance_query(self, user_query: str, schema_info: str) -> str:
-        """Enhanced query with emphasis on exact value retrieval"""
-        
-        category_mapping_info = """
+# Everyday words users type -> exact category names, grouped by category kind
+CATEGORY_SYNONYMS = {
+    'income': {
+        "Salary": ["salary", "job", "paycheck"],
+        "Freelance Income": ["freelance", "contract", "side job"],
+        "Investment Income": ["investments", "dividends", "stocks"],
+        "Business Income": ["business", "venture"],
+    },
+    'expense': {
+        "Food & Dining": ["food", "groceries", "eating out"],
+        "Housing": ["rent", "mortgage", "housing"],
+        "Transportation": ["transport", "car", "gas", "commute"],
+        "Utilities": ["utilities", "electricity", "water", "internet"],
+        "Entertainment": ["entertainment", "fun", "hobbies"],
+    },
+}
+
+
+def category_synonym_lookup() -> dict:
+    """Flatten CATEGORY_SYNONYMS into {word: (category_name, category_kind)}"""
+    lookup = {}
+    for kind, categories in CATEGORY_SYNONYMS.items():
+        for category_name, words in categories.items():
+            lookup[category_name.lower()] = (category_name, kind)
+            for word in words:
+                lookup[word] = (category_name, kind)
+    return lookup
+
+
+def _format_category_mapping(kind: str) -> str:
+    lines = []
+    for category_name, words in CATEGORY_SYNONYMS[kind].items():
+        quoted = ", ".join(f'"{word}"' for word in words)
+        lines.append(f'        - {quoted} → "{category_name}"')
+    return "\n".join(lines)
+
+
+# Instructions and the category mapping never change, so they lead the prompt
+# where the model server can reuse them; the schema and question follow.
+ENHANCER_PROMPT_PREFIX = f"""
+        You are enhancing a financial query for SQL generation.
+
         CATEGORY NAME MAPPING FOR FINANCIAL SYSTEM:
         
         INCOME CATEGORIES (category_kind = 'income'):
-        - "salary", "job", "paycheck" → "Salary" 
-        - "freelance", "contract", "side job" → "Freelance Income"
-        - "investments", "dividends", "stocks" → "Investment Income"
-        - "business", "venture" → "Business Income"
+{_format_category_mapping('income')}
         
         EXPENSE CATEGORIES (category_kind = 'expense'):
-        - "food", "groceries", "eating out" → "Food & Dining"
-        - "rent", "mortgage", "housing" → "Housing"
-        - "transport", "car", "gas", "commute" → "Transportation"
-        - "utilities", "electricity", "water", "internet" → "Utilities"
-        - "entertainment", "fun", "hobbies" → "Entertainment"
+{_format_category_mapping('expense')}
         
         CRITICAL: Always use exact category names from the database, not approximations.
-        """
-
-        prompt = f"""
-        You are enhancing a financial query for SQL generation.
-
-        DATABASE SCHEMA:
-        {schema_info}
-
-        {category_mapping_info}
 
         ENHANCEMENT RULES:
         1. Map vague terms to exact database category names
@@ -47,16 +68,43 @@ class PromptEnhancer:
         3. Reference appropriate LLM views
         4. Make the query precise for accurate data retrieval
         5. DO NOT include response formatting instructions
+"""
 
-        USER QUESTION: "{user_query}"
 
-        Enhanced question (focus on data retrieval, not response formatting):
-        """
+class PromptEnhancer:
+    def __init__(self, llm: Optional[OllamaLLM] = None):
+        self.llm = llm or create_llm(settings.LLM_MODEL)
+    
+    def enhance_query(self, user_query: str, schema_info: str) -> str:
+        """Enhanced query with emphasis on exact value retrieval"""
+        prompt = self._build_prompt(user_query, schema_info)
         
         try:
-            enhanced_query = self.llm.invoke(prompt).strip()
+            enhanced_query = invoke_llm(self.llm, prompt, "enhance").strip()
             logger.info(f"Enhanced query: '{user_query}' -> '{enhanced_query}'")
             return enhanced_query
         except Exception as e:
             logger.error(f"Prompt enhancement failed: {e}")
-            return user_query
\ No newline at end of file
+            return user_query
+    
+    async def aenhance_query(self, user_query: str, schema_info: str) -> str:
+        """Async variant of enhance_query"""
+        prompt = self._build_prompt(user_query, schema_info)
+        
+        try:
+            enhanced_query = (await ainvoke_llm(self.llm, prompt, "enhance")).strip()
+            logger.info(f"Enhanced query: '{user_query}' -> '{enhanced_query}'")
+            return enhanced_query
+        except Exception as e:
+            logger.error(f"Prompt enhancement failed: {e}")
+            return user_query
+    
+    def _build_prompt(self, user_query: str, schema_info: str) -> str:
+        return ENHANCER_PROMPT_PREFIX + f"""
+        DATABASE SCHEMA:
+        {schema_info}
+
+        USER QUESTION: "{user_query}"
+
+        Enhanced question (focus on data retrieval, not response formatting):
+        """
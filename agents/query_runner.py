@@ -1,36 +1,201 @@
 '''
 query_runner.py
 '''
+import asyncio
 import logging
-from typing import Tuple, Dict, Any, Optional
+from decimal import Decimal
+from typing import Tuple, Dict, Any, Iterable, Iterator, List, Optional
 from langchain_ollama import OllamaLLM
 from sqlalchemy import text
-from backend.database.connection import SessionLocal
+from backend.database.connection import SessionLocal, get_async_sessionmaker
 from backend.core.config import settings
-from agents.prompt_enhancer import PromptEnhancer
+from agents.prompt_enhancer import PromptEnhancer, category_synonym_lookup
+from agents.schema_cache import schema_cache
+from agents.prompt_builder import schema_prompt_builder
+from agents.sql_compiler import CompiledQuery, sql_compiler
+from agents.sql_guard import sql_guard
+from agents.answer_renderer import answer_renderer
+from agents.speculation import Speculation
+from agents.llm_backends import create_llm
+from agents.metrics import invoke_llm, ainvoke_llm, stream_llm, db_span
+from agents.sql_template_cache import normalize_question, sql_template_cache
 
 logger = logging.getLogger(__name__)
 
+ROLE_CHECK_QUERY = """
+    SELECT r.role_name, r.permission_level 
+    FROM users u 
+    JOIN roles r ON u.role_id = r.id 
+    WHERE u.id = :user_id
+"""
+
+# Identical for every question and user, so the model server can reuse the
+# evaluated prefix; the schema and the question follow it.
+SQL_PROMPT_PREFIX = """
+        You are a SQL query generator for PostgreSQL using LLM-optimized views.
+        You only speak in SQL code without extra characters or explanations.
+
+        CRITICAL RULES FOR FINANCIAL QUERIES:
+        1. For "spent", "spend", "expenses", "cost" questions → USE llm_transaction_summary
+        2. For "income", "earned", "revenue" questions → USE llm_transaction_summary
+        3. For "budget" questions → USE llm_budget_overview or llm_financial_overview
+        4. Filter by the current user with the bind parameter: WHERE user_id = :user_id
+        5. Only read from the llm_ views listed in the schema, never from base tables
+        6. For expenses: WHERE amount < 0
+        7. For income: WHERE amount > 0
+        8. For "this month": WHERE DATE_TRUNC('month', created_at) = DATE_TRUNC('month', CURRENT_DATE)
+        9. Return ONLY the SQL query, no explanations
+
+        SPECIFIC QUERY PATTERNS:
+        - "how much did I spend" → SELECT SUM(amount) as total_spent FROM llm_transaction_summary WHERE user_id = :user_id AND amount < 0
+        - "how much did I spend this month" → SELECT SUM(amount) as total_spent FROM llm_transaction_summary WHERE user_id = :user_id AND amount < 0 AND DATE_TRUNC('month', created_at) = DATE_TRUNC('month', CURRENT_DATE)
+        - "show my expenses" → SELECT amount, category_name, created_at FROM llm_transaction_summary WHERE user_id = :user_id AND amount < 0 ORDER BY created_at DESC
+        - "what is my income" → SELECT SUM(amount) as total_income FROM llm_transaction_summary WHERE user_id = :user_id AND amount > 0
+        - "what business am I in" → SELECT business_name FROM llm_user_profile WHERE user_id = :user_id
+        - "who works under me" → SELECT display_name, role_name FROM llm_business_hierarchy WHERE admin_user_email = (SELECT email FROM llm_business_hierarchy WHERE user_id = :user_id)
+"""
+
+# Generated SQL runs read-only with a per-statement timeout; SET LOCAL takes no
+# bind parameters, set_config(..., true) is its transaction-local equivalent
+READ_ONLY_TRANSACTION = "SET TRANSACTION READ ONLY"
+LOCAL_STATEMENT_TIMEOUT = "SELECT set_config('statement_timeout', :timeout, true)"
+
+class RowCollector:
+    """
+    Keeps the first max_rows rows of a streamed result, plus a running count
+    and sum for every numeric column, so memory stays flat however many rows
+    the query would return. One more row than the cap marks it truncated.
+    """
+
+    def __init__(self, columns: List[str], max_rows: Optional[int]):
+        self.columns = columns
+        self.max_rows = max_rows
+        self.data: List[Any] = []
+        self.truncated = False
+        self._counts = [0] * len(columns)
+        self._sums = [0.0] * len(columns)
+
+    def add(self, row) -> bool:
+        """Keep the row; False once the cap is reached and reading should stop"""
+        if self.max_rows is not None and len(self.data) >= self.max_rows:
+            self.truncated = True
+            return False
+        self.data.append(row)
+        for i, value in enumerate(row):
+            if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+                self._counts[i] += 1
+                self._sums[i] += float(value)
+        return True
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "columns": self.columns,
+            "data": self.data,
+            "rowcount": len(self.data),
+            "truncated": self.truncated,
+            "stats": {
+                column: {"count": self._counts[i], "sum": self._sums[i]}
+                for i, column in enumerate(self.columns) if self._counts[i]
+            },
+        }
+
+    @classmethod
+    def collect(cls, columns: List[str], rows: Iterable, max_rows: Optional[int]) -> Dict[str, Any]:
+        collector = cls(columns, max_rows)
+        for row in rows:
+            if not collector.add(row):
+                break
+        return collector.result()
+
+
+def stream_options(max_rows: Optional[int]) -> Dict[str, Any]:
+    """Server-side cursor fetching just past the cap, so a huge result is never buffered"""
+    return {"yield_per": max_rows + 1} if max_rows is not None else {}
+
+
+def column_stats(raw_data: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Count/sum per numeric column, from the streaming fetch when it kept them"""
+    if "stats" in raw_data:
+        return raw_data["stats"]
+    return RowCollector.collect(raw_data.get("columns", []), raw_data.get("data", []), None)["stats"]
+
+
+def partial_note(raw_data: Dict[str, Any]) -> str:
+    """Suffix for totals and counts taken from a result cut off at the row cap, else ''"""
+    if raw_data.get("truncated"):
+        return f" (first {len(raw_data.get('data', []))} rows only; more matched)"
+    return ""
+
+
+ANSWER_PROMPT_PREFIX = """
+        Answer the user's question from the database results given after these rules.
+
+        CRITICAL RULES - MUST FOLLOW:
+        1. USE EXACT VALUES FROM THE DATA BELOW - never use placeholders like $[amount] or [name]
+        2. If no dollar amounts in data, don't mention dollar amounts
+        3. If data shows "NO VALUES FOUND" or "NO DATA FOUND", say nothing was found
+        4. Use the CALCULATED TOTALS exactly as shown
+        5. Never invent numbers or names that aren't in the data below
+
+        RESPONSE FORMAT EXAMPLES:
+        - CORRECT: "Your total expenses were $1,234.56"
+        - CORRECT: "No transactions found for last month"  
+        - CORRECT: "Your business name is ABC Corporation"
+        - WRONG: "Your total expenses were $[insert amount here]"
+        - WRONG: "Your total expenses were $1,234.56 (from the amount column)"
+        - WRONG: "You spent approximately $[amount] based on the data"
+
+        SPECIFIC VALUE HANDLING:
+        - Money amounts: Always use exact format from data (e.g., $1,234.56)
+        - Names: Use exactly as shown in data
+        - Dates: Use exactly as shown in data
+        - If data is empty: Simply say nothing was found
+
+"""
+
+VALIDATION_PROMPT_PREFIX = """
+        Does the proposed response directly and completely answer the original question?
+        Check:
+        - If question asks for a number, does response include that number?
+        - If question asks for a name, does response include that name?
+        - Is the response specific and not vague?
+        - Does it avoid technical jargon?
+        
+        Answer with ONLY: YES or NO
+"""
+
 class QueryRunner:
-    def __init__(self):
-        self.llm = OllamaLLM(model=settings.LLM_MODEL)
-        self.enhancer = PromptEnhancer()
+    def __init__(self, llm: Optional[OllamaLLM] = None, enhancer: Optional[PromptEnhancer] = None):
+        self.llm = llm or create_llm(settings.LLM_MODEL)
+        self.enhancer = enhancer or PromptEnhancer(llm=self.llm)
         self.conversation_context = {}  # Store extracted values for future use
 
-    def execute_query(self, query: str) -> Dict[str, Any]:
-        """Execute SQL query and return results"""
+    def execute_query(self, query: str, max_rows: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Execute SQL query and return results.
+
+        With max_rows, a SELECT is streamed through a server-side cursor and
+        cut off after max_rows rows (see RowCollector).
+        """
         db = SessionLocal()
+        is_select = query.strip().upper().startswith('SELECT')
 
         try:
             # Wrap raw SQL with text()
-            result = db.execute(text(query))
+            with db_span("execute"):
+                result = db.execute(text(query), execution_options=stream_options(max_rows) if is_select else {})
+                if is_select and max_rows is not None:
+                    try:
+                        return RowCollector.collect(list(result.keys()), result, max_rows)
+                    finally:
+                        result.close()
             
             # COMMIT THE TRANSACTION for non-SELECT queries
-            if not query.strip().upper().startswith('SELECT'):
+            if not is_select:
                 db.commit()
                 logger.info(f"Executed and committed non-SELECT query")
             
-            if query.strip().upper().startswith('SELECT'):
+            if is_select:
                 # Get column names and data for SELECT queries
                 columns = list(result.keys())
                 data = result.fetchall()
@@ -59,173 +224,236 @@ class QueryRunner:
         finally:
             db.close()
 
-    def _get_schema_info(self) -> str:
-        '''Get database schema information focused on LLM-friendly views'''
-        db = SessionLocal()
-        try:
-            # Get detailed view information
-            views_query = text("""
-            SELECT table_name, column_name, data_type, is_nullable
-            FROM information_schema.columns 
-            WHERE table_schema = 'public' AND table_name LIKE 'llm_%'
-            ORDER BY table_name, ordinal_position;
-            """)
-            
-            views_result = db.execute(views_query)
-            
-            schema_info = "LLM-OPTIMIZED VIEWS (USE THESE INSTEAD OF BASE TABLES):\n\n"
-            
-            current_view = None
-            for table_name, column_name, data_type, is_nullable in views_result.fetchall():
-                if table_name != current_view:
-                    if current_view:
-                        schema_info += "\n"
-                    current_view = table_name
-                    schema_info += f"VIEW: {table_name}\n"
-                    schema_info += "Columns:\n"
-                
-                nullable = " (nullable)" if is_nullable == 'YES' else ""
-                schema_info += f"  - {column_name} ({data_type}){nullable}\n"            
-            schema_info += """
-    VIEW PURPOSES AND EXACT USAGE:
-
-    llm_user_profile - User personal and business information:
-    • business_name → Use for: "what company do I work for", "am I in a business", "my business name"
-    • role_name → Use for: "what is my role", "am I an admin"
-    • display_name → Use for: "what is my name", "who am I"
-
-    llm_business_hierarchy - Business user relationships:
-    • admin_display_name, admin_user_email → Use for: "who is my admin", "who do I report to"
-    • display_name, email → Use for: "who works under me", "my team members"
-
-    CRITICAL FINANCIAL VIEWS - MUST USE THESE:
-
-    llm_transaction_summary - MOST IMPORTANT FOR SPENDING QUESTIONS:
-    • amount → Use for spending calculations (negative = expense, positive = income)
-    • absolute_amount → Always positive amount
-    • category_name → Category of transaction
-    • category_kind → 'expense' or 'income'
-    • created_at → Transaction date (use for filtering by month)
-    • month, year → Alternative date fields
-    • user_id → Filter by specific user
-    • transaction_id → Unique identifier
-    • USE THIS VIEW FOR: "how much did I spend", "what are my expenses", "show my transactions"
-
-    llm_financial_overview - Financial summary data:
-    • amount → Same as above
-    • absolute_amount → Always positive amount
-    • budgeted_amount, actual_income, actual_expenses → For budget comparisons
-    • category_name, category_kind → Category information
-    • month → Month for summary
-    • USE THIS VIEW FOR: "how am I doing vs budget", "budget performance"
-
-    llm_budget_overview - Budget planning:
-    • budgeted_amount → Planned amount
-    • actual_expenses, actual_income → Actual amounts
-    • category_name, category_kind → Category information
-    • month → Month for budget
-    • USE THIS VIEW FOR: "what's my budget", "am I over budget"
-
-    IMPORTANT COLUMN NOTES:
-    1. 'amount' column: Negative values = expenses, Positive values = income
-    2. 'absolute_amount' column: Always positive (use when you need positive values only)
-    3. 'created_at' in llm_transaction_summary = actual transaction date
-    4. 'month' in other views = summary month
-
-    QUERY FILTERING EXAMPLES:
-    - Current month expenses: WHERE amount < 0 AND DATE_TRUNC('month', created_at) = DATE_TRUNC('month', CURRENT_DATE)
-    - All expenses: WHERE amount < 0
-    - Specific month: WHERE EXTRACT(MONTH FROM created_at) = 3 AND EXTRACT(YEAR FROM created_at) = 2024
-    - By category: WHERE category_name = 'Food & Dining'
-
-    CRITICAL RESPONSE RULES:
-    1. NEVER mention table names, column names, or SQL in final responses
-    2. NEVER make assumptions if data is not found - just say what the data shows
-    3. NEVER generate fake data - only use what's in the query results
-    4. Keep responses concise and direct - no explanations unless necessary
-    5. If no data found, simply say "No [requested information] found in your records"
-
-    BUSINESS SPECIFIC COLUMNS:
-    - business_name (in llm_user_profile) → company affiliation
-    - role_name → user type (business_admin, business_subuser, personal_user)
-    - admin_email → for finding hierarchical relationships
-    """
-            return schema_info
-            
-        finally:
-            db.close()
+    def _get_schema_info(self, question: Optional[str] = None) -> str:
+        '''Get database schema information focused on LLM-friendly views, pruned to the question when given'''
+        if question is None or schema_prompt_builder.token_budget <= 0:
+            return schema_cache.get()
+        return schema_prompt_builder.build(question, schema_cache.get_views())
+    
+    def _schema_fingerprint(self) -> Optional[str]:
+        '''Fingerprint of the llm_ views, without building a prompt; re-checked at most every SCHEMA_CACHE_CHECK_SECONDS'''
+        schema_cache.get()
+        return schema_cache.fingerprint
     
-    def process_natural_language_query(self, user_query: str, user_id: int) -> Tuple[str, str]:
+    def process_natural_language_query(self, user_query: str, user_id: int, speculation: Optional[Speculation] = None) -> Tuple[str, str]:
         """Process natural language query with two-stage approach"""
+        answer, sql = None, None
+        for event, payload in self.iter_natural_language_query(user_query, user_id, speculation=speculation):
+            if event == "answer":
+                answer, sql = payload["answer"], payload["sql"]
+        return answer, sql
+    
+    def iter_natural_language_query(self, user_query: str, user_id: int, stream_answer: bool = False,
+                                    speculation: Optional[Speculation] = None) -> Iterator[Tuple[str, Any]]:
+        """
+        Run the VIEW pipeline as a sequence of (event, payload) stage events.
         
+        Emits "sql" once a query is chosen, "rows" once it has run, "token"
+        chunks of the answer when stream_answer is set, and always ends with
+        ("answer", {"answer": ..., "sql": ...}). A speculation started during
+        intent classification supplies the enhanced query if the LLM path is reached.
+        """
         # check if user has LLM access based on role
         access_check = self._check_user_llm_access(user_id)
         if not access_check["has_access"]:
-            return access_check["message"], "ACCESS_DENIED"
-        
-        #1. Generate SQL to get comprehensive data from views
-        schema_info = self._get_schema_info()
-        enhanced_query = self.enhancer.enhance_query(user_query, schema_info)
+            if speculation is not None:
+                speculation.discard("not_needed")
+            yield "answer", {"answer": access_check["message"], "sql": "ACCESS_DENIED"}
+            return
+        
+        # 0. Common transaction questions compile straight to SQL without the LLM
+        compiled = sql_compiler.compile(user_query, user_id)
+        if compiled:
+            try:
+                yield "sql", {"sql": compiled.sql, "source": "compiled"}
+                raw_data = self.execute_query_with_params(compiled.sql, compiled.params, settings.QUERY_MAX_ROWS)
+                yield "rows", self._rows_event(raw_data)
+                final_answer = yield from self._iter_answer(
+                    user_query, user_query, raw_data, compiled.sql, compiled, stream_answer
+                )
+                self._store_extracted_values(final_answer, raw_data)
+                if speculation is not None:
+                    speculation.discard("not_needed")
+                yield "answer", {"answer": final_answer, "sql": compiled.sql}
+                return
+            except Exception as e:
+                logger.warning(f"Compiled SQL failed, falling back to LLM generation: {e}")
+        
+        template = normalize_question(user_query, category_synonym_lookup())
+        
+        # 1. Repeat question shapes reuse previously generated SQL with new bind values;
+        # the schema prompt is only built once this misses
+        cached = sql_template_cache.lookup(template, user_id, self._schema_fingerprint())
+        if cached:
+            cached_sql, params = cached
+            try:
+                yield "sql", {"sql": cached_sql, "source": "template_cache"}
+                raw_data = self.execute_read_only(cached_sql, params)
+                yield "rows", self._rows_event(raw_data)
+                final_answer = yield from self._iter_answer(
+                    user_query, user_query, raw_data, cached_sql, None, stream_answer
+                )
+                self._store_extracted_values(final_answer, raw_data)
+                if speculation is not None:
+                    speculation.discard("not_needed")
+                yield "answer", {"answer": final_answer, "sql": cached_sql}
+                return
+            except Exception as e:
+                logger.warning(f"Cached SQL template failed, regenerating: {e}")
+                sql_template_cache.invalidate(template)
+        
+        #2. Generate SQL to get comprehensive data from views
+        speculated = speculation.take() if speculation is not None else None
+        if speculated:
+            schema_info, enhanced_query = speculated
+        else:
+            schema_info = self._get_schema_info(user_query)
+            enhanced_query = self.enhancer.enhance_query(user_query, schema_info)
         
         sql_query = self._generate_sql_query(enhanced_query, schema_info, user_id)
         sql_query = self._clean_sql_response(sql_query)
-
-        
-        #print what we're about to execute
-        print(f"DEBUG: Generated SQL: {sql_query}")
         
         try:
-            raw_data = self.execute_query(sql_query)
+            # Rejected SQL surfaces as the error answer below, like SQL that fails to run
+            sql_query = sql_guard.guard(sql_query)
+            yield "sql", {"sql": sql_query, "source": "llm"}
+            raw_data = self.execute_read_only(sql_query, {"user_id": user_id})
             
-            #show resulets
-            print(f"DEBUG: Raw data columns: {raw_data.get('columns', [])}")
-            print(f"DEBUG: Raw data row count: {raw_data.get('rowcount', 0)}")
+            logger.debug(f"Raw data columns: {raw_data.get('columns', [])}, row count: {raw_data.get('rowcount', 0)}")
             if raw_data.get('data'):
-                print(f"DEBUG: First few rows: {raw_data['data'][:3]}")
+                logger.debug(f"First few rows: {raw_data['data'][:3]}")
             
-            # 2. Extract specific answer and generate natural response
-            final_answer = self._extract_and_format_answer(
-                user_query, enhanced_query, raw_data, sql_query
+            # SQL that ran cleanly is reusable for the same question shape
+            sql_template_cache.store(template, user_id, sql_query, schema_cache.fingerprint)
+            yield "rows", self._rows_event(raw_data)
+            
+            # 3. Extract specific answer and generate natural response
+            final_answer = yield from self._iter_answer(
+                user_query, enhanced_query, raw_data, sql_query, None, stream_answer
             )
             
             # Store extracted values for future context
             self._store_extracted_values(final_answer, raw_data)
             
-            return final_answer, sql_query
+            yield "answer", {"answer": final_answer, "sql": sql_query}
             
+        except Exception as e:
+            logger.error(f"Query processing failed: {e}")
+            error_message = f"I encountered an error while processing your query: {str(e)}"
+            yield "answer", {"answer": error_message, "sql": sql_query if sql_query else "SQL generation failed"}
+    
+    def _rows_event(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "columns": raw_data.get("columns", []),
+            "rowcount": raw_data.get("rowcount", 0),
+            "truncated": raw_data.get("truncated", False),
+        }
+    
+    def _iter_answer(self, original_query: str, enhanced_query: str, raw_data: Dict[str, Any], sql_query: str,
+                     compiled: Optional[CompiledQuery], stream_answer: bool) -> Iterator[Tuple[str, Any]]:
+        """Yield answer tokens when streaming; returns the final (cleaned) answer either way"""
+        if not stream_answer:
+            return self._extract_and_format_answer(
+                original_query, enhanced_query, raw_data, sql_query, compiled=compiled
+            )
+        
+        rendered = answer_renderer.render(original_query, raw_data, compiled)
+        if rendered is not None:
+            yield "token", rendered
+            return rendered
+        
+        chunks = []
+        try:
+            for chunk in stream_llm(self.llm, self._build_answer_prompt(original_query, raw_data), "answer"):
+                chunks.append(chunk)
+                yield "token", chunk
+        except Exception as e:
+            logger.error(f"Extraction failed: {e}")
+            if not chunks:
+                fallback = self._create_direct_response(raw_data, original_query)
+                yield "token", fallback
+                return fallback
+        
+        # Clients should replace the streamed text with this once artifacts are scrubbed
+        return self._clean_template_artifacts("".join(chunks).strip())
+    
+    async def aprocess_natural_language_query(self, user_query: str, user_id: int) -> Tuple[str, str]:
+        """
+        Async variant of process_natural_language_query.
+        
+        LLM calls are awaited with ainvoke and queries go through the async
+        engine, so a waiting chat does not hold a worker thread.
+        """
+        access_check = await self._acheck_user_llm_access(user_id)
+        if not access_check["has_access"]:
+            return access_check["message"], "ACCESS_DENIED"
+        
+        compiled = sql_compiler.compile(user_query, user_id)
+        if compiled:
+            try:
+                raw_data = await self.aexecute_query_with_params(compiled.sql, compiled.params, settings.QUERY_MAX_ROWS)
+                final_answer = await self._aextract_and_format_answer(user_query, raw_data, compiled)
+                self._store_extracted_values(final_answer, raw_data)
+                return final_answer, compiled.sql
+            except Exception as e:
+                logger.warning(f"Compiled SQL failed, falling back to LLM generation: {e}")
+        
+        template = normalize_question(user_query, category_synonym_lookup())
+        
+        # The fingerprint is an in-memory hit except when it is due for a re-check
+        fingerprint = await asyncio.to_thread(self._schema_fingerprint)
+        cached = sql_template_cache.lookup(template, user_id, fingerprint)
+        if cached:
+            cached_sql, params = cached
+            try:
+                # Slot values are loosely typed (dates as strings), which only the sync driver casts for us
+                raw_data = await asyncio.to_thread(self.execute_read_only, cached_sql, params)
+                final_answer = await self._aextract_and_format_answer(user_query, raw_data)
+                self._store_extracted_values(final_answer, raw_data)
+                return final_answer, cached_sql
+            except Exception as e:
+                logger.warning(f"Cached SQL template failed, regenerating: {e}")
+                sql_template_cache.invalidate(template)
+        
+        schema_info = await asyncio.to_thread(self._get_schema_info, user_query)
+        enhanced_query = await self.enhancer.aenhance_query(user_query, schema_info)
+        sql_query = self._clean_sql_response(await self._agenerate_sql_query(enhanced_query, schema_info, user_id))
+        
+        try:
+            sql_query = sql_guard.guard(sql_query)
+            raw_data = await self.aexecute_read_only(sql_query, {"user_id": user_id})
+            sql_template_cache.store(template, user_id, sql_query, schema_cache.fingerprint)
+            final_answer = await self._aextract_and_format_answer(user_query, raw_data)
+            self._store_extracted_values(final_answer, raw_data)
+            return final_answer, sql_query
         except Exception as e:
             logger.error(f"Query processing failed: {e}")
             error_message = f"I encountered an error while processing your query: {str(e)}"
             return error_message, sql_query if sql_query else "SQL generation failed"
     
+    async def _aextract_and_format_answer(self, original_query: str, raw_data: Dict[str, Any],
+                                          compiled: Optional[CompiledQuery] = None) -> str:
+        """Async variant of _extract_and_format_answer"""
+        rendered = answer_renderer.render(original_query, raw_data, compiled)
+        if rendered is not None:
+            return rendered
+        
+        try:
+            response = (await ainvoke_llm(self.llm, self._build_answer_prompt(original_query, raw_data), "answer")).strip()
+            return self._clean_template_artifacts(response)
+        except Exception as e:
+            logger.error(f"Extraction failed: {e}")
+            return self._create_direct_response(raw_data, original_query)
+    
     def _check_user_llm_access(self, user_id: int) -> Dict[str, Any]:
         """Check if user has permission to use LLM based on role"""
         db = SessionLocal()
         try:
             # Check user role and LLM access
-            role_check = db.execute(text("""
-                SELECT r.role_name, r.permission_level 
-                FROM users u 
-                JOIN roles r ON u.role_id = r.id 
-                WHERE u.id = :user_id
-            """), {"user_id": user_id})
-            
-            user_role = role_check.fetchone()
+            with db_span("role_check"):
+                role_check = db.execute(text(ROLE_CHECK_QUERY), {"user_id": user_id})
             
-            if not user_role:
-                return {"has_access": False, "message": "User not found."}
-            
-            role_name, permission_level = user_role
-            
-            # Business subusers don't get LLM access
-            if role_name == "business_subuser":
-                return {
-                    "has_access": False, 
-                    "message": "LLM access is not available for sub-users. Please contact your business administrator."
-                }
-            
-            # All other roles have access
-            return {"has_access": True, "message": "Access granted"}
+            return self._access_from_role(role_check.fetchone())
             
         except Exception as e:
             logger.error(f"Role check failed: {e}")
@@ -233,89 +461,73 @@ class QueryRunner:
         finally:
             db.close()
     
+    async def _acheck_user_llm_access(self, user_id: int) -> Dict[str, Any]:
+        """Async variant of _check_user_llm_access"""
+        try:
+            result = await self.aexecute_query_with_params(ROLE_CHECK_QUERY, {"user_id": user_id})
+            return self._access_from_role(result["data"][0] if result["data"] else None)
+        except Exception as e:
+            logger.error(f"Role check failed: {e}")
+            return {"has_access": False, "message": "Error checking user permissions."}
+    
+    def _access_from_role(self, user_role) -> Dict[str, Any]:
+        if not user_role:
+            return {"has_access": False, "message": "User not found."}
+        
+        role_name, permission_level = user_role
+        
+        # Business subusers don't get LLM access
+        if role_name == "business_subuser":
+            return {
+                "has_access": False, 
+                "message": "LLM access is not available for sub-users. Please contact your business administrator."
+            }
+        
+        # All other roles have access
+        return {"has_access": True, "message": "Access granted"}
+    
     def _generate_sql_query(self, enhanced_query: str, schema_info: str, user_id: int) -> str:
         """Generate SQL with strict rules to prevent over-explaining"""
+        prompt = self._build_sql_prompt(enhanced_query, schema_info)
         
-        prompt = f"""
-        You are a SQL query generator for PostgreSQL using LLM-optimized views.
-        You only speak in SQL code without extra characters or explanations.
-
+        sql_query = invoke_llm(self.llm, prompt, "sql_gen").strip()
+        
+        # Log the generated SQL for debugging
+        logger.info(f"Generated SQL query for '{enhanced_query}': {sql_query}")
+        
+        return sql_query
+    
+    async def _agenerate_sql_query(self, enhanced_query: str, schema_info: str, user_id: int) -> str:
+        """Async variant of _generate_sql_query"""
+        prompt = self._build_sql_prompt(enhanced_query, schema_info)
+        sql_query = (await ainvoke_llm(self.llm, prompt, "sql_gen")).strip()
+        logger.info(f"Generated SQL query for '{enhanced_query}': {sql_query}")
+        return sql_query
+    
+    def _build_sql_prompt(self, enhanced_query: str, schema_info: str) -> str:
+        return SQL_PROMPT_PREFIX + f"""
         Database Schema:
         {schema_info}
 
-        USER CONTEXT:
-        - Current User ID: {user_id}
-        - Views automatically filter to show only relevant data
-
-        CRITICAL RULES FOR FINANCIAL QUERIES:
-        1. For "spent", "spend", "expenses", "cost" questions → USE llm_transaction_summary
-        2. For "income", "earned", "revenue" questions → USE llm_transaction_summary
-        3. For "budget" questions → USE llm_budget_overview or llm_financial_overview
-        4. Filter by user_id: WHERE user_id = {user_id}
-        5. For expenses: WHERE amount < 0
-        6. For income: WHERE amount > 0
-        7. For "this month": WHERE DATE_TRUNC('month', created_at) = DATE_TRUNC('month', CURRENT_DATE)
-        8. Return ONLY the SQL query, no explanations
-
-        SPECIFIC QUERY PATTERNS FOR YOUR SCHEMA:
-        - "how much did I spend" → SELECT SUM(amount) as total_spent FROM llm_transaction_summary WHERE user_id = {user_id} AND amount < 0
-        - "how much did I spend this month" → SELECT SUM(amount) as total_spent FROM llm_transaction_summary WHERE user_id = {user_id} AND amount < 0 AND DATE_TRUNC('month', created_at) = DATE_TRUNC('month', CURRENT_DATE)
-        - "show my expenses" → SELECT amount, category_name, created_at FROM llm_transaction_summary WHERE user_id = {user_id} AND amount < 0 ORDER BY created_at DESC
-        - "what is my income" → SELECT SUM(amount) as total_income FROM llm_transaction_summary WHERE user_id = {user_id} AND amount > 0
-        - "what business am I in" → SELECT business_name FROM llm_user_profile WHERE user_id = {user_id}
-        - "who works under me" → SELECT display_name, role_name FROM llm_business_hierarchy WHERE admin_user_email = (SELECT email FROM users WHERE id = {user_id})
-
         USER QUESTION: "{enhanced_query}"
 
         Generate a clean, efficient SQL query using llm_transaction_summary for spending questions.
         SQL Query:
         """
-        
-        sql_query = self.llm.invoke(prompt).strip()
-        
-        # Log the generated SQL for debugging
-        logger.info(f"Generated SQL query for '{enhanced_query}': {sql_query}")
-        print(f"DEBUG: Generated SQL: {sql_query}")
-        
-        return sql_query
 
     
-    def _extract_and_format_answer(self, original_query: str, enhanced_query: str, raw_data: Dict[str, Any], sql_query: str) -> str:
+    def _extract_and_format_answer(self, original_query: str, enhanced_query: str, raw_data: Dict[str, Any], sql_query: str,
+                                   compiled: Optional[CompiledQuery] = None) -> str:
         """Extract answer with strict rules to prevent template hallucinations"""
-        data_summary = self._format_data_for_extraction(raw_data)
+        # Totals, breakdowns and short lists render from templates; only open-ended results need the LLM
+        rendered = answer_renderer.render(original_query, raw_data, compiled)
+        if rendered is not None:
+            return rendered
         
-        prompt = f"""
-        ORIGINAL USER QUESTION: "{original_query}"
-        
-        EXACT DATA RETRIEVED FROM DATABASE:
-        {data_summary}
-
-        CRITICAL RULES - MUST FOLLOW:
-        1. USE EXACT VALUES FROM DATA ABOVE - never use placeholders like $[amount] or [name]
-        2. If no dollar amounts in data, don't mention dollar amounts
-        3. If data shows "NO VALUES FOUND" or "NO DATA FOUND", say nothing was found
-        4. Use the CALCULATED TOTALS exactly as shown
-        5. Never invent numbers or names that aren't in the data above
-
-        RESPONSE FORMAT EXAMPLES:
-        - CORRECT: "Your total expenses were $1,234.56"
-        - CORRECT: "No transactions found for last month"  
-        - CORRECT: "Your business name is ABC Corporation"
-        - WRONG: "Your total expenses were $[insert amount here]"
-        - WRONG: "Your total expenses were $1,234.56 (from the amount column)"
-        - WRONG: "You spent approximately $[amount] based on the data"
-
-        SPECIFIC VALUE HANDLING:
-        - Money amounts: Always use exact format from data (e.g., $1,234.56)
-        - Names: Use exactly as shown in data
-        - Dates: Use exactly as shown in data
-        - If data is empty: Simply say nothing was found
-
-        FINAL RESPONSE (be direct and use exact values):
-        """
+        prompt = self._build_answer_prompt(original_query, raw_data)
         
         try:
-            response = self.llm.invoke(prompt).strip()
+            response = invoke_llm(self.llm, prompt, "answer").strip()
             
             # fix any template remnants that slipped through
             response = self._clean_template_artifacts(response)
@@ -325,6 +537,18 @@ class QueryRunner:
             logger.error(f"Extraction failed: {e}")
             return self._create_direct_response(raw_data, original_query)
     
+    def _build_answer_prompt(self, original_query: str, raw_data: Dict[str, Any]) -> str:
+        data_summary = self._format_data_for_extraction(raw_data)
+        
+        return ANSWER_PROMPT_PREFIX + f"""
+        ORIGINAL USER QUESTION: "{original_query}"
+        
+        EXACT DATA RETRIEVED FROM DATABASE:
+        {data_summary}
+
+        FINAL RESPONSE (be direct and use exact values):
+        """
+    
     def _clean_template_artifacts(self, response: str) -> str:
         """Clean up any template artifacts that the LLM might have left"""
         import re
@@ -356,21 +580,22 @@ class QueryRunner:
                         if any(keyword in col.lower() for keyword in ['amount', 'total', 'sum', 'planned', 'actual'])]
         
         if money_columns:
-            col_idx = money_columns[0]
-            values = [row[col_idx] for row in data if row[col_idx] is not None]
-            if values:
-                total = sum(float(val) for val in values)
+            stats = column_stats(raw_data).get(columns[money_columns[0]])
+            if stats:
+                total = stats["sum"]
                 formatted_total = f"${total:,.2f}" if abs(total) >= 1000 else f"${total:.2f}"
                 
+                partial = partial_note(raw_data)
+                
                 query_lower = original_query.lower()
                 if any(word in query_lower for word in ['spent', 'expense', 'cost']):
-                    return f"Total expenses: {formatted_total}"
+                    return f"Total expenses{partial}: {formatted_total}"
                 elif any(word in query_lower for word in ['income', 'earned', 'revenue']):
-                    return f"Total income: {formatted_total}"
+                    return f"Total income{partial}: {formatted_total}"
                 elif any(word in query_lower for word in ['budget', 'planned']):
-                    return f"Total budget: {formatted_total}"
+                    return f"Total budget{partial}: {formatted_total}"
                 else:
-                    return f"Total amount: {formatted_total}"
+                    return f"Total amount{partial}: {formatted_total}"
         
         # Handle name/list responses
         if 'display_name' in columns:
@@ -394,6 +619,8 @@ class QueryRunner:
                     return f"Amount: ${value:,.2f}" if abs(value) >= 1000 else f"Amount: ${value:.2f}"
                 return f"Result: {value}"
         
+        if raw_data.get("truncated"):
+            return f"Found more than {len(data)} records matching your query."
         return f"Found {len(data)} records matching your query."
 
     
@@ -410,44 +637,36 @@ class QueryRunner:
         
         if len(data) > 15:
             summary += f"\n... and {len(data) - 15} more rows"
+        if raw_data.get("truncated"):
+            summary += f"\n(Result cut off at {len(data)} rows; totals below cover those rows only)"
         
         if data and len(columns) > 0:
-            numeric_cols = [i for i, col in enumerate(columns) 
+            numeric_cols = [col for col in columns 
                           if any(keyword in col.lower() for keyword in ['amount', 'total', 'value', 'number', 'planned', 'actual'])]
+            stats = column_stats(raw_data)
             if numeric_cols:
                 summary += "\n\nKey Numeric Values Found:"
-                for col_idx in numeric_cols:
-                    values = [row[col_idx] for row in data if row[col_idx] is not None]
-                    if values:
-                        try:
-                            numeric_vals = [float(v) for v in values]
-                            summary += f"\n- {columns[col_idx]}: {len(values)} values, sum: {sum(numeric_vals):.2f}, avg: {sum(numeric_vals)/len(numeric_vals):.2f}"
-                        except (ValueError, TypeError):
-                            summary += f"\n- {columns[col_idx]}: {len(values)} values"
+                for col in numeric_cols:
+                    if col in stats:
+                        count, total = stats[col]["count"], stats[col]["sum"]
+                        summary += f"\n- {col}: {count} values, sum: {total:.2f}, avg: {total/count:.2f}"
         
         return summary
     
     def _validate_response_quality(self, original_query: str, response: str) -> bool:
         """Validate that the response actually answers the question"""
         
-        validation_prompt = f"""
+        validation_prompt = VALIDATION_PROMPT_PREFIX + f"""
         Original Question: "{original_query}"
         Proposed Response: "{response}"
         
-        Does the response directly and completely answer the original question?
-        Check:
-        - If question asks for a number, does response include that number?
-        - If question asks for a name, does response include that name?
-        - Is the response specific and not vague?
-        - Does it avoid technical jargon?
-        
-        Answer with ONLY: YES or NO
+        Answer:
         """
         
         try:
-            validation = self.llm.invoke(validation_prompt).strip().upper()
+            validation = invoke_llm(self.llm, validation_prompt, "validate").strip().upper()
             return "YES" in validation
-        except:
+        except Exception:
             query_lower = original_query.lower()
             response_lower = response.lower()
             
@@ -466,18 +685,17 @@ class QueryRunner:
         
         prompt = f"""
         The previous response didn't properly answer the question. Try again.
+        Be very specific and direct. Extract the exact number/name/value that answers the question.
+        If you see multiple values, choose the most relevant one.
         
         QUESTION: "{original_query}"
         ENHANCED: "{enhanced_query}"
         DATA: {data_summary}
         
-        Be very specific and direct. Extract the exact number/name/value that answers the question.
-        If you see multiple values, choose the most relevant one.
-        
         Direct Answer:
         """
         
-        return self.llm.invoke(prompt).strip()
+        return invoke_llm(self.llm, prompt, "answer_retry").strip()
     
     def _store_extracted_values(self, response: str, raw_data: Dict[str, Any]):
         """Store extracted numeric values for future context"""
@@ -515,10 +733,11 @@ class QueryRunner:
                 return f"Your display name is {data[0][name_idx]}."
         elif "amount" in columns or "absolute_amount" in columns:
             amount_col = "absolute_amount" if "absolute_amount" in columns else "amount"
-            amount_idx = columns.index(amount_col)
-            total = sum(row[amount_idx] for row in data if row[amount_idx] is not None)
-            return f"The total amount is ${total:,.2f}."
+            total = column_stats(raw_data).get(amount_col, {"sum": 0.0})["sum"]
+            return f"The total amount{partial_note(raw_data)} is ${total:,.2f}."
         
+        if raw_data.get("truncated"):
+            return f"I found more than {len(data)} records matching your query. The most relevant information has been retrieved."
         return f"I found {len(data)} records matching your query. The most relevant information has been retrieved."
     
     def _clean_sql_response(self, sql_response: str) -> str:
@@ -569,17 +788,24 @@ class QueryRunner:
         
         return sql_response
     
-    def execute_query_with_params(self, query: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute SQL query with parameters to prevent SQL injection"""
+    def execute_query_with_params(self, query: str, params: Dict[str, Any], max_rows: Optional[int] = None) -> Dict[str, Any]:
+        """Execute SQL query with parameters to prevent SQL injection; max_rows streams and caps a SELECT"""
         db = SessionLocal()
+        is_select = query.strip().upper().startswith('SELECT')
         try:
-            result = db.execute(text(query), params)
+            with db_span("execute_params"):
+                result = db.execute(text(query), params, execution_options=stream_options(max_rows) if is_select else {})
+                if is_select and max_rows is not None:
+                    try:
+                        return RowCollector.collect(list(result.keys()), result, max_rows)
+                    finally:
+                        result.close()
             
             # COMMIT for non-SELECT queries
-            if not query.strip().upper().startswith('SELECT'):
+            if not is_select:
                 db.commit()
             
-            if query.strip().upper().startswith('SELECT'):
+            if is_select:
                 columns = list(result.keys())
                 data = result.fetchall()
                 return {
@@ -600,4 +826,101 @@ class QueryRunner:
             logger.error(f"Parameterized query execution failed: {e}")
             raise
         finally:
-            db.close()
\ No newline at end of file
+            db.close()
+
+    def execute_read_only(self, query: str, params: Dict[str, Any], max_rows: Optional[int] = None) -> Dict[str, Any]:
+        """Run guarded SELECT SQL in a read-only transaction bounded by SQL_STATEMENT_TIMEOUT_MS"""
+        max_rows = settings.QUERY_MAX_ROWS if max_rows is None else max_rows
+        db = SessionLocal()
+        try:
+            with db_span("execute_read_only"):
+                if db.get_bind().dialect.name == "postgresql":
+                    db.execute(text(READ_ONLY_TRANSACTION))
+                    db.execute(text(LOCAL_STATEMENT_TIMEOUT), {"timeout": str(settings.SQL_STATEMENT_TIMEOUT_MS)})
+                result = db.execute(text(query), params, execution_options=stream_options(max_rows))
+                try:
+                    return RowCollector.collect(list(result.keys()), result, max_rows)
+                finally:
+                    result.close()
+        except Exception as e:
+            logger.error(f"Read-only query execution failed: {e}")
+            raise
+        finally:
+            # Nothing to commit; ending the transaction also drops the local timeout
+            db.rollback()
+            db.close()
+
+    async def aexecute_read_only(self, query: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of execute_read_only"""
+        session_factory = get_async_sessionmaker()
+        if session_factory is None:
+            return await asyncio.to_thread(self.execute_read_only, query, params)
+        
+        async with session_factory() as db:
+            try:
+                with db_span("execute_read_only_async"):
+                    if db.get_bind().dialect.name == "postgresql":
+                        await db.execute(text(READ_ONLY_TRANSACTION))
+                        await db.execute(text(LOCAL_STATEMENT_TIMEOUT), {"timeout": str(settings.SQL_STATEMENT_TIMEOUT_MS)})
+                    result = await db.stream(text(query), params, execution_options=stream_options(settings.QUERY_MAX_ROWS))
+                    collector = RowCollector(list(result.keys()), settings.QUERY_MAX_ROWS)
+                    try:
+                        async for row in result:
+                            if not collector.add(row):
+                                break
+                    finally:
+                        await result.close()
+                return collector.result()
+            except Exception as e:
+                logger.error(f"Async read-only query execution failed: {e}")
+                raise
+            finally:
+                await db.rollback()
+
+    async def aexecute_query_with_params(self, query: str, params: Dict[str, Any],
+                                         max_rows: Optional[int] = None) -> Dict[str, Any]:
+        """Async variant of execute_query_with_params; runs the sync version in a thread without an async driver"""
+        session_factory = get_async_sessionmaker()
+        if session_factory is None:
+            return await asyncio.to_thread(self.execute_query_with_params, query, params, max_rows)
+        
+        is_select = query.strip().upper().startswith('SELECT')
+        async with session_factory() as db:
+            try:
+                with db_span("execute_params_async"):
+                    if is_select and max_rows is not None:
+                        result = await db.stream(text(query), params, execution_options=stream_options(max_rows))
+                        collector = RowCollector(list(result.keys()), max_rows)
+                        try:
+                            async for row in result:
+                                if not collector.add(row):
+                                    break
+                        finally:
+                            await result.close()
+                        return collector.result()
+                    result = await db.execute(text(query), params)
+                
+                # COMMIT for non-SELECT queries
+                if not is_select:
+                    await db.commit()
+                
+                if is_select:
+                    columns = list(result.keys())
+                    data = result.fetchall()
+                    return {
+                        "columns": columns,
+                        "data": data,
+                        "rowcount": len(data)
+                    }
+                else:
+                    affected_rows = getattr(result, "rowcount", 0)
+                    return {
+                        "columns": [],
+                        "data": [],
+                        "rowcount": affected_rows,
+                        "message": f"Query executed successfully. {affected_rows} rows affected."
+                    }
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Async query execution failed: {e}")
+                raise
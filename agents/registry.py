@@ -0,0 +1,166 @@
+'''
+registry.py
+'''
+import logging
+import threading
+import time
+from typing import Dict, Any, Optional
+from backend.core.config import settings
+from agents.prompt_enhancer import PromptEnhancer
+from agents.query_runner import QueryRunner
+from agents.data_handler import DataHandler
+from agents.intent_classifier import IntentClassifier
+from agents.sql_compiler import sql_compiler
+from agents.sql_guard import sql_guard
+from agents.answer_renderer import answer_renderer
+from agents.speculation import speculative_enhancer
+from agents.metrics import invoke_llm, metrics
+from agents.prompt_builder import schema_prompt_builder
+from agents.llm_backends import create_llm
+from agents.llm_scheduler import llm_scheduler
+from agents.pending_store import get_pending_store
+from agents.chat_log import chat_log_sink
+from backend.core.reference_data import reference_data
+
+logger = logging.getLogger(__name__)
+
+
+class AgentRegistry:
+    """
+    Process-wide holder for warm agent instances.
+
+    One LLM client (see create_llm for the LLM_BACKEND choices) is kept per
+    model so every agent shares the same HTTP connection pool, and a single QueryRunner is shared between the
+    IntentClassifier and the DataHandler.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._llms: Dict[str, Any] = {}
+        self._intent_classifier: Optional[IntentClassifier] = None
+        self.timings: Dict[str, float] = {}
+        self.warm_up_status = "not_started"
+        self.created_at: Optional[float] = None
+
+    def get_llm(self, model: Optional[str] = None):
+        """Return the shared LLM client for a model, creating it on first use"""
+        model = model or getattr(settings, 'LLM_MODEL', 'qwen3:0.6b')
+        with self._lock:
+            llm = self._llms.get(model)
+            if llm is None:
+                start = time.perf_counter()
+                llm = create_llm(model)
+                self._record_timing(f"llm_client:{model}", start)
+                self._llms[model] = llm
+            return llm
+
+    def build(self) -> IntentClassifier:
+        """Construct the agent graph once; later calls return the same instances"""
+        with self._lock:
+            if self._intent_classifier is not None:
+                return self._intent_classifier
+
+            total_start = time.perf_counter()
+            llm = self.get_llm()
+
+            start = time.perf_counter()
+            enhancer = PromptEnhancer(llm=llm)
+            self._record_timing("prompt_enhancer", start)
+
+            start = time.perf_counter()
+            query_runner = QueryRunner(llm=llm, enhancer=enhancer)
+            self._record_timing("query_runner", start)
+
+            start = time.perf_counter()
+            data_handler = DataHandler(llm=llm, query_runner=query_runner)
+            self._record_timing("data_handler", start)
+
+            start = time.perf_counter()
+            self._intent_classifier = IntentClassifier(
+                llm=llm,
+                query_runner=query_runner,
+                data_handler=data_handler
+            )
+            self._record_timing("intent_classifier", start)
+
+            self._record_timing("build_total", total_start)
+            self.created_at = time.time()
+            logger.info(f"Agent registry built in {self.timings['build_total']:.1f} ms")
+            return self._intent_classifier
+
+    @property
+    def intent_classifier(self) -> IntentClassifier:
+        classifier = self._intent_classifier
+        if classifier is None:
+            classifier = self.build()
+        return classifier
+
+    @property
+    def query_runner(self) -> QueryRunner:
+        return self.intent_classifier.query_runner
+
+    @property
+    def data_handler(self) -> DataHandler:
+        return self.intent_classifier.data_handler
+
+    def warm_up(self, background: bool = False):
+        """Load the models into the model server so the first chat does not pay for it"""
+        if background:
+            thread = threading.Thread(target=self._warm_up, name="agent-warm-up", daemon=True)
+            thread.start()
+            return thread
+        self._warm_up()
+
+    def _warm_up(self):
+        self.build()
+        self.warm_up_status = "running"
+        start = time.perf_counter()
+        try:
+            for model, llm in list(self._llms.items()):
+                model_start = time.perf_counter()
+                invoke_llm(llm, "ping", "warm_up")
+                self._record_timing(f"warm_up:{model}", model_start)
+            self.warm_up_status = "complete"
+        except Exception as e:
+            self.warm_up_status = "failed"
+            logger.warning(f"Agent warm-up failed: {e}")
+        finally:
+            self._record_timing("warm_up_total", start)
+
+    def _record_timing(self, name: str, start: float):
+        self.timings[name] = round((time.perf_counter() - start) * 1000, 2)
+
+    def stats(self) -> Dict[str, Any]:
+        """Construction and warm-up timings in milliseconds"""
+        return {
+            "built": self._intent_classifier is not None,
+            "created_at": self.created_at,
+            "models": list(self._llms.keys()),
+            "warm_up_status": self.warm_up_status,
+            "timings_ms": dict(self.timings),
+            "intent_gate": self._intent_classifier.gating_stats() if self._intent_classifier else None,
+            "sql_compiler": sql_compiler.stats(),
+            "sql_guard": sql_guard.stats(),
+            "answer_renderer": answer_renderer.stats(),
+            "speculation": speculative_enhancer.stats(),
+            "schema_prompt": schema_prompt_builder.stats(),
+            "llm_scheduler": llm_scheduler.stats(),
+            "pending_store": get_pending_store().stats(),
+            "chat_log": chat_log_sink.stats(),
+            "reference_data": reference_data.stats(),
+            "latency": metrics.snapshot(),
+        }
+
+
+_registry: Optional[AgentRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_agent_registry() -> AgentRegistry:
+    """Get the process-wide AgentRegistry"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = AgentRegistry()
+    return _registry
@@ -0,0 +1,203 @@
+'''
+schema_cache.py
+'''
+import logging
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import text
+from backend.database.connection import SessionLocal
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_USAGE_GUIDE = """
+    VIEW PURPOSES AND EXACT USAGE:
+
+    llm_user_profile - User personal and business information:
+    • business_name → Use for: "what company do I work for", "am I in a business", "my business name"
+    • role_name → Use for: "what is my role", "am I an admin"
+    • display_name → Use for: "what is my name", "who am I"
+
+    llm_business_hierarchy - Business user relationships:
+    • admin_display_name, admin_user_email → Use for: "who is my admin", "who do I report to"
+    • display_name, email → Use for: "who works under me", "my team members"
+
+    CRITICAL FINANCIAL VIEWS - MUST USE THESE:
+
+    llm_transaction_summary - MOST IMPORTANT FOR SPENDING QUESTIONS:
+    • amount → Use for spending calculations (negative = expense, positive = income)
+    • absolute_amount → Always positive amount
+    • category_name → Category of transaction
+    • category_kind → 'expense' or 'income'
+    • created_at → Transaction date (use for filtering by month)
+    • month, year → Alternative date fields
+    • user_id → Filter by specific user
+    • transaction_id → Unique identifier
+    • USE THIS VIEW FOR: "how much did I spend", "what are my expenses", "show my transactions"
+
+    llm_financial_overview - Financial summary data:
+    • amount → Same as above
+    • absolute_amount → Always positive amount
+    • budgeted_amount, actual_income, actual_expenses → For budget comparisons
+    • category_name, category_kind → Category information
+    • month → Month for summary
+    • USE THIS VIEW FOR: "how am I doing vs budget", "budget performance"
+
+    llm_budget_overview - Budget planning:
+    • budgeted_amount → Planned amount
+    • actual_expenses, actual_income → Actual amounts
+    • category_name, category_kind → Category information
+    • month → Month for budget
+    • USE THIS VIEW FOR: "what's my budget", "am I over budget"
+
+    IMPORTANT COLUMN NOTES:
+    1. 'amount' column: Negative values = expenses, Positive values = income
+    2. 'absolute_amount' column: Always positive (use when you need positive values only)
+    3. 'created_at' in llm_transaction_summary = actual transaction date
+    4. 'month' in other views = summary month
+
+    QUERY FILTERING EXAMPLES:
+    - Current month expenses: WHERE amount < 0 AND DATE_TRUNC('month', created_at) = DATE_TRUNC('month', CURRENT_DATE)
+    - All expenses: WHERE amount < 0
+    - Specific month: WHERE EXTRACT(MONTH FROM created_at) = 3 AND EXTRACT(YEAR FROM created_at) = 2024
+    - By category: WHERE category_name = 'Food & Dining'
+
+    CRITICAL RESPONSE RULES:
+    1. NEVER mention table names, column names, or SQL in final responses
+    2. NEVER make assumptions if data is not found - just say what the data shows
+    3. NEVER generate fake data - only use what's in the query results
+    4. Keep responses concise and direct - no explanations unless necessary
+    5. If no data found, simply say "No [requested information] found in your records"
+
+    BUSINESS SPECIFIC COLUMNS:
+    - business_name (in llm_user_profile) → company affiliation
+    - role_name → user type (business_admin, business_subuser, personal_user)
+    - admin_email → for finding hierarchical relationships
+    """
+
+# One row per llm_ view definition; hashing them is far cheaper than
+# re-reading information_schema.columns and rebuilding the prompt text.
+FINGERPRINT_QUERY = text("""
+    SELECT md5(COALESCE(string_agg(viewname || ':' || definition, '|' ORDER BY viewname), ''))
+    FROM pg_views
+    WHERE schemaname = 'public' AND viewname LIKE 'llm_%'
+""")
+
+COLUMNS_QUERY = text("""
+    SELECT table_name, column_name, data_type, is_nullable
+    FROM information_schema.columns 
+    WHERE table_schema = 'public' AND table_name LIKE 'llm_%'
+    ORDER BY table_name, ordinal_position;
+""")
+
+
+class SchemaInfoCache:
+    """
+    In-process cache for the schema prompt fragment used by QueryRunner.
+
+    The fragment is keyed by a fingerprint of the llm_ view definitions in
+    pg_views. The fingerprint is only re-checked every
+    SCHEMA_CACHE_CHECK_SECONDS, so most chat queries never touch the database
+    to build their prompt, and a changed view is picked up automatically.
+    """
+
+    def __init__(self, check_interval_seconds: Optional[int] = None):
+        self.check_interval_seconds = (
+            settings.SCHEMA_CACHE_CHECK_SECONDS if check_interval_seconds is None else check_interval_seconds
+        )
+        self._lock = threading.Lock()
+        self._fingerprint: Optional[str] = None
+        self._schema_info: Optional[str] = None
+        self._views: Dict[str, List[Tuple[str, str, str]]] = {}
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+
+    def get(self) -> str:
+        """Return the schema prompt fragment, rebuilding it only if the views changed"""
+        with self._lock:
+            if self._schema_info is not None and time.monotonic() - self._checked_at < self.check_interval_seconds:
+                self.hits += 1
+                return self._schema_info
+
+            self.misses += 1
+            self._load(force=False)
+            return self._schema_info
+
+    @property
+    def fingerprint(self) -> Optional[str]:
+        """Fingerprint of the view definitions the cached fragment was built from"""
+        return self._fingerprint
+
+    def get_views(self) -> Dict[str, List[Tuple[str, str, str]]]:
+        """Return {view_name: [(column, data_type, is_nullable), ...]} for the llm_ views"""
+        self.get()
+        return self._views
+
+    def refresh(self) -> Dict[str, Any]:
+        """Force a rebuild regardless of fingerprint or check interval"""
+        with self._lock:
+            self._load(force=True)
+        return self.stats()
+
+    def invalidate(self):
+        """Drop the cached fragment; the next get() rebuilds it"""
+        with self._lock:
+            self._fingerprint = None
+            self._schema_info = None
+            self._views = {}
+            self._checked_at = 0.0
+
+    def _load(self, force: bool):
+        db = SessionLocal()
+        try:
+            fingerprint = db.execute(FINGERPRINT_QUERY).scalar()
+
+            if force or fingerprint != self._fingerprint or self._schema_info is None:
+                rows = db.execute(COLUMNS_QUERY).fetchall()
+                self._views = self._group_columns(rows)
+                self._schema_info = self._build_schema_info(self._views)
+                self._fingerprint = fingerprint
+                self.rebuilds += 1
+                logger.info(f"Rebuilt schema info for {len(self._views)} views (fingerprint {fingerprint[:12]})")
+
+            self._checked_at = time.monotonic()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _group_columns(rows) -> Dict[str, List[Tuple[str, str, str]]]:
+        views: Dict[str, List[Tuple[str, str, str]]] = {}
+        for table_name, column_name, data_type, is_nullable in rows:
+            views.setdefault(table_name, []).append((column_name, data_type, is_nullable))
+        return views
+
+    @staticmethod
+    def _build_schema_info(views: Dict[str, List[Tuple[str, str, str]]]) -> str:
+        parts = ["LLM-OPTIMIZED VIEWS (USE THESE INSTEAD OF BASE TABLES):\n\n"]
+        for index, (table_name, columns) in enumerate(views.items()):
+            if index:
+                parts.append("\n")
+            parts.append(f"VIEW: {table_name}\nColumns:\n")
+            for column_name, data_type, is_nullable in columns:
+                nullable = " (nullable)" if is_nullable == 'YES' else ""
+                parts.append(f"  - {column_name} ({data_type}){nullable}\n")
+        parts.append(SCHEMA_USAGE_GUIDE)
+        return "".join(parts)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self._fingerprint,
+            "cached": self._schema_info is not None,
+            "views": sorted(self._views.keys()),
+            "size_chars": len(self._schema_info) if self._schema_info else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "rebuilds": self.rebuilds,
+            "check_interval_seconds": self.check_interval_seconds,
+        }
+
+
+schema_cache = SchemaInfoCache()
@@ -0,0 +1,128 @@
+'''
+speculation.py
+'''
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
+from backend.core.config import settings
+from agents.llm_scheduler import LLMOverloadedError
+
+logger = logging.getLogger(__name__)
+
+
+class Speculation:
+    """
+    A query enhancement started before the intent is known.
+
+    Exactly one of take() or discard() settles it; whichever comes second is
+    a no-op, so callers can discard defensively on every early return.
+    """
+
+    def __init__(self, future: Future, stats: "SpeculationStats"):
+        self._future = future
+        self._stats = stats
+        self._settled = False
+        self._lock = threading.Lock()
+
+    def take(self) -> Optional[Tuple[str, str]]:
+        """Wait for and claim (schema_info, enhanced_query); None if the speculative run failed"""
+        with self._lock:
+            if self._settled:
+                return None
+            self._settled = True
+
+        wait_start = time.perf_counter()
+        try:
+            schema_info, enhanced_query, elapsed_ms = self._future.result()
+        except Exception as e:
+            logger.warning(f"Speculative enhancement failed, enhancing inline: {e}")
+            self._stats.record("failed")
+            return None
+
+        waited_ms = (time.perf_counter() - wait_start) * 1000
+        # Whatever we did not have to wait for ran in the shadow of intent classification
+        self._stats.record("hit", saved_ms=max(elapsed_ms - waited_ms, 0.0))
+        return schema_info, enhanced_query
+
+    def discard(self, reason: str = "discarded"):
+        """Drop the speculation; cancels it if it has not started yet"""
+        with self._lock:
+            if self._settled:
+                return
+            self._settled = True
+
+        if self._future.cancel():
+            self._stats.record("cancelled")
+            return
+
+        def record_waste(future: Future):
+            try:
+                _, _, elapsed_ms = future.result()
+            except (Exception, LLMOverloadedError):
+                elapsed_ms = 0.0
+            self._stats.record(reason, wasted_ms=elapsed_ms)
+
+        self._future.add_done_callback(record_waste)
+
+
+class SpeculationStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {"started": 0, "hit": 0, "discarded": 0, "not_needed": 0, "cancelled": 0, "failed": 0}
+        self.saved_ms = 0.0
+        self.wasted_ms = 0.0
+
+    def record(self, outcome: str, saved_ms: float = 0.0, wasted_ms: float = 0.0):
+        with self._lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+            self.saved_ms += saved_ms
+            self.wasted_ms += wasted_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            settled = sum(count for outcome, count in self.counts.items() if outcome != "started")
+            return {
+                **self.counts,
+                "hit_rate": round(self.counts["hit"] / settled, 3) if settled else 0.0,
+                "saved_ms": round(self.saved_ms, 1),
+                "wasted_llm_ms": round(self.wasted_ms, 1),
+            }
+
+
+class SpeculativeEnhancer:
+    """
+    Runs schema fetch + PromptEnhancer.enhance_query on a small thread pool
+    while the LLM decides the intent, so a VIEW answer does not pay for the
+    enhancement round trip after classification.
+    """
+
+    def __init__(self, enabled: bool = True, max_workers: int = 4):
+        self.enabled = enabled
+        self._stats = SpeculationStats()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative-enhance") if enabled else None
+
+    def start(self, query_runner, user_query: str) -> Optional[Speculation]:
+        if not self.enabled:
+            return None
+
+        def run():
+            start = time.perf_counter()
+            schema_info = query_runner._get_schema_info(user_query)
+            enhanced_query = query_runner.enhancer.enhance_query(user_query, schema_info)
+            return schema_info, enhanced_query, (time.perf_counter() - start) * 1000
+
+        self._stats.record("started")
+        # Carry the caller's context so the scheduler queues the speculative call as the same user
+        return Speculation(self._pool.submit(contextvars.copy_context().run, run), self._stats)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, **self._stats.snapshot()}
+
+
+speculative_enhancer = SpeculativeEnhancer(
+    enabled=settings.SPECULATIVE_ENHANCEMENT,
+    max_workers=settings.SPECULATIVE_WORKERS
+)
@@ -0,0 +1,400 @@
+'''
+sql_compiler.py
+'''
+import logging
+import re
+import threading
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from agents.prompt_enhancer import category_synonym_lookup
+from agents.sql_template_cache import MONTH_NAMES
+
+logger = logging.getLogger(__name__)
+
+EXPENSE_WORDS = [
+    'spend', 'spent', 'spending', 'expense', 'expenses', 'cost', 'costs',
+    'paid', 'pay', 'bought', 'purchase', 'purchases', 'outgoing',
+]
+INCOME_WORDS = [
+    'income', 'earn', 'earned', 'earning', 'earnings', 'received', 'revenue',
+]
+TRANSACTION_WORDS = [
+    'transaction', 'transactions', 'payment', 'payments', 'entries', 'entry',
+]
+
+# Anything touching these goes to the LLM path; the compiler only knows llm_transaction_summary
+BLOCKER_WORDS = [
+    'budget', 'budgets', 'budgeted', 'goal', 'goals', 'saving', 'savings', 'save',
+    'company', 'employee', 'employees', 'team', 'admin', 'report', 'profile',
+    'name', 'role', 'email', 'why', 'should', 'advice', 'recommend', 'predict',
+    'forecast', 'afford', 'compare', 'compared', 'than', 'over', 'under',
+    'between', 'except', 'without', 'not', 'only', 'percent', 'percentage',
+]
+
+NUMBER_WORDS = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10,
+}
+MAX_ROWS = 100
+
+_MONTH = '|'.join(sorted(MONTH_NAMES, key=len, reverse=True))
+_NUMBER = r'(\d+|' + '|'.join(NUMBER_WORDS) + r')'
+
+PERIOD_PATTERNS = [
+    ('today', re.compile(r'\btoday\b')),
+    ('yesterday', re.compile(r'\byesterday\b')),
+    ('this_week', re.compile(r'\bthis week\b')),
+    ('last_week', re.compile(r'\b(?:last|previous|past) week\b')),
+    ('this_month', re.compile(r'\bthis month\b')),
+    ('last_month', re.compile(r'\b(?:last|previous|past) month\b')),
+    ('this_year', re.compile(r'\bthis year\b|\byear to date\b|\bytd\b')),
+    ('last_year', re.compile(r'\b(?:last|previous|past) year\b')),
+    ('rolling', re.compile(r'\b(?:in the )?(?:last|past) ' + _NUMBER + r' (day|days|week|weeks|month|months)\b')),
+    ('month', re.compile(r'\b(?:(?:in|for|during|of|from) (' + _MONTH + r')(?: (\d{4}))?|(' + _MONTH + r') (\d{4}))\b')),
+    ('year', re.compile(r'\b(?:in|for|during|of) ((?:19|20)\d{2})\b')),
+]
+
+SHAPE_PATTERNS = {
+    'by_month': re.compile(r'\b(?:per|by|each|every) month\b|\bmonthly\b|\bmonth by month\b'),
+    'by_category': re.compile(r'\b(?:per|by|each|every) category\b|\bbreak ?down\b|\bbroken down\b|\bcategories\b'),
+    'top': re.compile(r'\b(?:top|biggest|largest|highest|most expensive)\b(?: ' + _NUMBER + r')?'),
+    'latest': re.compile(r'\b(?:latest|most recent|recent|last)\b(?: ' + _NUMBER + r')?(?= (?:\w+ )?(?:' + '|'.join(EXPENSE_WORDS + INCOME_WORDS + TRANSACTION_WORDS) + r')\b)'),
+    'count': re.compile(r'\bhow many\b|\bnumber of\b|\bcount\b'),
+    'average': re.compile(r'\baverage\b|\bavg\b|\bmean\b'),
+    'total': re.compile(r"\bhow much\b|\btotal\b|\bsum\b|\bwhat(?:'s| is| was| are| were) my\b"),
+    'list': re.compile(r'\b(?:show|list|display|see|view|give me|what are|what were)\b'),
+}
+SINGULAR_NOUNS = {'expense', 'purchase', 'payment', 'transaction', 'entry', 'income', 'cost'}
+COMPARISON_PATTERN = re.compile(r'\bnet\b|\bcash ?flow\b|\bvs\b|\bversus\b')
+
+
+class CompiledQuery:
+    """Parameterized SQL for a recognized question plus what it was recognized as"""
+
+    def __init__(self, sql: str, params: Dict[str, Any], shape: str,
+                 kind: Optional[str] = None, category: Optional[str] = None, period: Optional[str] = None):
+        self.sql = sql
+        self.params = params
+        self.shape = shape
+        self.kind = kind
+        self.category = category
+        self.period = period
+
+    def __repr__(self):
+        return f"CompiledQuery({self.shape!r}, kind={self.kind!r}, category={self.category!r}, period={self.period!r})"
+
+
+def _to_number(word: Optional[str], default: int) -> int:
+    if not word:
+        return default
+    value = NUMBER_WORDS.get(word) or int(word)
+    return max(1, min(value, MAX_ROWS))
+
+
+def _add_months(day: date, months: int) -> date:
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _parse_period(text: str, today: date) -> Tuple[Optional[Tuple[date, date, str]], str]:
+    """
+    Find at most one period expression; returns ((start, end, label), remaining_text).
+
+    Ranges are half-open [start, end) so they compare directly against created_at.
+    More than one period is ambiguous and reported as ((None, None, None), text).
+    """
+    found = None
+    for name, pattern in PERIOD_PATTERNS:
+        match = pattern.search(text)
+        if not match:
+            continue
+        if found is not None:
+            return (None, None, None), text
+        found = (name, match)
+        text = text[:match.start()] + ' ' + text[match.end():]
+
+    if found is None:
+        return None, text
+
+    name, match = found
+    tomorrow = today + timedelta(days=1)
+    month_start = today.replace(day=1)
+    week_start = today - timedelta(days=today.weekday())
+
+    if name == 'today':
+        period = today, tomorrow, "today"
+    elif name == 'yesterday':
+        period = today - timedelta(days=1), today, "yesterday"
+    elif name == 'this_week':
+        period = week_start, tomorrow, "this week"
+    elif name == 'last_week':
+        period = week_start - timedelta(days=7), week_start, "last week"
+    elif name == 'this_month':
+        period = month_start, _add_months(month_start, 1), "this month"
+    elif name == 'last_month':
+        period = _add_months(month_start, -1), month_start, "last month"
+    elif name == 'this_year':
+        period = date(today.year, 1, 1), date(today.year + 1, 1, 1), "this year"
+    elif name == 'last_year':
+        period = date(today.year - 1, 1, 1), date(today.year, 1, 1), "last year"
+    elif name == 'rolling':
+        count = _to_number(match.group(1), 1)
+        unit = match.group(2).rstrip('s')
+        if unit == 'month':
+            start = _shift_months(today, -count)
+        else:
+            start = today - timedelta(days=count * (7 if unit == 'week' else 1))
+        period = start, tomorrow, f"in the last {count} {unit}{'s' if count != 1 else ''}"
+    elif name == 'month':
+        month_name = match.group(1) or match.group(3)
+        year_text = match.group(2) or match.group(4)
+        month = MONTH_NAMES[month_name]
+        # A bare month name means its most recent occurrence
+        year = int(year_text) if year_text else (today.year if month <= today.month else today.year - 1)
+        start = date(year, month, 1)
+        period = start, _add_months(start, 1), f"in {start.strftime('%B')} {year}"
+    else:
+        year = int(match.group(1))
+        period = date(year, 1, 1), date(year + 1, 1, 1), f"in {year}"
+
+    return period, text
+
+
+def _shift_months(day: date, months: int) -> date:
+    """Same day-of-month `months` away, clamped to the end of shorter months"""
+    target = _add_months(day.replace(day=1), months)
+    next_month = _add_months(target, 1)
+    last_day = (next_month - timedelta(days=1)).day
+    return target.replace(day=min(day.day, last_day))
+
+
+def _has_any(text: str, words: List[str]) -> bool:
+    return re.search(r'\b(?:' + '|'.join(re.escape(word) for word in words) + r')\b', text) is not None
+
+
+def compile_question(question: str, today: Optional[date] = None,
+                     category_words: Optional[Dict[str, Tuple[str, str]]] = None) -> Optional[CompiledQuery]:
+    """
+    Compile a common VIEW question over llm_transaction_summary into parameterized SQL.
+
+    Returns None whenever the question is not one of the recognized shapes,
+    so the caller can fall back to LLM generation.
+    """
+    today = today or date.today()
+    category_words = category_words if category_words is not None else category_synonym_lookup()
+
+    text = question.lower().strip()
+    text = re.sub(r"[?!.,;:]+", ' ', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+
+    if not text or _has_any(text, BLOCKER_WORDS):
+        return None
+
+    period, text = _parse_period(text, today)
+    if period is not None and period[0] is None:
+        return None
+
+    # Categories (and their synonyms) pin both the category and its kind
+    category = None
+    category_kind = None
+    words = sorted(category_words, key=len, reverse=True)
+    category_pattern = re.compile(r'\b(' + '|'.join(re.escape(word) for word in words) + r')\b')
+    matches = {category_words[match.group(1)] for match in category_pattern.finditer(text)}
+    if len(matches) > 1:
+        return None
+    if matches:
+        category, category_kind = matches.pop()
+        text = category_pattern.sub(' ', text)
+
+    mentions_expense = _has_any(text, EXPENSE_WORDS)
+    mentions_income = _has_any(text, INCOME_WORDS)
+    comparison = (mentions_expense and mentions_income) or COMPARISON_PATTERN.search(text) is not None
+
+    if comparison:
+        if category:
+            return None
+        kind = None
+    elif mentions_expense:
+        kind = 'expense'
+    elif mentions_income:
+        kind = 'income'
+    else:
+        kind = category_kind
+    if category_kind and kind and kind != category_kind:
+        return None
+
+    shape = None
+    limit = None
+    for name, pattern in SHAPE_PATTERNS.items():
+        match = pattern.search(text)
+        if not match:
+            continue
+        shape = name
+        if name in ('top', 'latest'):
+            # "my biggest purchase" asks for one row, "my biggest purchases" for a handful
+            following = re.match(r' (?:\w+ )?(\w+)', text[match.end():])
+            singular = following is not None and following.group(1) in SINGULAR_NOUNS
+            limit = _to_number(match.group(1), 1 if singular else (5 if name == 'top' else 10))
+        text = text[:match.start()] + ' ' + text[match.end():]
+        break
+
+    if shape is None and comparison:
+        shape = 'total'
+
+    # Leftover numbers are amounts or ids we do not understand
+    if shape is None or re.search(r'\d', text):
+        return None
+    if not (kind or category or comparison or _has_any(text, TRANSACTION_WORDS)):
+        return None
+    if comparison and shape not in ('total', 'by_month', 'list'):
+        return None
+    if shape in ('total', 'average') and kind is None and not comparison:
+        return None
+
+    return _build_sql(shape, kind, category, period, limit, comparison)
+
+
+def _build_sql(shape: str, kind: Optional[str], category: Optional[str],
+               period: Optional[Tuple[date, date, str]], limit: Optional[int], comparison: bool) -> CompiledQuery:
+    conditions = ["user_id = :user_id"]
+    params: Dict[str, Any] = {}
+    if kind and not comparison:
+        conditions.append("category_kind = :kind")
+        params["kind"] = kind
+    if category:
+        conditions.append("category_name = :category")
+        params["category"] = category
+    if period:
+        conditions.append("created_at >= :start_date AND created_at < :end_date")
+        # Timestamps rather than dates: asyncpg will not coerce a date into a timestamp parameter
+        params["start_date"] = datetime.combine(period[0], time.min)
+        params["end_date"] = datetime.combine(period[1], time.min)
+    where = " AND ".join(conditions)
+    label = period[2] if period else None
+
+    total_alias = {"expense": "total_spent", "income": "total_income"}.get(kind, "total_amount")
+    comparison_columns = (
+        "COALESCE(SUM(absolute_amount) FILTER (WHERE category_kind = 'income'), 0) AS total_income, "
+        "COALESCE(SUM(absolute_amount) FILTER (WHERE category_kind = 'expense'), 0) AS total_expenses, "
+        "COALESCE(SUM(CASE WHEN category_kind = 'income' THEN absolute_amount ELSE -absolute_amount END), 0) AS net_amount"
+    )
+
+    if comparison:
+        if shape == 'by_month':
+            sql = (f"SELECT DATE_TRUNC('month', created_at) AS month, {comparison_columns} "
+                   f"FROM llm_transaction_summary WHERE {where} GROUP BY 1 ORDER BY 1")
+        else:
+            shape = 'total'
+            sql = f"SELECT {comparison_columns} FROM llm_transaction_summary WHERE {where}"
+        return CompiledQuery(sql, params, 'income_vs_expense' if shape == 'total' else 'income_vs_expense_by_month',
+                             kind=None, category=None, period=label)
+
+    if shape == 'total':
+        sql = f"SELECT COALESCE(SUM(absolute_amount), 0) AS {total_alias} FROM llm_transaction_summary WHERE {where}"
+    elif shape == 'average':
+        sql = f"SELECT AVG(absolute_amount) AS average_amount, COUNT(*) AS transaction_count FROM llm_transaction_summary WHERE {where}"
+    elif shape == 'count':
+        sql = f"SELECT COUNT(*) AS transaction_count FROM llm_transaction_summary WHERE {where}"
+    elif shape == 'by_category':
+        sql = (f"SELECT category_name, category_kind, SUM(absolute_amount) AS total_amount, COUNT(*) AS transaction_count "
+               f"FROM llm_transaction_summary WHERE {where} "
+               f"GROUP BY category_name, category_kind ORDER BY total_amount DESC")
+    elif shape == 'by_month':
+        sql = (f"SELECT DATE_TRUNC('month', created_at) AS month, SUM(absolute_amount) AS total_amount, COUNT(*) AS transaction_count "
+               f"FROM llm_transaction_summary WHERE {where} GROUP BY 1 ORDER BY 1")
+    else:
+        order = "absolute_amount DESC" if shape == 'top' else "created_at DESC"
+        params["limit"] = limit or MAX_ROWS
+        sql = (f"SELECT transaction_id, amount, absolute_amount, category_name, category_kind, created_at "
+               f"FROM llm_transaction_summary WHERE {where} ORDER BY {order} LIMIT :limit")
+
+    return CompiledQuery(sql, params, shape, kind=kind, category=category, period=label)
+
+
+class SQLCompiler:
+    """Thread-safe front for compile_question that tracks how often it avoids the LLM"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.compiled = 0
+        self.fallbacks = 0
+        self.shapes: Counter = Counter()
+
+    def compile(self, question: str, user_id: int) -> Optional[CompiledQuery]:
+        try:
+            result = compile_question(question)
+        except Exception as e:
+            logger.warning(f"SQL compiler failed on '{question}': {e}")
+            result = None
+
+        with self._lock:
+            if result is None:
+                self.fallbacks += 1
+            else:
+                self.compiled += 1
+                self.shapes[result.shape] += 1
+
+        if result is not None:
+            result.params["user_id"] = user_id
+            logger.info(f"Compiled '{question}' as {result.shape} without the LLM")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.compiled + self.fallbacks
+            return {
+                "compiled": self.compiled,
+                "fallbacks": self.fallbacks,
+                "coverage": round(self.compiled / total, 3) if total else 0.0,
+                "shapes": dict(self.shapes),
+            }
+
+
+def coverage_report(prompts: List[str], sample_size: int = 20) -> Dict[str, Any]:
+    """How many prompts the compiler handles, by shape, with a sample of the ones it does not"""
+    shapes: Counter = Counter()
+    unparsed = []
+    for prompt in prompts:
+        result = compile_question(prompt)
+        if result is None:
+            if len(unparsed) < sample_size:
+                unparsed.append(prompt)
+        else:
+            shapes[result.shape] += 1
+
+    compiled = sum(shapes.values())
+    return {
+        "total": len(prompts),
+        "compiled": compiled,
+        "coverage": round(compiled / len(prompts), 3) if prompts else 0.0,
+        "shapes": dict(shapes.most_common()),
+        "unparsed_sample": unparsed,
+    }
+
+
+def load_logged_prompts(limit: int = 5000) -> List[str]:
+    """Most recent user prompts from llmlogs"""
+    from sqlalchemy import text
+    from backend.database.connection import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            text("SELECT prompt FROM llmlogs WHERE prompt IS NOT NULL ORDER BY id DESC LIMIT :limit"),
+            {"limit": limit}
+        ).fetchall()
+        return [row[0] for row in rows]
+    finally:
+        db.close()
+
+
+sql_compiler = SQLCompiler()
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print(json.dumps(coverage_report(load_logged_prompts(limit)), indent=2))
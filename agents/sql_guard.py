@@ -0,0 +1,221 @@
+'''
+sql_guard.py
+'''
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Any, List, Optional
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_PREFIX = "llm_"
+ALLOWED_SCHEMAS = ("", "public")
+
+# Postgres functions sqlglot has no expression type for, that generated SQL may call.
+# Any other untyped call is rejected: that family is where functions reaching outside the
+# query live (query_to_xml, table_to_xml, current_setting, pg_read_file, dblink, ...),
+# and they read base tables past the llm_ relation check. Typed sqlglot functions
+# (SUM, DATE_TRUNC, TO_CHAR, COALESCE, ROUND, ...) are the standard aggregate, date,
+# string and math functions and are allowed.
+ALLOWED_FUNCTIONS = {
+    # date and time
+    "age", "make_date", "make_time", "make_timestamp", "make_timestamptz", "date_part",
+    "isfinite", "justify_hours", "justify_interval", "clock_timestamp", "statement_timestamp",
+    # aggregates and window functions
+    "every", "bit_and", "bit_or", "num_nonnulls", "num_nulls", "covar_pop", "covar_samp",
+    "var_pop", "var_samp", "stddev_pop", "stddev_samp", "regr_slope", "regr_intercept",
+    "percent_rank", "nth_value", "last_value", "lag",
+    # math
+    "cbrt", "degrees", "radians", "mod", "div", "gcd", "lcm", "scale", "trunc", "sign",
+    # strings and arrays
+    "btrim", "ltrim", "rtrim", "lpad", "rpad", "right", "repeat", "translate", "strpos",
+    "char_length", "character_length", "octet_length", "regexp_match", "regexp_matches",
+    "regexp_split_to_array", "cardinality", "array_length", "array_position", "to_number",
+}
+
+# Materialized copies that stand in for a view when use_materialized is on (migration 0003)
+MATERIALIZED_VIEWS = {"llm_budget_overview": "llm_budget_overview_mv"}
+
+WRITE_NODES = (
+    exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Create, exp.Drop,
+    exp.Alter, exp.TruncateTable, exp.Command, exp.Into, exp.Lock,
+)
+
+
+class UnsafeSQLError(ValueError):
+    """Generated SQL that the guard refuses to run"""
+
+    def __init__(self, reason: str, detail: str):
+        super().__init__(f"Generated SQL rejected ({reason}): {detail}")
+        self.reason = reason
+
+
+def _scope_predicate(view: str, alias: str) -> exp.Expression:
+    """The rows of a view the current user (:user_id) may see"""
+    if view == "llm_business_hierarchy":
+        # Admins see their own row and everyone who reports to them
+        return sqlglot.parse_one(
+            f"({alias}.user_id = :user_id OR {alias}.admin_user_email IN "
+            f"(SELECT email FROM llm_business_hierarchy WHERE user_id = :user_id))",
+            read="postgres"
+        )
+    return sqlglot.parse_one(f"{alias}.user_id = :user_id", read="postgres")
+
+
+def _on_restricts(join: exp.Join) -> bool:
+    """Whether a filter in the join's ON clause drops the joined table's rows: inner joins and the right side of a LEFT JOIN"""
+    side = (join.side or "").upper()
+    kind = (join.kind or "").upper()
+    return side == "LEFT" or (not side and kind in ("", "INNER"))
+
+
+def _conjuncts(condition: Optional[exp.Expression]) -> List[exp.Expression]:
+    if condition is None:
+        return []
+    condition = condition.unnest()
+    if isinstance(condition, exp.And):
+        return [part.unnest() for part in condition.flatten()]
+    return [condition]
+
+
+def _is_user_filter(condition: exp.Expression, alias: str, only_source: bool) -> bool:
+    """True for `alias.user_id = :user_id` (or unqualified when the SELECT reads one relation)"""
+    if not isinstance(condition, exp.EQ):
+        return False
+    for column, value in ((condition.this, condition.expression), (condition.expression, condition.this)):
+        if (isinstance(column, exp.Column) and column.name == "user_id"
+                and (column.table == alias or (not column.table and only_source))
+                and isinstance(value, exp.Placeholder) and value.name == "user_id"):
+            return True
+    return False
+
+
+class SQLGuard:
+    """
+    Parses LLM-generated SQL and rewrites it before it reaches the database.
+
+    Only a single SELECT over llm_* views passes. Every view it reads gets a
+    `user_id = :user_id` predicate (unless the SQL already has one), and the
+    outer query gets LIMIT max_rows + 1, or keeps a smaller LIMIT of its own;
+    the extra row tells QueryRunner the result was truncated. Anything else
+    raises UnsafeSQLError. With use_materialized, views listed in
+    MATERIALIZED_VIEWS are read from their materialized copy.
+    """
+
+    def __init__(self, max_rows: int = 100, use_materialized: bool = False):
+        self.max_rows = max_rows
+        self.use_materialized = use_materialized
+        self._lock = threading.Lock()
+        self.passed = 0
+        self.rewritten = 0
+        self.rejected: Counter = Counter()
+
+    def guard(self, sql: str) -> str:
+        try:
+            guarded = self._guard(sql)
+        except UnsafeSQLError as e:
+            with self._lock:
+                self.rejected[e.reason] += 1
+            logger.warning(f"{e}: {sql}")
+            raise
+
+        with self._lock:
+            self.passed += 1
+            if guarded != sql.strip().rstrip(";").strip():
+                self.rewritten += 1
+        return guarded
+
+    def _guard(self, sql: str) -> str:
+        try:
+            statements = [s for s in sqlglot.parse(sql, read="postgres") if s is not None]
+        except ParseError as e:
+            raise UnsafeSQLError("unparseable", str(e).splitlines()[0])
+        if len(statements) != 1:
+            raise UnsafeSQLError("multiple_statements", f"{len(statements)} statements")
+
+        tree = statements[0]
+        if not isinstance(tree, exp.Query):
+            raise UnsafeSQLError("not_select", tree.key.upper())
+        for node in tree.walk():
+            if isinstance(node, WRITE_NODES):
+                raise UnsafeSQLError("not_select", node.key.upper())
+            if isinstance(node, exp.Anonymous) and node.name.lower() not in ALLOWED_FUNCTIONS:
+                raise UnsafeSQLError("blocked_function", node.name.lower())
+
+        cte_names = {cte.alias_or_name for cte in tree.find_all(exp.CTE)}
+        for table in tree.find_all(exp.Table):
+            if table.name in cte_names and not table.db:
+                continue
+            if not table.name.startswith(ALLOWED_PREFIX) or table.db not in ALLOWED_SCHEMAS or table.catalog:
+                raise UnsafeSQLError("relation_not_allowed", table.sql(dialect="postgres"))
+
+        # Collect first: scoping adds subqueries over llm_business_hierarchy that must not be scoped again
+        for select in list(tree.find_all(exp.Select)):
+            self._scope_select(select, cte_names)
+        if self.use_materialized:
+            self._use_materialized(tree, cte_names)
+        self._limit(tree)
+
+        # Postgres output would turn :user_id into %(user_id)s; keep the named bind text() expects
+        tree = tree.transform(
+            lambda node: exp.var(f":{node.name}") if isinstance(node, exp.Placeholder) and node.name else node
+        )
+        return tree.sql(dialect="postgres")
+
+    def _scope_select(self, select: exp.Select, cte_names: set):
+        from_ = select.args.get("from_")
+        sources = [(from_.this, None)] if from_ is not None else []
+        sources += [(join.this, join) for join in select.args.get("joins") or []]
+        views = [(table, join) for table, join in sources
+                 if isinstance(table, exp.Table) and not (table.name in cte_names and not table.db)]
+        only_source = len(sources) == 1
+        where = select.args.get("where")
+        filters = _conjuncts(where.this) if where is not None else []
+
+        for table, join in views:
+            alias = table.alias_or_name
+            if any(_is_user_filter(c, alias, only_source) for c in filters):
+                continue
+            predicate = _scope_predicate(table.name, alias)
+            # Scoping a LEFT JOIN in its ON clause keeps the outer join's rows; anywhere
+            # the view's rows are preserved (RIGHT, FULL) only WHERE restricts them
+            if join is not None and join.args.get("on") is not None and _on_restricts(join):
+                if not any(_is_user_filter(c, alias, False) for c in _conjuncts(join.args["on"])):
+                    join.on(predicate, copy=False)
+            else:
+                select.where(predicate, copy=False)
+
+    def _use_materialized(self, tree: exp.Query, cte_names: set):
+        for table in tree.find_all(exp.Table):
+            materialized = MATERIALIZED_VIEWS.get(table.name)
+            if materialized is None or (table.name in cte_names and not table.db):
+                continue
+            # Keep the view name as the alias so qualified column references still resolve
+            if not table.alias:
+                table.set("alias", exp.TableAlias(this=exp.to_identifier(table.name)))
+            table.set("this", exp.to_identifier(materialized))
+
+    def _limit(self, tree: exp.Query):
+        limit = tree.args.get("limit")
+        if limit is not None:
+            value = limit.expression
+            if isinstance(value, exp.Literal) and value.is_int and int(value.name) <= self.max_rows + 1:
+                return
+        tree.limit(self.max_rows + 1, copy=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_rows": self.max_rows,
+                "use_materialized": self.use_materialized,
+                "passed": self.passed,
+                "rewritten": self.rewritten,
+                "rejected": dict(self.rejected),
+            }
+
+
+sql_guard = SQLGuard(max_rows=settings.QUERY_MAX_ROWS, use_materialized=settings.BUDGET_OVERVIEW_MATERIALIZED)
@@ -0,0 +1,310 @@
+'''
+sql_template_cache.py
+'''
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MONTH_NAMES = {
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6,
+    'july': 7, 'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12,
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'jun': 6, 'jul': 7, 'aug': 8,
+    'sep': 9, 'sept': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+
+ISO_DATE_PATTERN = re.compile(r'\b(\d{4}-\d{2}-\d{2})\b')
+YEAR_PATTERN = re.compile(r'\b((?:19|20)\d{2})\b')
+AMOUNT_PATTERN = re.compile(r'\$?\b(\d[\d,]*(?:\.\d+)?)\b')
+MONTH_PATTERN = re.compile(r'\b(' + '|'.join(sorted(MONTH_NAMES, key=len, reverse=True)) + r')\b')
+
+
+class QuestionTemplate:
+    """A normalized question with its literal values lifted out into ordered slots"""
+
+    def __init__(self, text: str, slots: List[Tuple[str, Any]]):
+        self.text = text
+        self.slots = slots
+
+    def __repr__(self):
+        return f"QuestionTemplate({self.text!r}, {self.slots!r})"
+
+
+def normalize_question(question: str, category_words: Optional[Dict[str, Tuple[str, str]]] = None) -> QuestionTemplate:
+    """
+    Turn a question into a template key plus slot values.
+
+    "How much did I spend on groceries in March 2024?" becomes
+    "how much did i spend on <category> in <month> <year>" with slots
+    [('category', 'Food & Dining'), ('month', 3), ('year', 2024)].
+    """
+    text = question.lower().strip()
+    text = re.sub(r'[?!.]+$', '', text)
+    text = re.sub(r'\s+', ' ', text)
+
+    found: List[Tuple[int, int, str, Any]] = []
+
+    def claim(pattern, kind, convert):
+        for match in pattern.finditer(text):
+            start, end = match.span(1)
+            if any(start < f_end and end > f_start for f_start, f_end, _, _ in found):
+                continue
+            found.append((start, end, kind, convert(match.group(1))))
+
+    claim(ISO_DATE_PATTERN, 'date', str)
+    claim(YEAR_PATTERN, 'year', int)
+    claim(MONTH_PATTERN, 'month', lambda name: MONTH_NAMES[name])
+    claim(AMOUNT_PATTERN, 'amount', lambda value: float(value.replace(',', '')))
+
+    if category_words:
+        words = sorted(category_words, key=len, reverse=True)
+        category_pattern = re.compile(r'\b(' + '|'.join(re.escape(word) for word in words) + r')\b')
+        claim(category_pattern, 'category', lambda word: category_words[word][0])
+
+    found.sort()
+    parts = []
+    position = 0
+    slots = []
+    for start, end, kind, value in found:
+        # "$" belongs to the amount it prefixes
+        prefix_end = start - 1 if kind == 'amount' and start > 0 and text[start - 1] == '$' else start
+        parts.append(text[position:prefix_end])
+        parts.append(f"<{kind}>")
+        slots.append((kind, value))
+        position = end
+    parts.append(text[position:])
+
+    return QuestionTemplate("".join(parts), slots)
+
+
+def _sql_literal_pattern(kind: str, value: Any) -> Optional[re.Pattern]:
+    """Regex matching the literal form a slot value takes in generated SQL"""
+    if kind == 'date':
+        return re.compile(r"'" + re.escape(value) + r"'")
+    if kind == 'category':
+        return re.compile(r"'" + re.escape(value) + r"'", re.IGNORECASE)
+    if kind == 'year':
+        return re.compile(r'(?<![\w.\-:])' + str(value) + r'(?![\w.\-])')
+    if kind == 'month':
+        return re.compile(r'(?<=MONTH FROM )([\w.]+\)\s*=\s*)' + str(value) + r'(?!\d)', re.IGNORECASE)
+    if kind == 'amount':
+        whole = int(value) if value == int(value) else None
+        if whole is not None:
+            number = str(whole) + r'(?:\.0+)?'
+        else:
+            number = re.escape(f"{value:.2f}".rstrip('0').rstrip('.')) + r'0*'
+        return re.compile(r'(?<![\w.:])' + number + r'(?![\d.])')
+    return None
+
+
+def _sub_outside_quotes(pattern: re.Pattern, repl, sql: str) -> Tuple[str, int]:
+    """re.subn that leaves single-quoted string literals untouched"""
+    pieces = re.split(r"('(?:[^']|'')*')", sql)
+    total = 0
+    for i in range(0, len(pieces), 2):
+        pieces[i], hits = pattern.subn(repl, pieces[i])
+        total += hits
+    return "".join(pieces), total
+
+
+def _bind_user_id(sql: str, user_id: int) -> Optional[str]:
+    """
+    Rewrite `user_id = <id>` and `user_id IN (<id>)` comparisons to :user_id.
+
+    Only literals compared with a user_id column are touched. Returns None if
+    the SQL does not parse, never filters on :user_id, or still holds the id
+    as a literal elsewhere (an amount, a month, a day): that literal could be
+    either the user or a slot, and a wrong guess would leak across users.
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read="postgres")
+    except ParseError:
+        return None
+
+    uid = str(user_id)
+
+    def is_uid(node) -> bool:
+        return isinstance(node, exp.Literal) and node.this == uid
+
+    def is_user_column(node) -> bool:
+        return isinstance(node, exp.Column) and node.name == "user_id"
+
+    for eq in list(tree.find_all(exp.EQ)):
+        for column, value in ((eq.this, eq.expression), (eq.expression, eq.this)):
+            if is_user_column(column) and is_uid(value):
+                value.replace(exp.Placeholder(this="user_id"))
+    for in_ in list(tree.find_all(exp.In)):
+        if is_user_column(in_.this):
+            for value in in_.expressions:
+                if is_uid(value):
+                    value.replace(exp.Placeholder(this="user_id"))
+
+    if any(is_uid(node) for node in tree.find_all(exp.Literal)):
+        return None
+    if not any(node.name == "user_id" for node in tree.find_all(exp.Placeholder)):
+        return None
+
+    # Same as sql_guard: keep the named bind text() expects instead of %(user_id)s
+    tree = tree.transform(
+        lambda node: exp.var(f":{node.name}") if isinstance(node, exp.Placeholder) and node.name else node
+    )
+    return tree.sql(dialect="postgres")
+
+
+def parameterize_sql(sql: str, template: QuestionTemplate, user_id: int) -> Optional[Tuple[str, Dict[int, str]]]:
+    """
+    Replace the user id and slot literals in generated SQL with bind parameters.
+
+    Returns (parameterized_sql, {slot_index: param_name}) or None if the SQL
+    still references the user id in a way that cannot be safely re-bound.
+    """
+    parameterized = _bind_user_id(sql, user_id)
+    if parameterized is None:
+        return None
+
+    bound: Dict[int, str] = {}
+    for index, (kind, value) in enumerate(template.slots):
+        pattern = _sql_literal_pattern(kind, value)
+        if pattern is None:
+            continue
+        name = f"slot_{index}"
+        if kind == 'month':
+            replaced, hits = _sub_outside_quotes(pattern, lambda m: m.group(1) + f":{name}", parameterized)
+        elif kind in ('date', 'category'):
+            replaced, hits = pattern.subn(f":{name}", parameterized)
+        else:
+            replaced, hits = _sub_outside_quotes(pattern, f":{name}", parameterized)
+        if hits:
+            parameterized = replaced
+            bound[index] = name
+
+    return parameterized, bound
+
+
+class SQLTemplateCache:
+    """
+    LRU + TTL cache of generated SQL keyed by question template.
+
+    Slots that could be lifted into bind parameters are re-bound per request;
+    slots the generated SQL did not expose literally (e.g. a month written as
+    a date range) stay part of the key, so a different value is a miss.
+    """
+
+    def __init__(self, max_size: int = 512, ttl_seconds: int = 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, Tuple], Dict[str, Any]]" = OrderedDict()
+        self._fixed_slots: Dict[str, Tuple[int, ...]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.uncacheable = 0
+
+    def _key(self, template: QuestionTemplate, fixed: Tuple[int, ...]) -> Tuple[str, Tuple]:
+        return template.text, tuple(template.slots[i] for i in fixed)
+
+    def lookup(self, template: QuestionTemplate, user_id: int, schema_version: Optional[str] = None) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Return (sql, params) for a cached template, or None on a miss"""
+        with self._lock:
+            fixed = self._fixed_slots.get(template.text)
+            entry = None
+            if fixed is not None and all(i < len(template.slots) for i in fixed):
+                key = self._key(template, fixed)
+                entry = self._entries.get(key)
+                if entry is not None and (
+                    time.monotonic() - entry["stored_at"] > self.ttl_seconds
+                    or entry["schema_version"] != schema_version
+                    or len(entry["slot_kinds"]) != len(template.slots)
+                ):
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        params: Dict[str, Any] = {"user_id": user_id}
+        for index, name in entry["bound"].items():
+            params[name] = template.slots[index][1]
+        return entry["sql"], params
+
+    def store(self, template: QuestionTemplate, user_id: int, sql: str, schema_version: Optional[str] = None) -> bool:
+        """Cache generated SQL for a template; returns False if it could not be parameterized"""
+        if not sql.strip().upper().startswith(('SELECT', 'WITH')):
+            return False
+
+        result = parameterize_sql(sql, template, user_id)
+        if result is None:
+            with self._lock:
+                self.uncacheable += 1
+            logger.info("Generated SQL not cacheable: user id could not be re-bound")
+            return False
+
+        parameterized, bound = result
+        fixed = tuple(i for i in range(len(template.slots)) if i not in bound)
+
+        with self._lock:
+            self._fixed_slots[template.text] = fixed
+            key = self._key(template, fixed)
+            self._entries[key] = {
+                "sql": parameterized,
+                "bound": bound,
+                "slot_kinds": [kind for kind, _ in template.slots],
+                "schema_version": schema_version,
+                "stored_at": time.monotonic(),
+            }
+            self._entries.move_to_end(key)
+            self.stores += 1
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def invalidate(self, template: QuestionTemplate):
+        """Drop the entry a template would hit (e.g. after its SQL failed)"""
+        with self._lock:
+            fixed = self._fixed_slots.pop(template.text, None)
+            if fixed is not None:
+                self._entries.pop(self._key(template, fixed), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._fixed_slots.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "uncacheable": self.uncacheable,
+        }
+
+
+sql_template_cache = SQLTemplateCache(
+    max_size=settings.SQL_TEMPLATE_CACHE_SIZE,
+    ttl_seconds=settings.SQL_TEMPLATE_CACHE_TTL_SECONDS
+)
@@ -6,6 +6,34 @@ class Settings(BaseSettings):
     SECRET_KEY: str = Field(..., env="SECRET_KEY") 
     ALGORITHM: str = "HS256"  
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    LLM_MODEL: str = "qwen3:0.6b"
+    AGENT_WARMUP: bool = True
+    SCHEMA_CACHE_CHECK_SECONDS: int = 300
+    REFERENCE_DATA_CHECK_SECONDS: int = 60
+    SQL_TEMPLATE_CACHE_SIZE: int = 512
+    SQL_TEMPLATE_CACHE_TTL_SECONDS: int = 3600
+    INTENT_LLM_CONFIDENCE_THRESHOLD: float = 0.85
+    ASYNC_DATABASE_URL: str = ""
+    SPECULATIVE_ENHANCEMENT: bool = True
+    SPECULATIVE_WORKERS: int = 4
+    SCHEMA_PROMPT_TOKEN_BUDGET: int = 600
+    LLM_BACKEND: str = "ollama"
+    LLM_RECORDING_PATH: str = "llm_recordings.jsonl"
+    LLM_REPLAY_LATENCY_MS: float = 0.0
+    LLM_REPLAY_RECORDED_TIMING: bool = False
+    LLM_MAX_IN_FLIGHT: int = 4
+    LLM_MAX_QUEUE: int = 64
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 30.0
+    LLM_KEEP_ALIVE: str = ""
+    QUERY_MAX_ROWS: int = 100
+    SQL_STATEMENT_TIMEOUT_MS: int = 5000
+    BUDGET_OVERVIEW_MATERIALIZED: bool = False
+    PENDING_STORE_BACKEND: str = "memory"
+    PENDING_STORE_URL: str = ""
+    PENDING_DELETE_TTL_SECONDS: int = 600
+    CHAT_LOG_BATCH_SIZE: int = 100
+    CHAT_LOG_FLUSH_SECONDS: float = 1.0
+    CHAT_LOG_MAX_QUEUE: int = 10000
 
     class Config:
         env_file = ".env"
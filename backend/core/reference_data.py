@@ -0,0 +1,140 @@
+"""
+In-process cache of the reference tables: categories and roles.
+
+Both change only through migrations or by hand, yet auth, the dashboards and
+the chat prompts read them on almost every request. ReferenceDataCache loads
+them once and serves lookups from memory until the version moves:
+
+- invalidate() bumps the local version (a write from this process);
+- reference_data_version.version is bumped by a trigger on every write to
+  either table (database/migrations/0004) and re-read at most every
+  REFERENCE_DATA_CHECK_SECONDS, so every worker catches up.
+
+Loads run on their own connection from the bind passed to get(), never inside
+the caller's session transaction.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import text
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES_QUERY = text("SELECT id, name, kind, scope FROM categories ORDER BY id")
+ROLES_QUERY = text("SELECT id, role_name, permission_level FROM roles ORDER BY id")
+VERSION_QUERY = text("SELECT version FROM reference_data_version WHERE id = 1")
+
+
+class CategoryRef(NamedTuple):
+    id: int
+    name: str
+    kind: str  # 'income' or 'expense'
+    scope: str  # 'personal' or 'business'
+
+
+class RoleRef(NamedTuple):
+    id: int
+    role_name: str
+    permission_level: str
+
+
+class ReferenceData:
+    """One loaded copy of categories and roles; never modified after loading"""
+
+    def __init__(self, categories: List[CategoryRef], roles: List[RoleRef], version: Optional[int] = None):
+        self.version = version
+        self.categories: Dict[int, CategoryRef] = {c.id: c for c in categories}
+        self.roles: Dict[int, RoleRef] = {r.id: r for r in roles}
+        self._roles_by_name: Dict[str, RoleRef] = {r.role_name: r for r in roles}
+
+    def category(self, category_id: Optional[int]) -> Optional[CategoryRef]:
+        return self.categories.get(category_id)
+
+    def category_ids(self, kind: Optional[str] = None, scope: Optional[str] = None) -> List[int]:
+        """Ids of the categories with this kind and/or scope, in id order"""
+        return [
+            c.id for c in self.categories.values()
+            if (kind is None or c.kind == kind) and (scope is None or c.scope == scope)
+        ]
+
+    def role(self, role_id: Optional[int]) -> Optional[RoleRef]:
+        return self.roles.get(role_id)
+
+    def role_by_name(self, role_name: str) -> Optional[RoleRef]:
+        return self._roles_by_name.get(role_name)
+
+
+class ReferenceDataCache:
+    """Process-wide ReferenceData, reloaded when its version moves"""
+
+    def __init__(self, check_interval_seconds: Optional[int] = None):
+        self.check_interval_seconds = (
+            settings.REFERENCE_DATA_CHECK_SECONDS if check_interval_seconds is None else check_interval_seconds
+        )
+        self._lock = threading.Lock()
+        self._data: Optional[ReferenceData] = None
+        self._local_version = 0
+        self._loaded_local_version = -1
+        self._checked_at = 0.0
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, bind) -> ReferenceData:
+        """
+        Return the cached reference data, loading it through `bind` (an Engine,
+        e.g. db.get_bind()) on first use or once the version has moved.
+        """
+        with self._lock:
+            fresh = time.monotonic() - self._checked_at < self.check_interval_seconds
+            if self._data is not None and self._loaded_local_version == self._local_version and fresh:
+                self.hits += 1
+                return self._data
+
+            with bind.connect() as conn:
+                version = self._read_version(conn)
+                if (self._data is None or self._loaded_local_version != self._local_version
+                        or version is None or version != self._data.version):
+                    self._data = self._load(conn, version)
+                    self._loaded_local_version = self._local_version
+            self._checked_at = time.monotonic()
+            return self._data
+
+    def invalidate(self):
+        """Bump the local version; the next get() reloads"""
+        with self._lock:
+            self._local_version += 1
+
+    def _load(self, conn, version: Optional[int]) -> ReferenceData:
+        categories = [CategoryRef(*row) for row in conn.execute(CATEGORIES_QUERY)]
+        roles = [RoleRef(*row) for row in conn.execute(ROLES_QUERY)]
+        self.loads += 1
+        logger.info(f"Loaded {len(categories)} categories and {len(roles)} roles (version {version})")
+        return ReferenceData(categories, roles, version)
+
+    @staticmethod
+    def _read_version(conn) -> Optional[int]:
+        """The shared version, or None where the migration has not run (then every check reloads)"""
+        try:
+            return conn.execute(VERSION_QUERY).scalar()
+        except Exception as e:
+            conn.rollback()
+            logger.debug(f"reference_data_version unavailable: {e}")
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self._data is not None,
+            "version": self._data.version if self._data else None,
+            "local_version": self._local_version,
+            "categories": len(self._data.categories) if self._data else 0,
+            "roles": len(self._data.roles) if self._data else 0,
+            "hits": self.hits,
+            "loads": self.loads,
+            "check_interval_seconds": self.check_interval_seconds,
+        }
+
+
+reference_data = ReferenceDataCache()
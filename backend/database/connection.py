@@ -1,7 +1,14 @@
-from sqlalchemy import create_engine
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from core.config import settings
 
+logger = logging.getLogger(__name__)
+
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
@@ -11,9 +18,91 @@ engine = create_engine(
 SessionLocal = sessionmaker(bind=engine, autoflush=False)
 Base = declarative_base()
 
+# Async engine for the asyncio chat path; created on first use so the
+# sync app never needs an async driver installed.
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+_async_sessionmaker = None
+_async_unavailable = False
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+class QueryCounter:
+    """Number of SQL statements sent to the database inside count_queries()"""
+    def __init__(self):
+        self.count = 0
+
+
+_query_counter: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+
+@contextmanager
+def count_queries():
+    """
+    Count the statements this request issues, lazy loads included:
+
+        with count_queries() as queries:
+            ...
+        response.headers["X-DB-Query-Count"] = str(queries.count)
+    """
+    counter = QueryCounter()
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
+
+
+def to_async_url(url: str) -> Optional[str]:
+    """Swap a sync driver for its asyncio equivalent, or None if there is none"""
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        return None
+    async_scheme = ASYNC_DRIVERS.get(scheme)
+    if async_scheme is None:
+        return url if "+asyncpg" in scheme or "+aiosqlite" in scheme else None
+    return f"{async_scheme}://{rest}"
+
+
+def get_async_sessionmaker():
+    """
+    Return an async_sessionmaker bound to a lazily created async engine.
+
+    Returns None when no async driver is installed; callers then run the
+    sync session in a worker thread instead.
+    """
+    global _async_sessionmaker, _async_unavailable
+    if _async_sessionmaker is not None or _async_unavailable:
+        return _async_sessionmaker
+
+    try:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+        async_url = to_async_url(settings.DATABASE_URL)
+        if async_url is None:
+            raise ValueError(f"No async driver known for {settings.DATABASE_URL.split('://')[0]}")
+        async_engine = create_async_engine(async_url, pool_pre_ping=True, pool_recycle=300)
+        _async_sessionmaker = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+    except Exception as e:
+        _async_unavailable = True
+        logger.warning(f"Async database engine unavailable, falling back to threads: {e}")
+
+    return _async_sessionmaker
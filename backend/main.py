@@ -7,7 +7,7 @@ from database.connection import Base, engine, SessionLocal
 from routers.auth_router import router as auth_router
 from routers.goals import router as goals_router
 from routers.dashboard_router import router as dashboard_router
-from routers.chat_router import router as chat_router  # NEW
+from routers.chat_router import router as chat_router, init_chat_agents, close_chat_agents  # NEW
 from core.config import settings
 
 print(">>> USING DATABASE URL:", settings.DATABASE_URL)
@@ -22,6 +22,7 @@ from models.transactions import Transaction
 from models.budgets import Budget
 from models.budget_entries import BudgetEntry
 from models.llmlogs import LLMLog
+from models.transaction_rollups import TransactionRollup
 
 app = FastAPI(title="ClariFi API", version="1.0.0")
 
@@ -53,6 +54,14 @@ app.include_router(goals_router)
 app.include_router(dashboard_router)
 app.include_router(chat_router)  # NEW
 
+@app.on_event("startup")
+def startup_agents():
+    init_chat_agents()
+
+@app.on_event("shutdown")
+def shutdown_agents():
+    close_chat_agents()
+
 @app.get("/")
 def root():
     return {"status": "OK"}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Index, Integer, Float, ForeignKey, CheckConstraint
 from sqlalchemy.orm import relationship
 from database.connection import Base
 
@@ -14,6 +14,8 @@ class BudgetEntry(Base):
     # Check constraint for positive planned amount
     __table_args__ = (
         CheckConstraint('planned >= 0', name='check_planned_positive'),
+        Index("ix_budgetentries_user_id", "user_id"),
+        Index("ix_budgetentries_budget_id", "budget_id"),
     )
 
     # Relationships
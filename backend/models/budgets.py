@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, Date, TIMESTAMP, ForeignKey, Float
+from sqlalchemy import Column, Index, Integer, String, Date, TIMESTAMP, ForeignKey, Float
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database.connection import Base
 
 class Budget(Base):
     __tablename__ = "budgets"
+    __table_args__ = (
+        Index("ix_budgets_user_month", "user_id", "month"),
+    )
     
     id = Column(Integer, primary_key=True)
     budget_id = Column(String(50), unique=True, nullable=False)
@@ -9,6 +9,7 @@ class Category(Base):
     name = Column(String(100), unique=True, nullable=False)
     kind = Column(String(20), nullable=False)
     parent_id = Column(Integer, ForeignKey("categories.id"))
+    scope = Column(String(20), nullable=False, default="personal", server_default="personal")  # 'personal' or 'business'
 
     # Self-referential relationship for subcategories
     parent = relationship("Category", remote_side=[id], backref="subcategories")
@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, TIMESTAMP
+from sqlalchemy import Column, Index, Integer, String, Float, ForeignKey, Date, TIMESTAMP
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database.connection import Base
 
 class Goal(Base):
     __tablename__ = "goals"
+    __table_args__ = (
+        Index("ix_goals_user_type", "user_id", "type"),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
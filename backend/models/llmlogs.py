@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, ForeignKey
+from sqlalchemy import Column, Index, Integer, String, Text, TIMESTAMP, ForeignKey
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database.connection import Base
 
 class LLMLog(Base):
     __tablename__ = "llmlogs"
+    __table_args__ = (
+        # Keyset pagination of chat history, per session and per user
+        Index("ix_llmlogs_user_session_timestamp_id", "user_id", "session_id", "timestamp", "id"),
+        Index("ix_llmlogs_user_timestamp_id", "user_id", "timestamp", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
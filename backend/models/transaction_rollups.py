@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, Float, Date
+from database.connection import Base
+
+class TransactionRollup(Base):
+    """
+    Monthly per-category totals of transactions, maintained by the
+    transactions_rollups trigger (database/migrations/0002). Read-only here.
+    """
+    __tablename__ = "transaction_rollups"
+
+    user_id = Column(Integer, primary_key=True)
+    category_id = Column(Integer, primary_key=True)
+    month = Column(Date, primary_key=True)  # first day of the month
+    amount_sum = Column(Float, nullable=False, default=0.0)
+    income_sum = Column(Float, nullable=False, default=0.0)  # amounts >= 0
+    expense_sum = Column(Float, nullable=False, default=0.0)  # |amount| for amounts < 0
+    txn_count = Column(Integer, nullable=False, default=0)
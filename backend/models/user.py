@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, TIMESTAMP
+from sqlalchemy import Column, Index, Integer, String, ForeignKey, TIMESTAMP
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database.connection import Base
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_business_role", "business_id", "role_id"),
+        Index("ix_users_admin_email", "admin_email"),
+    )
 
     id = Column(Integer, primary_key=True)
     email = Column(String, unique=True, nullable=False)
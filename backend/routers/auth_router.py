@@ -10,6 +10,7 @@ from models.role import Role
 from schemas.auth_schema import *
 from core.security import hash_password, verify_password, create_access_token
 from core.config import settings
+from core.reference_data import reference_data
 from jose import jwt, JWTError
 import re 
 
@@ -34,7 +35,7 @@ def register_personal(payload: RegisterPersonal, db: Session = Depends(get_db)):
     if email_exists:
         raise HTTPException(status_code=400, detail="Email already exists")
 
-    role = db.query(Role).filter(Role.role_name == "personal_user").first()
+    role = reference_data.get(db.get_bind()).role_by_name("personal_user")
 
     user = User(email=payload.email, role_id=role.id)
     db.add(user)
@@ -70,7 +71,7 @@ def register_business_admin(payload: RegisterBusinessAdmin, db: Session = Depend
     if email_exists:
         raise HTTPException(status_code=400, detail="Email already in use")
 
-    role = db.query(Role).filter(Role.role_name == "business_admin").first()
+    role = reference_data.get(db.get_bind()).role_by_name("business_admin")
 
     business = Business(name=payload.businessname)
     db.add(business)
@@ -119,7 +120,8 @@ def register_business_sub(payload: RegisterBusinessSub, db: Session = Depends(ge
         raise HTTPException(status_code=400, detail="Business admin email not found")
     
     # Check if admin is actually a business admin
-    admin_role = db.query(Role).filter(Role.id == admin.role_id).first()
+    roles = reference_data.get(db.get_bind())
+    admin_role = roles.role(admin.role_id)
     if admin_role.role_name != "business_admin":
         raise HTTPException(status_code=400, detail="The provided email is not a business admin")
     
@@ -128,7 +130,7 @@ def register_business_sub(payload: RegisterBusinessSub, db: Session = Depends(ge
     if email_exists:
         raise HTTPException(status_code=400, detail="Email already in use")
 
-    role = db.query(Role).filter(Role.role_name == "business_subuser").first()
+    role = roles.role_by_name("business_subuser")
     
     # Get the business name for the profile
     business = db.query(Business).filter(Business.id == admin.business_id).first()
@@ -184,7 +186,7 @@ def login(payload: LoginRequest, db: Session = Depends(get_db)):
     print(f"Found user: {user.email}, role_id: {user.role_id}")
     
     # Check if role exists
-    role = db.query(Role).filter(Role.id == user.role_id).first()
+    role = reference_data.get(db.get_bind()).role(user.role_id)
     if not role:
         print(f"Role not found for role_id: {user.role_id}")
         raise HTTPException(status_code=400, detail="User role configuration error")
@@ -273,7 +275,7 @@ def debug_headers(authorization: str = Header(None)):
 def get_profile(user: User = Depends(verify_token), db: Session = Depends(get_db)):
     """Get user profile information"""
     profile = db.query(Profile).filter(Profile.user_id == user.id).first()
-    role = db.query(Role).filter(Role.id == user.role_id).first()
+    role = reference_data.get(db.get_bind()).role(user.role_id)
     
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
@@ -422,11 +424,12 @@ def change_password(
 def debug_users(db: Session = Depends(get_db)):
     """Debug endpoint to check users in database"""
     users = db.query(User).all()
+    roles = reference_data.get(db.get_bind())
     result = []
     
     for user in users:
         creds = db.query(AuthCredentials).filter(AuthCredentials.user_id == user.id).first()
-        role = db.query(Role).filter(Role.id == user.role_id).first()
+        role = roles.role(user.role_id)
         
         result.append({
             "id": user.id,
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, extract
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import List
-from database.connection import SessionLocal
+from database.connection import SessionLocal, count_queries
+from core.reference_data import reference_data
 from models.user import User
 from models.transactions import Transaction
 from models.categories import Category
@@ -12,6 +15,9 @@ from models.profile import Profile
 from routers.auth_router import verify_token
 from models.budgets import Budget
 from models.budget_entries import BudgetEntry
+from models.transaction_rollups import TransactionRollup
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 
@@ -23,86 +29,54 @@ def get_db():
         db.close()
 
 
+# Dashboard item names by category name; categories not listed show their own name
+CATEGORY_ITEM_NAMES = {
+    "Housing": "Rent Payment",
+    "Food": "Grocery Shopping",
+    "Transportation": "Gas Station",
+    "Entertainment": "Movie Tickets",
+    "Healthcare": "Doctor Visit",
+    "Insurance": "Insurance Premium",
+    "Savings": "Savings Deposit",
+    "Other Expense": "Miscellaneous Expense",
+    "Utilities": "Utility Bill",
+}
+
+# Categories whose item name depends on the amount: (below this amount, name), last one catches the rest
+AMOUNT_ITEM_NAMES = {
+    "Food": [(30, "Coffee Shop"), (80, "Restaurant Meal"), (None, "Grocery Shopping")],
+    "Transportation": [(40, "Bus/Train Fare"), (100, "Gas Station"), (None, "Car Maintenance")],
+    "Entertainment": [(30, "Streaming Service"), (60, "Movie Tickets"), (None, "Concert/Event")],
+    "Utilities": [(100, "Internet Bill"), (150, "Electricity Bill"), (None, "Utility Bundle")],
+}
+
+
+def business_admin_role_id(db: Session):
+    """Role id of business admins, from the reference data cache (None if the role is missing)"""
+    role = reference_data.get(db.get_bind()).role_by_name("business_admin")
+    return role.id if role else None
+
+
 def fetch_recent_purchases_helper(user_id: int, db: Session, limit: int = 10):
     """Helper function to fetch recent purchases"""
     transactions = db.query(Transaction).filter(
         Transaction.user_id == user_id,
     ).order_by(desc(Transaction.created_at)).limit(limit).all()
     
-    # Map category IDs to specific item names for personal expenses
-    category_item_map = {
-        1: "Rent Payment",
-        2: "Grocery Shopping",
-        3: "Gas Station",
-        4: "Movie Tickets",
-        5: "Doctor Visit",
-        6: "Insurance Premium",
-        7: "Savings Deposit",
-        8: "Miscellaneous Expense",
-        22: "Office Rent",
-        23: "Salary Payment",
-        24: "Software Purchase",
-        25: "Marketing Expense",
-        26: "Utility Bill",
-        27: "Business Development",
-        28: "Product Development",
-        29: "Training Course",
-        30: "Business Operations",
-    }
-    
-    category_generic_map = {
-        "Housing": "Housing Expense",
-        "Food": "Food Purchase", 
-        "Transportation": "Transportation",
-        "Entertainment": "Entertainment",
-        "Healthcare": "Healthcare",
-        "Insurance": "Insurance",
-        "Savings": "Savings Transfer",
-        "Other Expense": "Expense",
-        "Utilities": "Utility Bill",
-    }
+    # Category names come from the cached reference data, not one lazy load per row
+    refs = reference_data.get(db.get_bind())
     
     result = []
     for t in transactions:
         item_name = "Purchase"
         
-        if t.category_id and t.category_id in category_item_map:
-            item_name = category_item_map[t.category_id]
-        elif t.category and t.category.name:
-            category_name = t.category.name
-            if category_name in category_generic_map:
-                item_name = category_generic_map[category_name]
-            else:
-                item_name = category_name
-        
-        if t.category_id == 2:
-            if abs(t.amount) < 30:
-                item_name = "Coffee Shop"
-            elif abs(t.amount) < 80:
-                item_name = "Restaurant Meal"
-            else:
-                item_name = "Grocery Shopping"
-        elif t.category_id == 3:
-            if abs(t.amount) < 40:
-                item_name = "Bus/Train Fare"
-            elif abs(t.amount) < 100:
-                item_name = "Gas Station"
-            else:
-                item_name = "Car Maintenance"
-        elif t.category_id == 4:
-            if abs(t.amount) < 30:
-                item_name = "Streaming Service"
-            elif abs(t.amount) < 60:
-                item_name = "Movie Tickets"
-            else:
-                item_name = "Concert/Event"
-        elif t.category_id == 26:
-            if abs(t.amount) < 100:
-                item_name = "Internet Bill"
-            elif abs(t.amount) < 150:
-                item_name = "Electricity Bill"
-            else:
-                item_name = "Utility Bundle"
+        category = refs.category(t.category_id)
+        if category:
+            item_name = CATEGORY_ITEM_NAMES.get(category.name, category.name)
+            for below, tier_name in AMOUNT_ITEM_NAMES.get(category.name, []):
+                if below is None or abs(t.amount) < below:
+                    item_name = tier_name
+                    break
         
         result.append({
             "id": t.id,
@@ -114,32 +88,24 @@ def fetch_recent_purchases_helper(user_id: int, db: Session, limit: int = 10):
     return result
 
 def fetch_expense_categories_helper(user_id: int, db: Session, month: str = None):
-    """Helper function to fetch expense categories"""
+    """Helper function to fetch expense categories (monthly rollups, not raw transactions)"""
     query = db.query(
         Category.name,
         Category.id,
-        func.sum(Transaction.amount).label("total")
+        func.sum(TransactionRollup.amount_sum).label("total")
     ).join(
-        Transaction,
-        Transaction.category_id == Category.id
+        TransactionRollup,
+        TransactionRollup.category_id == Category.id
     ).filter(
-        Transaction.user_id == user_id,
+        TransactionRollup.user_id == user_id,
+        TransactionRollup.txn_count > 0,
         Category.kind == "expense",
     )
     
     if month:
         try:
             year, month_num = map(int, month.split("-"))
-            start_date = datetime(year, month_num, 1)
-            if month_num == 12:
-                end_date = datetime(year + 1, 1, 1)
-            else:
-                end_date = datetime(year, month_num + 1, 1)
-            
-            query = query.filter(
-                Transaction.created_at >= start_date,
-                Transaction.created_at < end_date
-            )
+            query = query.filter(TransactionRollup.month == date(year, month_num, 1))
         except ValueError:
             pass
     
@@ -236,154 +202,135 @@ def get_dashboard_summary(
     }
 
 
-@router.get("/business/summary")
-def get_business_dashboard_summary(
-    user: User = Depends(verify_token),
-    db: Session = Depends(get_db)
-):
-    """Get business dashboard data for the current user - works for both business_admin and business_subuser"""
+def fetch_business_summary_helper(user: User, db: Session):
+    """Helper function to build the business dashboard in three queries"""
     
-    print(f"=== BUSINESS DASHBOARD FOR USER {user.id} ===")
+    logger.debug(f"Business dashboard for user {user.id}")
     
-    # Get profile
-    profile = db.query(Profile).filter(Profile.user_id == user.id).first()
+    business_id = user.business_id
     
-    if not profile:
+    # Business category IDs, from the reference data cache
+    refs = reference_data.get(db.get_bind())
+    business_income_ids = refs.category_ids(kind="income", scope="business")
+    business_expense_ids = refs.category_ids(kind="expense", scope="business")
+    business_category_ids = business_income_ids + business_expense_ids
+    
+    logger.debug(f"Business income category IDs: {business_income_ids}")
+    logger.debug(f"Business expense category IDs: {business_expense_ids}")
+    
+    # 1) Profile, the business admin whose user_id holds all the data, and their budget entry
+    admin_id = db.query(User.id).filter(
+        User.business_id == business_id,
+        User.role_id == business_admin_role_id(db)
+    ).limit(1).scalar_subquery()
+    planned = db.query(BudgetEntry.planned).filter(
+        BudgetEntry.user_id == admin_id
+    ).limit(1).scalar_subquery()
+    
+    header = db.query(
+        Profile.business_name,
+        admin_id.label("admin_id"),
+        planned.label("planned")
+    ).filter(Profile.user_id == user.id).first()
+    
+    if not header:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    business_id = user.business_id
     if not business_id:
         raise HTTPException(status_code=400, detail="User is not associated with a business")
     
-    print(f"Business ID: {business_id}")
+    logger.debug(f"Business ID: {business_id}")
     
-    # Get the business admin user for this business
-    admin_user = db.query(User).filter(
-        User.business_id == business_id,
-        User.role_id == 2  # business_admin role
-    ).first()
-    
-    if not admin_user:
+    if header.admin_id is None:
         raise HTTPException(status_code=404, detail="Business admin not found")
     
-    print(f"Using business admin user_id: {admin_user.id} for data")
+    logger.debug(f"Using business admin user_id: {header.admin_id} for data")
     
     # USE ADMIN'S USER_ID FOR ALL DATA QUERIES
-    target_user_id = admin_user.id
-    
-    # Business category IDs
-    business_income_ids = [17, 18, 19, 20, 21]
-    business_expense_ids = [22, 23, 24, 25, 26, 27, 28, 29, 30]
+    target_user_id = header.admin_id
     
-    print(f"Business income category IDs: {business_income_ids}")
-    print(f"Business expense category IDs: {business_expense_ids}")
-    
-    # Get TOTAL BUDGET from budget_entries
-    budget_entry = db.query(BudgetEntry).filter(
-        BudgetEntry.user_id == target_user_id
-    ).first()
-    
-    if budget_entry:
-        total_budget = float(budget_entry.planned)
-        print(f"Budget from budget_entries: ${total_budget}")
+    if header.planned is not None:
+        total_budget = float(header.planned)
+        logger.debug(f"Budget from budget_entries: ${total_budget}")
     else:
         # Just use default budget
         total_budget = 60000.0
-        print(f"Using default budget: ${total_budget}")
-    
-    # Calculate TOTAL EXPENSES
-    expense_result = db.query(func.sum(Transaction.amount)).filter(
-        Transaction.user_id == target_user_id,
-        Transaction.category_id.in_(business_expense_ids)
-    ).scalar()
-    
-    total_expenses = abs(float(expense_result)) if expense_result else 0.0
-    print(f"Total Expenses: ${total_expenses}")
-    
-    # Calculate TOTAL INCOME
-    income_result = db.query(func.sum(Transaction.amount)).filter(
-        Transaction.user_id == target_user_id,
-        Transaction.category_id.in_(business_income_ids)
-    ).scalar()
+        logger.debug(f"Using default budget: ${total_budget}")
+    
+    # 2) Income and expenses per (year, quarter) from the monthly rollups; the
+    # all-time totals are the sum of every group, the charts the current year's
+    year_num = extract('year', TransactionRollup.month).label('year_num')
+    quarter_num = func.floor((extract('month', TransactionRollup.month) - 1) / 3).label('quarter_num')
+    quarter_totals = db.query(
+        year_num,
+        quarter_num,
+        func.sum(TransactionRollup.amount_sum).filter(
+            TransactionRollup.category_id.in_(business_income_ids)
+        ).label('income'),
+        func.sum(TransactionRollup.amount_sum).filter(
+            TransactionRollup.category_id.in_(business_expense_ids)
+        ).label('expenses')
+    ).filter(
+        TransactionRollup.user_id == target_user_id,
+        TransactionRollup.category_id.in_(business_category_ids)
+    ).group_by('year_num', 'quarter_num').all()
     
-    total_income = float(income_result) if income_result else 0.0
-    print(f"Total Income: ${total_income}")
+    current_year = datetime.now().year
+    quarterly_income = [{"quarter": f"Q{q + 1}", "amount": 0.0} for q in range(4)]
+    quarterly_expenses = [{"quarter": f"Q{q + 1}", "amount": 0.0} for q in range(4)]
+    income_sum = 0.0
+    expense_sum = 0.0
+    
+    for year, q_num, income, expenses in quarter_totals:
+        income_sum += float(income or 0)
+        expense_sum += float(expenses or 0)
+        if year is not None and int(year) == current_year and q_num is not None and 0 <= int(q_num) <= 3:
+            quarterly_income[int(q_num)]["amount"] = float(income or 0)
+            quarterly_expenses[int(q_num)]["amount"] = abs(float(expenses or 0))
+    
+    total_income = income_sum
+    total_expenses = abs(expense_sum)
+    logger.debug(f"Total Income: ${total_income}")
+    logger.debug(f"Total Expenses: ${total_expenses}")
+    logger.debug(f"Quarterly Income: {quarterly_income}")
+    logger.debug(f"Quarterly Expenses: {quarterly_expenses}")
     
     # Budget used = total expenses
     budget_used = total_expenses
     budget_percentage = (budget_used / total_budget * 100) if total_budget > 0 else 0
     
-    print(f"Budget: ${budget_used:.2f} used / ${total_budget:.2f} total = {budget_percentage:.1f}%")
-    
-    # Get current year
-    current_year = datetime.now().year
-    
-    # QUARTERLY INCOME DATA
-    quarterly_income_data = db.query(
-        func.floor((extract('month', Transaction.created_at) - 1) / 3).label('quarter_num'),
-        func.sum(Transaction.amount).label('total')
+    logger.debug(f"Budget: ${budget_used:.2f} used / ${total_budget:.2f} total = {budget_percentage:.1f}%")
+    
+    # 3) The 10 latest income and 10 latest expense transactions, ranked per kind;
+    # their category names come from the reference data, not lazy loads
+    is_income = Transaction.category_id.in_(business_income_ids)
+    ranked = db.query(
+        Transaction.id.label('id'),
+        func.row_number().over(
+            partition_by=is_income,
+            order_by=(desc(Transaction.created_at), desc(Transaction.id))
+        ).label('rank')
     ).filter(
         Transaction.user_id == target_user_id,
-        Transaction.category_id.in_(business_income_ids),
-        extract('year', Transaction.created_at) == current_year
-    ).group_by('quarter_num').all()
-    
-    # Build quarterly income array
-    quarterly_income = [
-        {"quarter": "Q1", "amount": 0.0},
-        {"quarter": "Q2", "amount": 0.0},
-        {"quarter": "Q3", "amount": 0.0},
-        {"quarter": "Q4", "amount": 0.0}
-    ]
+        Transaction.category_id.in_(business_category_ids)
+    ).subquery()
     
-    for q_num, total in quarterly_income_data:
-        if q_num is not None and 0 <= int(q_num) <= 3:
-            quarterly_income[int(q_num)]["amount"] = float(total) if total else 0.0
-    
-    print(f"Quarterly Income: {quarterly_income}")
-    
-    # QUARTERLY EXPENSE DATA
-    quarterly_expense_data = db.query(
-        func.floor((extract('month', Transaction.created_at) - 1) / 3).label('quarter_num'),
-        func.sum(Transaction.amount).label('total')
+    recent = db.query(Transaction).join(
+        ranked, ranked.c.id == Transaction.id
     ).filter(
-        Transaction.user_id == target_user_id,
-        Transaction.category_id.in_(business_expense_ids),
-        extract('year', Transaction.created_at) == current_year
-    ).group_by('quarter_num').all()
-    
-    # Build quarterly expense array
-    quarterly_expenses = [
-        {"quarter": "Q1", "amount": 0.0},
-        {"quarter": "Q2", "amount": 0.0},
-        {"quarter": "Q3", "amount": 0.0},
-        {"quarter": "Q4", "amount": 0.0}
-    ]
+        ranked.c.rank <= 10
+    ).order_by(desc(Transaction.created_at), desc(Transaction.id)).all()
     
-    for q_num, total in quarterly_expense_data:
-        if q_num is not None and 0 <= int(q_num) <= 3:
-            quarterly_expenses[int(q_num)]["amount"] = abs(float(total)) if total else 0.0
+    recent_income = [t for t in recent if t.category_id in business_income_ids]
+    recent_expenses = [t for t in recent if t.category_id in business_expense_ids]
     
-    print(f"Quarterly Expenses: {quarterly_expenses}")
-    
-    # Get recent income transactions
-    recent_income = db.query(Transaction).filter(
-        Transaction.user_id == target_user_id,
-        Transaction.category_id.in_(business_income_ids)
-    ).order_by(desc(Transaction.created_at)).limit(10).all()
-    
-    # Get recent expense transactions
-    recent_expenses = db.query(Transaction).filter(
-        Transaction.user_id == target_user_id,
-        Transaction.category_id.in_(business_expense_ids)
-    ).order_by(desc(Transaction.created_at)).limit(10).all()
-    
-    print(f"Recent transactions: {len(recent_income)} income, {len(recent_expenses)} expenses")
+    logger.debug(f"Recent transactions: {len(recent_income)} income, {len(recent_expenses)} expenses")
     
     # Format income for frontend
     formatted_income = []
     for trans in recent_income:
-        category_name = trans.category.name if trans.category else f"Income Category {trans.category_id}"
+        category = refs.category(trans.category_id)
+        category_name = category.name if category else f"Income Category {trans.category_id}"
         formatted_income.append({
             "id": trans.id,
             "description": category_name,
@@ -394,7 +341,8 @@ def get_business_dashboard_summary(
     # Format expenses for frontend
     formatted_expenses = []
     for trans in recent_expenses:
-        category_name = trans.category.name if trans.category else f"Expense Category {trans.category_id}"
+        category = refs.category(trans.category_id)
+        category_name = category.name if category else f"Expense Category {trans.category_id}"
         formatted_expenses.append({
             "id": trans.id,
             "description": category_name,
@@ -412,7 +360,7 @@ def get_business_dashboard_summary(
         "expenseData": quarterly_expenses,
         "recentIncome": formatted_income,
         "recentExpenses": formatted_expenses,
-        "business_name": profile.business_name or "Business",
+        "business_name": header.business_name or "Business",
         "stats": {
             "total_income": float(total_income),
             "total_expenses": float(total_expenses),
@@ -421,12 +369,21 @@ def get_business_dashboard_summary(
         }
     }
     
-    print(f"=== FINAL RESPONSE DATA ===")
-    print(f"Budget: ${response_data['budget']['used']} / ${response_data['budget']['total']}")
-    print(f"Income Data: {response_data['incomeData']}")
-    print(f"Expense Data: {response_data['expenseData']}")
-    print(f"Recent Income: {len(response_data['recentIncome'])} items")
-    print(f"Recent Expenses: {len(response_data['recentExpenses'])} items")
+    return response_data
+
+
+@router.get("/business/summary")
+def get_business_dashboard_summary(
+    response: Response,
+    user: User = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    """Get business dashboard data for the current user - works for both business_admin and business_subuser"""
+    with count_queries() as queries:
+        response_data = fetch_business_summary_helper(user, db)
+    
+    # Round trips for this endpoint, lazy loads included (verify_token's lookup is not counted)
+    response.headers["X-DB-Query-Count"] = str(queries.count)
     
     return response_data
 
@@ -448,7 +405,7 @@ def get_business_goals(
     # Find the business admin for this business
     admin_user = db.query(User).filter(
         User.business_id == business_id,
-        User.role_id == 2  # business_admin role
+        User.role_id == business_admin_role_id(db)
     ).first()
     
     if not admin_user:
@@ -543,7 +500,7 @@ def create_business_goal(
     # Find the business admin
     admin_user = db.query(User).filter(
         User.business_id == business_id,
-        User.role_id == 2
+        User.role_id == business_admin_role_id(db)
     ).first()
     
     if not admin_user:
@@ -585,7 +542,7 @@ def update_business_goal(
     # Find the business admin
     admin_user = db.query(User).filter(
         User.business_id == business_id,
-        User.role_id == 2
+        User.role_id == business_admin_role_id(db)
     ).first()
     
     if not admin_user:
@@ -638,7 +595,7 @@ def delete_business_goal(
     # Find the business admin
     admin_user = db.query(User).filter(
         User.business_id == business_id,
-        User.role_id == 2
+        User.role_id == business_admin_role_id(db)
     ).first()
     
     if not admin_user:
@@ -672,8 +629,9 @@ def test_business_data(user_id: int, db: Session = Depends(get_db)):
     budget_entries = db.query(BudgetEntry).filter(BudgetEntry.user_id == user_id).all()
     transactions = db.query(Transaction).filter(Transaction.user_id == user_id).all()
     
-    business_income_ids = [17, 18, 19, 20, 21]
-    business_expense_ids = [22, 23, 24, 25, 26, 27, 28, 29, 30]
+    refs = reference_data.get(db.get_bind())
+    business_income_ids = refs.category_ids(kind="income", scope="business")
+    business_expense_ids = refs.category_ids(kind="expense", scope="business")
     
     income_tx = [t for t in transactions if t.category_id in business_income_ids]
     expense_tx = [t for t in transactions if t.category_id in business_expense_ids]
@@ -705,7 +663,7 @@ def test_business_data(user_id: int, db: Session = Depends(get_db)):
                 {
                     "id": t.id,
                     "category_id": t.category_id,
-                    "category_name": t.category.name if t.category else None,
+                    "category_name": getattr(refs.category(t.category_id), "name", None),
                     "amount": t.amount,
                     "date": t.created_at
                 } for t in income_tx
@@ -714,7 +672,7 @@ def test_business_data(user_id: int, db: Session = Depends(get_db)):
                 {
                     "id": t.id,
                     "category_id": t.category_id,
-                    "category_name": t.category.name if t.category else None,
+                    "category_name": getattr(refs.category(t.category_id), "name", None),
                     "amount": t.amount,
                     "date": t.created_at
                 } for t in expense_tx
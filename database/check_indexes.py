@@ -0,0 +1,178 @@
+"""
+Fail if any dashboard or llm_% view query would scan a core table sequentially.
+
+    python database/check_indexes.py
+    python database/check_indexes.py --database-url postgresql://... --verbose
+
+Each query below mirrors one access path in backend/routers/dashboard_router.py,
+the chat history API or the llm_% views (filtered by user_id, as the SQL guard
+scopes them). Each is EXPLAINed with enable_seqscan off, so the planner picks a
+Seq Scan only when no index can serve it, however small the tables are.
+Sequential scans of the small reference tables (categories, roles,
+businesses) are expected and ignored.
+
+Needs a Postgres database with db.sql and the migrations applied; nothing is
+written.
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import date, datetime
+from typing import Dict, Any, List
+
+from sqlalchemy import create_engine, text
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CORE_TABLES = {"transactions", "transaction_rollups", "llm_budget_overview_mv", "llmlogs", "budgetentries", "budgets", "goals", "profiles", "users", "authcredentials"}
+
+PARAMS = {
+    "user_id": 1,
+    "business_id": 1,
+    "admin_role_id": 2,
+    "income_ids": [17, 18, 19, 20, 21],
+    "expense_ids": [22, 23, 24, 25, 26, 27, 28, 29, 30],
+    "month": date(2026, 1, 1),
+    "year_start": date(2026, 1, 1),
+    "year_end": date(2027, 1, 1),
+    "session_id": "session",
+    "cursor_ts": datetime(2026, 1, 1),
+    "cursor_id": 1000,
+}
+
+QUERIES = {
+    "recent_purchases": """
+        SELECT * FROM transactions WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 10
+    """,
+    "expense_categories_month": """
+        SELECT c.name, c.id, SUM(r.amount_sum) FROM categories c JOIN transaction_rollups r ON r.category_id = c.id
+        WHERE r.user_id = :user_id AND r.txn_count > 0 AND c.kind = 'expense' AND r.month = :month
+        GROUP BY c.id, c.name
+    """,
+    "profile": """
+        SELECT * FROM profiles WHERE user_id = :user_id LIMIT 1
+    """,
+    "business_admin": """
+        SELECT * FROM users WHERE business_id = :business_id AND role_id = :admin_role_id LIMIT 1
+    """,
+    "business_budget_entry": """
+        SELECT * FROM budgetentries WHERE user_id = :user_id LIMIT 1
+    """,
+    "business_total": """
+        SELECT SUM(amount_sum) FROM transaction_rollups WHERE user_id = :user_id AND category_id = ANY(:expense_ids)
+    """,
+    "business_quarterly": """
+        SELECT FLOOR((EXTRACT(MONTH FROM month) - 1) / 3) AS quarter_num, SUM(amount_sum) FROM transaction_rollups
+        WHERE user_id = :user_id AND month >= :year_start AND month < :year_end AND category_id = ANY(:income_ids)
+        GROUP BY quarter_num
+    """,
+    "business_recent": """
+        SELECT * FROM transactions WHERE user_id = :user_id AND category_id = ANY(:expense_ids)
+        ORDER BY created_at DESC LIMIT 10
+    """,
+    "goals": """
+        SELECT * FROM goals WHERE user_id = :user_id
+    """,
+    "business_goals": """
+        SELECT * FROM goals WHERE user_id = :user_id AND type = 'business'
+    """,
+    "chat_history": """
+        SELECT id, prompt, response, timestamp FROM llmlogs
+        WHERE user_id = :user_id AND (timestamp, id) < (:cursor_ts, :cursor_id)
+        ORDER BY timestamp DESC, id DESC LIMIT 51
+    """,
+    "chat_history_session": """
+        SELECT id, prompt, response, timestamp FROM llmlogs WHERE user_id = :user_id AND session_id = :session_id
+        ORDER BY timestamp DESC, id DESC LIMIT 51
+    """,
+    "llm_transaction_summary": """
+        SELECT * FROM llm_transaction_summary WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 101
+    """,
+    "llm_budget_overview": """
+        SELECT * FROM llm_budget_overview WHERE user_id = :user_id LIMIT 101
+    """,
+    "llm_budget_overview_mv": """
+        SELECT * FROM llm_budget_overview_mv WHERE user_id = :user_id LIMIT 101
+    """,
+    "budget_overview_from_transactions": """
+        SELECT * FROM budget_overview_from_transactions WHERE user_id = :user_id LIMIT 101
+    """,
+    "llm_financial_overview": """
+        SELECT * FROM llm_financial_overview WHERE user_id = :user_id LIMIT 101
+    """,
+    "llm_goal_progress": """
+        SELECT * FROM llm_goal_progress WHERE user_id = :user_id LIMIT 101
+    """,
+    "llm_user_profile": """
+        SELECT * FROM llm_user_profile WHERE user_id = :user_id LIMIT 101
+    """,
+    # The SQL guard ORs these two together; each branch needs its own index
+    "llm_business_hierarchy": """
+        SELECT * FROM llm_business_hierarchy WHERE user_id = :user_id LIMIT 101
+    """,
+    "llm_business_hierarchy_team": """
+        SELECT * FROM llm_business_hierarchy
+        WHERE admin_user_email IN (SELECT email FROM llm_business_hierarchy WHERE user_id = :user_id)
+        LIMIT 101
+    """,
+}
+
+
+def seq_scans(plan: Dict[str, Any]) -> List[str]:
+    """Core tables read by a Seq Scan anywhere in a JSON plan"""
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in CORE_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found += seq_scans(child)
+    return found
+
+
+def explain(conn, sql: str) -> Dict[str, Any]:
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), PARAMS).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def check(engine, verbose: bool = False) -> List[str]:
+    """Names of the queries that still scan a core table"""
+    failures = []
+    with engine.connect() as conn:
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+        for name, sql in QUERIES.items():
+            plan = explain(conn, sql)
+            scanned = sorted(set(seq_scans(plan)))
+            status = f"SEQ SCAN on {', '.join(scanned)}" if scanned else "ok"
+            print(f"{name:<26} {status}")
+            if verbose:
+                print(json.dumps(plan, indent=2))
+            if scanned:
+                failures.append(name)
+        conn.rollback()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", default=None, help="defaults to DATABASE_URL from the backend settings")
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    url = args.database_url
+    if url is None:
+        if PROJECT_ROOT not in sys.path:
+            sys.path.insert(0, PROJECT_ROOT)
+        from backend.core.config import settings
+        url = settings.DATABASE_URL
+
+    failures = check(create_engine(url), verbose=args.verbose)
+    if failures:
+        print(f"\n{len(failures)} of {len(QUERIES)} queries fall back to a sequential scan: {', '.join(failures)}")
+        sys.exit(1)
+    print(f"\nAll {len(QUERIES)} queries use indexes")
+
+
+if __name__ == "__main__":
+    main()
@@ -60,7 +60,9 @@ CREATE TABLE public.categories (
     name VARCHAR(100) NOT NULL UNIQUE,
     kind VARCHAR(20) NOT NULL,
     parent_id INTEGER REFERENCES public.categories(id) ON DELETE SET NULL,
-    CONSTRAINT categories_kind_check CHECK (kind IN ('income', 'expense'))
+    scope VARCHAR(20) NOT NULL DEFAULT 'personal',
+    CONSTRAINT categories_kind_check CHECK (kind IN ('income', 'expense')),
+    CONSTRAINT categories_scope_check CHECK (scope IN ('personal', 'business'))
 );
 COMMENT ON TABLE public.categories IS 'Income and expense categories with hierarchical support';
 
@@ -92,6 +94,18 @@ CREATE TABLE public.transactions (
 );
 COMMENT ON TABLE public.transactions IS 'User financial transactions';
 
+CREATE TABLE public.transaction_rollups (
+    user_id INTEGER NOT NULL,
+    category_id INTEGER NOT NULL,
+    month DATE NOT NULL,
+    amount_sum NUMERIC(14,2) NOT NULL DEFAULT 0,
+    income_sum NUMERIC(14,2) NOT NULL DEFAULT 0,
+    expense_sum NUMERIC(14,2) NOT NULL DEFAULT 0,
+    txn_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, category_id, month)
+);
+COMMENT ON TABLE public.transaction_rollups IS 'Monthly per-category transaction totals; income_sum adds amounts >= 0, expense_sum the absolute value of amounts < 0';
+
 CREATE TABLE public.goals (
     id SERIAL PRIMARY KEY,
     user_id INTEGER NOT NULL REFERENCES public.users(id),
@@ -134,9 +148,116 @@ $$ LANGUAGE plpgsql STABLE;
 
 COMMENT ON FUNCTION public.can_modify_financial_data(user_id INTEGER) IS 'Check if user has write permissions for financial data';
 
+-- transaction_rollups maintenance (see migrations/0002_transaction_rollups.sql)
+CREATE OR REPLACE FUNCTION public.transaction_rollups_apply()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.category_id IS NOT NULL AND OLD.created_at IS NOT NULL THEN
+        UPDATE public.transaction_rollups
+        SET amount_sum = amount_sum - OLD.amount,
+            income_sum = income_sum - GREATEST(OLD.amount, 0),
+            expense_sum = expense_sum - GREATEST(-OLD.amount, 0),
+            txn_count = txn_count - 1
+        WHERE user_id = OLD.user_id
+          AND category_id = OLD.category_id
+          AND month = date_trunc('month', OLD.created_at)::date;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.category_id IS NOT NULL AND NEW.created_at IS NOT NULL THEN
+        INSERT INTO public.transaction_rollups AS r
+            (user_id, category_id, month, amount_sum, income_sum, expense_sum, txn_count)
+        VALUES (
+            NEW.user_id, NEW.category_id, date_trunc('month', NEW.created_at)::date,
+            NEW.amount, GREATEST(NEW.amount, 0), GREATEST(-NEW.amount, 0), 1
+        )
+        ON CONFLICT (user_id, category_id, month) DO UPDATE
+        SET amount_sum = r.amount_sum + EXCLUDED.amount_sum,
+            income_sum = r.income_sum + EXCLUDED.income_sum,
+            expense_sum = r.expense_sum + EXCLUDED.expense_sum,
+            txn_count = r.txn_count + 1;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER transactions_rollups
+AFTER INSERT OR UPDATE OR DELETE ON public.transactions
+FOR EACH ROW EXECUTE FUNCTION public.transaction_rollups_apply();
+
+CREATE OR REPLACE FUNCTION public.rebuild_transaction_rollups()
+RETURNS INTEGER AS $$
+DECLARE
+    rows_written INTEGER;
+BEGIN
+    -- Block writers (not readers) so no trigger update interleaves with the rebuild
+    LOCK TABLE public.transactions IN SHARE MODE;
+    DELETE FROM public.transaction_rollups;
+    INSERT INTO public.transaction_rollups
+        (user_id, category_id, month, amount_sum, income_sum, expense_sum, txn_count)
+    SELECT
+        user_id,
+        category_id,
+        date_trunc('month', created_at)::date,
+        SUM(amount),
+        SUM(GREATEST(amount, 0)),
+        SUM(GREATEST(-amount, 0)),
+        COUNT(*)
+    FROM public.transactions
+    WHERE category_id IS NOT NULL AND created_at IS NOT NULL
+    GROUP BY 1, 2, 3;
+    GET DIAGNOSTICS rows_written = ROW_COUNT;
+    RETURN rows_written;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Reference data version (see migrations/0004_reference_data_version.sql)
+CREATE TABLE public.reference_data_version (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 1
+);
+COMMENT ON TABLE public.reference_data_version IS 'Single-row counter bumped on every write to categories or roles; in-process caches reload when it changes';
+INSERT INTO public.reference_data_version (id, version) VALUES (1, 1);
+
+CREATE OR REPLACE FUNCTION public.bump_reference_data_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE public.reference_data_version SET version = version + 1 WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER categories_reference_data_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.categories
+FOR EACH STATEMENT EXECUTE FUNCTION public.bump_reference_data_version();
+
+CREATE TRIGGER roles_reference_data_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.roles
+FOR EACH STATEMENT EXECUTE FUNCTION public.bump_reference_data_version();
+
 -- Create views
 CREATE VIEW public.llm_budget_overview AS
-SELECT 
+SELECT
+    b.user_id,
+    b.month,
+    c.name AS category_name,
+    c.kind AS category_kind,
+    be.planned AS budgeted_amount,
+    COALESCE(SUM(r.expense_sum), 0) AS actual_expenses,
+    COALESCE(SUM(r.income_sum), 0) AS actual_income
+FROM public.budgets b
+JOIN public.budgetentries be ON b.id = be.budget_id
+JOIN public.categories c ON be.category_id = c.id
+LEFT JOIN public.transaction_rollups r ON (
+    r.user_id = b.user_id
+    AND r.category_id = c.id
+    AND r.month = date_trunc('month', b.month)::date
+)
+GROUP BY b.user_id, b.month, c.name, c.kind, be.planned;
+
+-- Same rows from raw transactions, bounded by a half-open month range (see migrations/0003)
+CREATE VIEW public.budget_overview_from_transactions AS
+SELECT
     b.user_id,
     b.month,
     c.name AS category_name,
@@ -148,13 +269,27 @@ FROM public.budgets b
 JOIN public.budgetentries be ON b.id = be.budget_id
 JOIN public.categories c ON be.category_id = c.id
 LEFT JOIN public.transactions t ON (
-    t.user_id = b.user_id 
-    AND t.category_id = c.id 
-    AND EXTRACT(MONTH FROM t.created_at) = EXTRACT(MONTH FROM b.month)
-    AND EXTRACT(YEAR FROM t.created_at) = EXTRACT(YEAR FROM b.month)
+    t.user_id = b.user_id
+    AND t.category_id = c.id
+    AND t.created_at >= date_trunc('month', b.month)
+    AND t.created_at < date_trunc('month', b.month) + INTERVAL '1 month'
 )
 GROUP BY b.user_id, b.month, c.name, c.kind, be.planned;
 
+-- Materialized copy read when BUDGET_OVERVIEW_MATERIALIZED is on
+CREATE MATERIALIZED VIEW public.llm_budget_overview_mv AS
+SELECT * FROM public.llm_budget_overview;
+
+CREATE UNIQUE INDEX ux_llm_budget_overview_mv
+    ON public.llm_budget_overview_mv (user_id, month, category_name, budgeted_amount);
+
+CREATE OR REPLACE FUNCTION public.refresh_budget_overview()
+RETURNS VOID AS $$
+BEGIN
+    REFRESH MATERIALIZED VIEW CONCURRENTLY public.llm_budget_overview_mv;
+END;
+$$ LANGUAGE plpgsql;
+
 CREATE VIEW public.llm_transaction_summary AS
 SELECT 
     t.user_id,
@@ -187,7 +322,7 @@ LEFT JOIN public.profiles admin_profile ON admin_user.id = admin_profile.user_id
 WHERE r.role_name IN ('business_admin', 'business_subuser');
 
 CREATE VIEW public.llm_financial_overview AS
-SELECT 
+SELECT
     'transaction' AS data_source,
     t.user_id,
     NULL::DATE AS month,
@@ -202,26 +337,19 @@ SELECT
 FROM public.transactions t
 JOIN public.categories c ON t.category_id = c.id
 UNION ALL
-SELECT 
+SELECT
     'budget' AS data_source,
-    b.user_id,
-    b.month,
-    c.name AS category_name,
-    c.kind AS category_kind,
-    be.planned AS budgeted_amount,
+    bov.user_id,
+    bov.month,
+    bov.category_name,
+    bov.category_kind,
+    bov.budgeted_amount,
     bov.actual_income,
     bov.actual_expenses,
     NULL::NUMERIC AS amount,
     NULL::NUMERIC AS absolute_amount,
-    b.month AS date
-FROM public.budgets b
-JOIN public.budgetentries be ON b.id = be.budget_id
-JOIN public.categories c ON be.category_id = c.id
-LEFT JOIN public.llm_budget_overview bov ON (
-    bov.user_id = b.user_id 
-    AND bov.month = b.month 
-    AND bov.category_name = c.name
-);
+    bov.month AS date
+FROM public.llm_budget_overview bov;
 
 CREATE VIEW public.llm_goal_progress AS
 SELECT 
@@ -259,4 +387,17 @@ ADD CONSTRAINT users_business_id_fkey FOREIGN KEY (business_id) REFERENCES publi
 ADD CONSTRAINT users_admin_email_fkey FOREIGN KEY (admin_email) REFERENCES public.users(email);
 
 ALTER TABLE public.businesses 
-ADD CONSTRAINT businesses_created_by_fkey FOREIGN KEY (created_by) REFERENCES public.users(id);
\ No newline at end of file
+ADD CONSTRAINT businesses_created_by_fkey FOREIGN KEY (created_by) REFERENCES public.users(id);
+
+-- Secondary indexes for the dashboard, chat history and llm_% view access paths
+-- (existing databases get them from migrations/0001_core_secondary_indexes.sql)
+CREATE INDEX ix_transactions_user_created_at ON public.transactions (user_id, created_at);
+CREATE INDEX ix_transactions_user_category_created_at ON public.transactions (user_id, category_id, created_at);
+CREATE INDEX ix_budgets_user_month ON public.budgets (user_id, month);
+CREATE INDEX ix_budgetentries_user_id ON public.budgetentries (user_id);
+CREATE INDEX ix_budgetentries_budget_id ON public.budgetentries (budget_id);
+CREATE INDEX ix_goals_user_type ON public.goals (user_id, type);
+CREATE INDEX ix_users_business_role ON public.users (business_id, role_id);
+CREATE INDEX ix_users_admin_email ON public.users (admin_email);
+CREATE INDEX ix_llmlogs_user_session_timestamp_id ON public.llmlogs (user_id, session_id, timestamp, id);
+CREATE INDEX ix_llmlogs_user_timestamp_id ON public.llmlogs (user_id, timestamp, id);
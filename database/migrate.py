@@ -0,0 +1,129 @@
+"""
+Apply the versioned SQL migrations in database/migrations to a database.
+
+    python database/migrate.py                 # apply everything not yet applied
+    python database/migrate.py --list          # show applied / pending versions
+    python database/migrate.py --database-url postgresql://...
+
+Migrations are NNNN_name.sql files applied in version order and recorded in
+schema_migrations. A file runs in one transaction unless it contains the
+line `-- migrate: no-transaction` (needed for CREATE INDEX CONCURRENTLY);
+its statements then run one by one, so each must be safe to re-run. If a
+concurrent index build fails, Postgres leaves an INVALID index behind that
+IF NOT EXISTS would skip: drop it and run the migration again.
+
+Statements are split on `;` at the end of a line; function bodies must be
+quoted with $$ so their inner statements stay together.
+"""
+import argparse
+import os
+import re
+import sys
+from typing import List, Tuple
+
+from sqlalchemy import create_engine, text
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+NO_TRANSACTION = "-- migrate: no-transaction"
+
+CREATE_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version VARCHAR(4) PRIMARY KEY,
+        name VARCHAR(200) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def discover(directory: str = MIGRATIONS_DIR) -> List[Tuple[str, str, str]]:
+    """(version, name, path) for every migration file, oldest first"""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((match.group(1), match.group(2), os.path.join(directory, filename)))
+    return migrations
+
+
+def split_statements(sql: str) -> List[str]:
+    """Statements end with `;` at the end of a line, outside $$-quoted function bodies"""
+    statements, current, in_body = [], [], False
+    for line in sql.splitlines():
+        if line.strip().startswith("--"):
+            continue
+        current.append(line)
+        if line.count("$$") % 2:
+            in_body = not in_body
+        if not in_body and line.rstrip().endswith(";"):
+            statements.append("\n".join(current).strip().rstrip(";").strip())
+            current = []
+    if "\n".join(current).strip():
+        statements.append("\n".join(current).strip())
+    return statements
+
+
+def applied_versions(engine) -> set:
+    with engine.begin() as conn:
+        conn.execute(text(CREATE_MIGRATIONS_TABLE))
+        return set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+
+def apply_migration(engine, version: str, name: str, path: str):
+    with open(path, encoding="utf-8") as f:
+        sql = f.read()
+    statements = split_statements(sql)
+    record = text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)")
+
+    if NO_TRANSACTION in sql:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+            conn.execute(record, {"version": version, "name": name})
+    else:
+        with engine.begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+            conn.execute(record, {"version": version, "name": name})
+
+
+def migrate(engine, directory: str = MIGRATIONS_DIR) -> List[str]:
+    """Apply pending migrations in order; returns the versions applied"""
+    done = applied_versions(engine)
+    applied = []
+    for version, name, path in discover(directory):
+        if version in done:
+            continue
+        print(f"Applying {version}_{name} ...")
+        apply_migration(engine, version, name, path)
+        applied.append(version)
+    return applied
+
+
+def default_database_url() -> str:
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+    from backend.core.config import settings
+    return settings.DATABASE_URL
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", default=None, help="defaults to DATABASE_URL from the backend settings")
+    parser.add_argument("--list", action="store_true", help="list migrations without applying them")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url or default_database_url())
+    if args.list:
+        done = applied_versions(engine)
+        for version, name, _ in discover():
+            print(f"{version}_{name}: {'applied' if version in done else 'pending'}")
+        return
+
+    applied = migrate(engine)
+    print(f"Applied {len(applied)} migration(s)" if applied else "Database is up to date")
+
+
+if __name__ == "__main__":
+    main()
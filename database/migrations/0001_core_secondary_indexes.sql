@@ -0,0 +1,44 @@
+-- Secondary indexes for the access paths of dashboard_router and the llm_% views.
+-- Every query filters by user_id first; the trailing columns match its other
+-- filters and sort order. profiles.user_id and users.email are already indexed
+-- by their UNIQUE constraints. Built CONCURRENTLY so writes are not blocked.
+-- migrate: no-transaction
+
+-- Recent purchases, month ranges and llm_transaction_summary: user_id, ordered/ranged by created_at
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transactions_user_created_at
+    ON public.transactions (user_id, created_at);
+
+-- Business totals, quarterly charts, recent rows per kind and the llm_budget_overview join
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transactions_user_category_created_at
+    ON public.transactions (user_id, category_id, created_at);
+
+-- llm_budget_overview / llm_financial_overview start from a user's budget months
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_budgets_user_month
+    ON public.budgets (user_id, month);
+
+-- Budget lookup on the business dashboard
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_budgetentries_user_id
+    ON public.budgetentries (user_id);
+
+-- budgets -> budgetentries join in the budget views
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_budgetentries_budget_id
+    ON public.budgetentries (budget_id);
+
+-- Goals page and business goals (user_id, type = 'business')
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_goals_user_type
+    ON public.goals (user_id, type);
+
+-- Business admin lookup (business_id, role_id) on every business dashboard call
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_business_role
+    ON public.users (business_id, role_id);
+
+-- llm_business_hierarchy joins users to their admin by email, and admins read their team by it
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_admin_email
+    ON public.users (admin_email);
+
+-- Chat history pages, per session and across a user's sessions
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_llmlogs_user_session_timestamp_id
+    ON public.llmlogs (user_id, session_id, timestamp, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_llmlogs_user_timestamp_id
+    ON public.llmlogs (user_id, timestamp, id);
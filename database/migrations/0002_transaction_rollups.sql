@@ -0,0 +1,104 @@
+-- Monthly per-category totals of transactions, kept current by a trigger so every
+-- write path (DataHandler SQL, ORM routers, manual fixes) updates them in the same
+-- transaction. Readers that only need monthly totals read these rows instead of
+-- re-aggregating transactions; their cost follows the number of months, not rows.
+-- Transactions without a category or created_at are left out: every reader joins
+-- categories. rebuild_transaction_rollups() recomputes everything (after a TRUNCATE
+-- or bulk load with the trigger disabled); database/rebuild_rollups.py calls it.
+
+CREATE TABLE IF NOT EXISTS public.transaction_rollups (
+    user_id INTEGER NOT NULL,
+    category_id INTEGER NOT NULL,
+    month DATE NOT NULL,
+    amount_sum NUMERIC(14,2) NOT NULL DEFAULT 0,
+    income_sum NUMERIC(14,2) NOT NULL DEFAULT 0,
+    expense_sum NUMERIC(14,2) NOT NULL DEFAULT 0,
+    txn_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, category_id, month)
+);
+COMMENT ON TABLE public.transaction_rollups IS 'Monthly per-category transaction totals; income_sum adds amounts >= 0, expense_sum the absolute value of amounts < 0';
+
+CREATE OR REPLACE FUNCTION public.transaction_rollups_apply()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.category_id IS NOT NULL AND OLD.created_at IS NOT NULL THEN
+        UPDATE public.transaction_rollups
+        SET amount_sum = amount_sum - OLD.amount,
+            income_sum = income_sum - GREATEST(OLD.amount, 0),
+            expense_sum = expense_sum - GREATEST(-OLD.amount, 0),
+            txn_count = txn_count - 1
+        WHERE user_id = OLD.user_id
+          AND category_id = OLD.category_id
+          AND month = date_trunc('month', OLD.created_at)::date;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.category_id IS NOT NULL AND NEW.created_at IS NOT NULL THEN
+        INSERT INTO public.transaction_rollups AS r
+            (user_id, category_id, month, amount_sum, income_sum, expense_sum, txn_count)
+        VALUES (
+            NEW.user_id, NEW.category_id, date_trunc('month', NEW.created_at)::date,
+            NEW.amount, GREATEST(NEW.amount, 0), GREATEST(-NEW.amount, 0), 1
+        )
+        ON CONFLICT (user_id, category_id, month) DO UPDATE
+        SET amount_sum = r.amount_sum + EXCLUDED.amount_sum,
+            income_sum = r.income_sum + EXCLUDED.income_sum,
+            expense_sum = r.expense_sum + EXCLUDED.expense_sum,
+            txn_count = r.txn_count + 1;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS transactions_rollups ON public.transactions;
+CREATE TRIGGER transactions_rollups
+AFTER INSERT OR UPDATE OR DELETE ON public.transactions
+FOR EACH ROW EXECUTE FUNCTION public.transaction_rollups_apply();
+
+CREATE OR REPLACE FUNCTION public.rebuild_transaction_rollups()
+RETURNS INTEGER AS $$
+DECLARE
+    rows_written INTEGER;
+BEGIN
+    -- Block writers (not readers) so no trigger update interleaves with the rebuild
+    LOCK TABLE public.transactions IN SHARE MODE;
+    DELETE FROM public.transaction_rollups;
+    INSERT INTO public.transaction_rollups
+        (user_id, category_id, month, amount_sum, income_sum, expense_sum, txn_count)
+    SELECT
+        user_id,
+        category_id,
+        date_trunc('month', created_at)::date,
+        SUM(amount),
+        SUM(GREATEST(amount, 0)),
+        SUM(GREATEST(-amount, 0)),
+        COUNT(*)
+    FROM public.transactions
+    WHERE category_id IS NOT NULL AND created_at IS NOT NULL
+    GROUP BY 1, 2, 3;
+    GET DIAGNOSTICS rows_written = ROW_COUNT;
+    RETURN rows_written;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT public.rebuild_transaction_rollups();
+
+-- Budget months read their category totals from the rollups
+CREATE OR REPLACE VIEW public.llm_budget_overview AS
+SELECT
+    b.user_id,
+    b.month,
+    c.name AS category_name,
+    c.kind AS category_kind,
+    be.planned AS budgeted_amount,
+    COALESCE(SUM(r.expense_sum), 0) AS actual_expenses,
+    COALESCE(SUM(r.income_sum), 0) AS actual_income
+FROM public.budgets b
+JOIN public.budgetentries be ON b.id = be.budget_id
+JOIN public.categories c ON be.category_id = c.id
+LEFT JOIN public.transaction_rollups r ON (
+    r.user_id = b.user_id
+    AND r.category_id = c.id
+    AND r.month = date_trunc('month', b.month)::date
+)
+GROUP BY b.user_id, b.month, c.name, c.kind, be.planned;
@@ -0,0 +1,80 @@
+-- Budget overview variants.
+--
+-- budget_overview_from_transactions: the original llm_budget_overview computed
+-- from raw transactions, but joined on the half-open range [month, month + 1 month)
+-- instead of EXTRACT(MONTH/YEAR) equality, so ix_transactions_user_category_created_at
+-- bounds each budget line to its month. It returns the same rows as
+-- llm_budget_overview (which reads transaction_rollups) and is the reference to
+-- compare the rollups against.
+--
+-- llm_budget_overview_mv: a materialized copy of llm_budget_overview for
+-- deployments that set BUDGET_OVERVIEW_MATERIALIZED; the SQL guard then sends
+-- generated queries there. Its unique index lets refresh_budget_overview() use
+-- REFRESH ... CONCURRENTLY, so readers are never blocked.
+--
+-- llm_financial_overview read budgets, budgetentries and categories a second time
+-- only to join llm_budget_overview back onto them; its budget rows now come
+-- straight from llm_budget_overview.
+
+CREATE OR REPLACE VIEW public.budget_overview_from_transactions AS
+SELECT
+    b.user_id,
+    b.month,
+    c.name AS category_name,
+    c.kind AS category_kind,
+    be.planned AS budgeted_amount,
+    COALESCE(SUM(CASE WHEN t.amount < 0 THEN ABS(t.amount) ELSE 0 END), 0) AS actual_expenses,
+    COALESCE(SUM(CASE WHEN t.amount >= 0 THEN t.amount ELSE 0 END), 0) AS actual_income
+FROM public.budgets b
+JOIN public.budgetentries be ON b.id = be.budget_id
+JOIN public.categories c ON be.category_id = c.id
+LEFT JOIN public.transactions t ON (
+    t.user_id = b.user_id
+    AND t.category_id = c.id
+    AND t.created_at >= date_trunc('month', b.month)
+    AND t.created_at < date_trunc('month', b.month) + INTERVAL '1 month'
+)
+GROUP BY b.user_id, b.month, c.name, c.kind, be.planned;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS public.llm_budget_overview_mv AS
+SELECT * FROM public.llm_budget_overview;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_llm_budget_overview_mv
+    ON public.llm_budget_overview_mv (user_id, month, category_name, budgeted_amount);
+
+CREATE OR REPLACE FUNCTION public.refresh_budget_overview()
+RETURNS VOID AS $$
+BEGIN
+    REFRESH MATERIALIZED VIEW CONCURRENTLY public.llm_budget_overview_mv;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE VIEW public.llm_financial_overview AS
+SELECT
+    'transaction' AS data_source,
+    t.user_id,
+    NULL::DATE AS month,
+    c.name AS category_name,
+    c.kind AS category_kind,
+    NULL::NUMERIC AS budgeted_amount,
+    CASE WHEN c.kind = 'income' THEN ABS(t.amount) ELSE 0 END AS actual_income,
+    CASE WHEN c.kind = 'expense' THEN ABS(t.amount) ELSE 0 END AS actual_expenses,
+    t.amount,
+    ABS(t.amount) AS absolute_amount,
+    t.created_at AS date
+FROM public.transactions t
+JOIN public.categories c ON t.category_id = c.id
+UNION ALL
+SELECT
+    'budget' AS data_source,
+    bov.user_id,
+    bov.month,
+    bov.category_name,
+    bov.category_kind,
+    bov.budgeted_amount,
+    bov.actual_income,
+    bov.actual_expenses,
+    NULL::NUMERIC AS amount,
+    NULL::NUMERIC AS absolute_amount,
+    bov.month AS date
+FROM public.llm_budget_overview bov;
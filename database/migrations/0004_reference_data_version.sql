@@ -0,0 +1,59 @@
+-- Reference data (categories, roles) is cached in process by the API and the
+-- chat agents (backend/core/reference_data.py). reference_data_version holds
+-- one counter; a statement-level trigger bumps it on every write to either
+-- table, and each cache re-reads it every REFERENCE_DATA_CHECK_SECONDS and
+-- reloads when it moved.
+--
+-- categories.scope says whether a category belongs to the personal or the
+-- business dashboard, which the dashboard used to hard-code as id lists.
+-- Existing categories are backfilled by use: a category that only business
+-- admins and subusers have ever booked or budgeted against is business scope.
+-- Categories nobody has used yet stay personal; set their scope by hand.
+
+ALTER TABLE public.categories ADD COLUMN IF NOT EXISTS scope VARCHAR(20) NOT NULL DEFAULT 'personal';
+
+ALTER TABLE public.categories DROP CONSTRAINT IF EXISTS categories_scope_check;
+ALTER TABLE public.categories ADD CONSTRAINT categories_scope_check CHECK (scope IN ('personal', 'business'));
+
+WITH category_use AS (
+    SELECT used.category_id,
+           bool_and(r.role_name IN ('business_admin', 'business_subuser')) AS business_only
+    FROM (
+        SELECT user_id, category_id FROM public.transactions
+        UNION ALL
+        SELECT user_id, category_id FROM public.budgetentries
+    ) used
+    JOIN public.users u ON u.id = used.user_id
+    JOIN public.roles r ON r.id = u.role_id
+    WHERE used.category_id IS NOT NULL
+    GROUP BY used.category_id
+)
+UPDATE public.categories c SET scope = 'business'
+FROM category_use
+WHERE category_use.category_id = c.id AND category_use.business_only AND c.scope <> 'business';
+
+CREATE TABLE IF NOT EXISTS public.reference_data_version (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 1
+);
+COMMENT ON TABLE public.reference_data_version IS 'Single-row counter bumped on every write to categories or roles; in-process caches reload when it changes';
+
+INSERT INTO public.reference_data_version (id, version) VALUES (1, 1) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION public.bump_reference_data_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE public.reference_data_version SET version = version + 1 WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS categories_reference_data_version ON public.categories;
+CREATE TRIGGER categories_reference_data_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.categories
+FOR EACH STATEMENT EXECUTE FUNCTION public.bump_reference_data_version();
+
+DROP TRIGGER IF EXISTS roles_reference_data_version ON public.roles;
+CREATE TRIGGER roles_reference_data_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.roles
+FOR EACH STATEMENT EXECUTE FUNCTION public.bump_reference_data_version();
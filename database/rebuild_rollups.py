@@ -0,0 +1,46 @@
+"""
+Recompute transaction_rollups from the transactions table.
+
+    python database/rebuild_rollups.py
+    python database/rebuild_rollups.py --database-url postgresql://...
+
+The transactions_rollups trigger keeps the table current on every write, so
+this is only needed after writes that bypass it: TRUNCATE, a bulk load with
+triggers disabled, or restoring one table without the other. Writers to
+transactions wait while it runs; readers do not.
+"""
+import argparse
+import os
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rebuild(engine) -> int:
+    """Rebuild in one transaction; returns the number of rollup rows written"""
+    with engine.begin() as conn:
+        return conn.execute(text("SELECT public.rebuild_transaction_rollups()")).scalar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", default=None, help="defaults to DATABASE_URL from the backend settings")
+    args = parser.parse_args()
+
+    url = args.database_url
+    if url is None:
+        if PROJECT_ROOT not in sys.path:
+            sys.path.insert(0, PROJECT_ROOT)
+        from backend.core.config import settings
+        url = settings.DATABASE_URL
+
+    start = time.perf_counter()
+    rows = rebuild(create_engine(url))
+    print(f"Rebuilt transaction_rollups: {rows} rows in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Refresh llm_budget_overview_mv, the materialized copy of llm_budget_overview.
+
+    python database/refresh_budget_overview.py
+    python database/refresh_budget_overview.py --database-url postgresql://...
+
+Only needed with BUDGET_OVERVIEW_MATERIALIZED on. Chat writes refresh it
+themselves; run this on a schedule to pick up writes from everywhere else
+(dashboard forms, imports). The refresh is CONCURRENTLY, so budget queries
+keep reading the previous contents until it finishes.
+"""
+import argparse
+import os
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def refresh(engine):
+    with engine.begin() as conn:
+        conn.execute(text("SELECT public.refresh_budget_overview()"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", default=None, help="defaults to DATABASE_URL from the backend settings")
+    args = parser.parse_args()
+
+    url = args.database_url
+    if url is None:
+        if PROJECT_ROOT not in sys.path:
+            sys.path.insert(0, PROJECT_ROOT)
+        from backend.core.config import settings
+        url = settings.DATABASE_URL
+
+    start = time.perf_counter()
+    refresh(create_engine(url))
+    print(f"Refreshed llm_budget_overview_mv in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
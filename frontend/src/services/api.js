@@ -138,6 +138,15 @@ export const chatbotAPI = {
     return API.get("/chatbot/history", { params });
   },
 
+  // Get one page of chat turns, newest first; pass a page's before_cursor to load older turns
+  getChatHistoryPage: (limit = 50, { sessionId = null, before = null, after = null } = {}) => {
+    const params = { limit };
+    if (sessionId) params.session_id = sessionId;
+    if (before) params.before = before;
+    if (after) params.after = after;
+    return API.get("/chatbot/history/page", { params });
+  },
+
   // Clear chat history
   clearChatHistory: (sessionId = null) => {
     const params = sessionId ? { session_id: sessionId } : {};
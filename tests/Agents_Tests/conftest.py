@@ -0,0 +1,17 @@
+import sys
+import os
+
+# -------------------------------
+# Set required env vars for tests
+# -------------------------------
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+
+# --------------------------------------------
+# Add project root (agents/) and backend/ to path
+# --------------------------------------------
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BACKEND_DIR = os.path.join(PROJECT_ROOT, "backend")
+for path in (PROJECT_ROOT, BACKEND_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
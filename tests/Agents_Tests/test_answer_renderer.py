@@ -0,0 +1,65 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from agents.answer_renderer import AnswerRenderer
+from agents.sql_compiler import compile_question
+
+
+def result(columns, *rows):
+    return {"columns": columns, "data": list(rows), "rowcount": len(rows)}
+
+
+def test_scalar_total_uses_compiled_context():
+    compiled = compile_question("how much did I spend on groceries last month", today=date(2024, 4, 15))
+    answer = AnswerRenderer().render("how much did I spend on groceries last month",
+                                     result(["total_spent"], (Decimal("1234.5"),)), compiled)
+    assert answer == "You spent $1,234.50 on Food & Dining last month."
+
+
+def test_llm_generated_negative_sum_reads_as_spending():
+    answer = AnswerRenderer().render("how much did I spend", result(["total_spent"], (Decimal("-75.00"),)))
+    assert answer == "You spent $75.00."
+
+
+def test_empty_and_null_results():
+    renderer = AnswerRenderer()
+    assert renderer.render("what is my income", result(["total_income"])) == "No income found."
+    assert renderer.render("what is my income", result(["total_income"], (None,))) == "No income found."
+
+
+def test_category_breakdown_and_transactions():
+    renderer = AnswerRenderer()
+    breakdown = renderer.render(
+        "spending by category",
+        result(["category_name", "category_kind", "total_amount", "transaction_count"],
+               ("Housing", "expense", Decimal("1500"), 1), ("Food & Dining", "expense", Decimal("320.40"), 9)),
+    )
+    assert breakdown == "Spending by category: Housing $1,500.00, Food & Dining $320.40."
+    rows = renderer.render(
+        "show my expenses",
+        result(["amount", "category_name", "created_at"],
+               (Decimal("-75"), "Food & Dining", datetime(2024, 3, 3)), (Decimal("-20"), "Transportation", datetime(2024, 3, 2))),
+    )
+    assert rows.splitlines() == [
+        "Your expenses:",
+        "- Mar 03, 2024: -$75.00 (Food & Dining)",
+        "- Mar 02, 2024: -$20.00 (Transportation)",
+    ]
+
+
+def test_names_and_open_ended_results():
+    renderer = AnswerRenderer()
+    assert renderer.render("what business am I in", result(["business_name"], ("ABC Corp",))) == "Your business name is ABC Corp."
+    assert renderer.render("who works under me", result(["display_name"], ("Ann",), ("Bo",))) == "Found: Ann, Bo."
+    wide = result(["a", "b", "c", "d", "e"], (1, 2, 3, 4, 5), (6, 7, 8, 9, 10))
+    assert renderer.render("explain my finances", wide) is None
+    assert renderer.stats()["deferred_to_llm"] == 1
+
+
+def test_capped_results_do_not_claim_an_exact_count():
+    renderer = AnswerRenderer()
+    names = [(f"Name {i}",) for i in range(12)]
+    assert renderer.render("who works under me", result(["display_name"], *names)).endswith("and 2 more.")
+
+    capped = dict(result(["display_name"], *names), truncated=True)
+    assert renderer.render("who works under me", capped).endswith("and more than 2 more.")
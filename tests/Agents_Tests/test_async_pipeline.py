@@ -0,0 +1,41 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from agents.data_handler import DataHandler
+from agents.intent_classifier import IntentClassifier
+
+
+def test_async_create_awaits_llm_and_skips_sync_invoke():
+    llm = MagicMock()
+    llm.ainvoke = AsyncMock(return_value="INSERT INTO transactions (user_id, category_id, amount) VALUES (7, 10, -75.00)")
+    query_runner = MagicMock()
+    query_runner.execute_query.return_value = {"rowcount": 1}
+    handler = DataHandler(llm=llm, query_runner=query_runner)
+
+    result = asyncio.run(handler.aprocess_natural_language_create("log $75 dinner", "log $75 dinner", 7))
+
+    assert result["status"] == "COMPLETE"
+    llm.ainvoke.assert_awaited_once()
+    llm.invoke.assert_not_called()
+
+
+def test_async_update_reports_llm_failure():
+    llm = MagicMock()
+    llm.ainvoke = AsyncMock(side_effect=ConnectionError("ollama down"))
+    handler = DataHandler(llm=llm, query_runner=MagicMock())
+
+    result = asyncio.run(handler.aprocess_natural_language_update("change my budget", "change my budget", 7))
+
+    assert result["status"] == "ERROR"
+
+
+def test_aclassify_routes_view_to_async_query_runner():
+    query_runner = MagicMock()
+    query_runner.aprocess_natural_language_query = AsyncMock(return_value=("You spent $12.00.", "SELECT 1"))
+    classifier = IntentClassifier(llm=MagicMock(), query_runner=query_runner, data_handler=MagicMock())
+
+    response = asyncio.run(classifier.aclassify_intent("how much did I spend this month", 1))
+
+    assert response["intent"] == "VIEW"
+    assert response["result"]["answer"] == "You spent $12.00."
+    query_runner.process_natural_language_query.assert_not_called()
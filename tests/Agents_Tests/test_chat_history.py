@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, insert
+
+from agents.chat_history import as_messages, decode_cursor, encode_cursor, fetch_history_page
+from agents.chat_log import llmlogs
+
+START = datetime(2026, 1, 1, 9, 0)
+
+
+@pytest.fixture
+def conn(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    llmlogs.metadata.create_all(engine)
+    rows = [
+        {"user_id": 1, "session_id": "a" if i % 2 else "b", "prompt": f"q{i}", "response": f"r{i}",
+         "timestamp": START + timedelta(minutes=i)}
+        for i in range(12)
+    ]
+    # Two turns in the same second are ordered by id
+    rows.append({"user_id": 1, "session_id": "a", "prompt": "q12", "response": "r12",
+                 "timestamp": START + timedelta(minutes=11)})
+    rows.append({"user_id": 2, "session_id": "a", "prompt": "other", "response": "user", "timestamp": START})
+    with engine.begin() as connection:
+        connection.execute(insert(llmlogs), rows)
+    with engine.connect() as connection:
+        yield connection
+
+
+def prompts(page):
+    return [turn["prompt"] for turn in page["turns"]]
+
+
+def test_first_page_is_the_newest_turns(conn):
+    page = fetch_history_page(conn, 1, limit=3)
+
+    assert prompts(page) == ["q12", "q11", "q10"]
+    assert page["has_more"] is True
+
+
+def test_before_cursor_walks_back_without_gaps_or_repeats(conn):
+    seen, before = [], None
+    while True:
+        page = fetch_history_page(conn, 1, limit=5, before=before)
+        seen += prompts(page)
+        if not page["has_more"]:
+            break
+        before = page["before_cursor"]
+
+    assert seen == ["q12"] + [f"q{i}" for i in range(11, -1, -1)]
+
+
+def test_after_cursor_returns_newer_turns_newest_first(conn):
+    oldest = fetch_history_page(conn, 1, limit=3, before=fetch_history_page(conn, 1, limit=10)["before_cursor"])
+    assert prompts(oldest) == ["q2", "q1", "q0"]
+
+    newer = fetch_history_page(conn, 1, limit=2, after=oldest["after_cursor"])
+    assert prompts(newer) == ["q4", "q3"]
+    assert newer["has_more"] is True
+
+
+def test_session_filter_and_user_isolation(conn):
+    page = fetch_history_page(conn, 1, limit=3, session_id="b")
+    assert prompts(page) == ["q10", "q8", "q6"]
+
+    assert prompts(fetch_history_page(conn, 2)) == ["other"]
+
+
+def test_cursors_round_trip_and_reject_garbage(conn):
+    assert decode_cursor(encode_cursor(START, 42)) == (START, 42)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+    with pytest.raises(ValueError):
+        fetch_history_page(conn, 1, before=encode_cursor(START, 1), after=encode_cursor(START, 1))
+
+
+def test_as_messages_is_oldest_first_for_the_chat_ui(conn):
+    messages = as_messages(fetch_history_page(conn, 1, limit=2)["turns"])
+
+    assert [m["content"] for m in messages] == ["q11", "r11", "q12", "r12"]
+    assert [m["role"] for m in messages[:2]] == ["user", "agent"]
+    assert messages[0]["id"].startswith("user_")
@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from agents.chat_log import ChatLogSink, chat_turn, iter_in_turn, llmlogs
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'llmlogs.db'}")
+    llmlogs.metadata.create_all(engine)
+    return engine
+
+
+def count_rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(llmlogs)).scalar()
+
+
+def test_rows_are_written_in_batches_and_flushed_on_close(engine):
+    sink = ChatLogSink(engine=engine, batch_size=10, flush_seconds=60)
+
+    for i in range(25):
+        sink.submit(1, f"prompt {i}", f"response {i}", session_id="s1")
+    sink.close()
+
+    assert count_rows(engine) == 25
+    with engine.connect() as conn:
+        first = conn.execute(select(llmlogs).order_by(llmlogs.c.id)).first()
+    assert (first.user_id, first.session_id, first.prompt) == (1, "s1", "prompt 0")
+    assert sink.stats()["written"] == 25
+
+
+def test_partial_batch_is_written_after_flush_seconds(engine):
+    sink = ChatLogSink(engine=engine, batch_size=100, flush_seconds=0.05)
+    sink.submit(1, "hello", "hi")
+
+    deadline = time.time() + 2
+    while count_rows(engine) == 0 and time.time() < deadline:
+        time.sleep(0.02)
+
+    assert count_rows(engine) == 1
+    sink.close()
+
+
+def test_agent_rows_inside_a_turn_are_deduplicated(engine):
+    sink = ChatLogSink(engine=engine)
+
+    with chat_turn():
+        sink.submit(1, "what is my income", "answer", source="agent")
+    sink.submit(1, "what is my income", "answer")
+    sink.submit(1, "outside a turn", "answer", source="agent")
+    sink.close()
+
+    assert count_rows(engine) == 2
+    assert sink.stats()["deduplicated"] == 1
+
+
+def test_turn_follows_async_and_generator_steps(engine):
+    sink = ChatLogSink(engine=engine)
+
+    async def pipeline():
+        await asyncio.to_thread(sink.submit, 1, "q", "a", source="agent")
+
+    async def turn():
+        with chat_turn():
+            await pipeline()
+
+    def steps():
+        sink.submit(1, "q", "a", source="agent")
+        yield "step"
+
+    asyncio.run(turn())
+    assert list(iter_in_turn(steps())) == ["step"]
+    sink.close()
+
+    assert sink.stats()["deduplicated"] == 2
+    assert count_rows(engine) == 0
+
+
+def test_full_queue_drops_oldest_rows(engine):
+    sink = ChatLogSink(engine=engine, batch_size=1000, flush_seconds=60, max_queue=3)
+
+    for i in range(5):
+        sink.submit(1, f"prompt {i}", "r")
+    assert sink.stats()["dropped"] == 2
+    sink.close()
+
+    with engine.connect() as conn:
+        prompts = conn.execute(select(llmlogs.c.prompt).order_by(llmlogs.c.id)).scalars().all()
+    assert prompts == ["prompt 2", "prompt 3", "prompt 4"]
+
+
+def test_failed_batch_is_counted_not_raised(tmp_path):
+    sink = ChatLogSink(engine=create_engine(f"sqlite:///{tmp_path / 'empty.db'}"))
+    sink.submit(1, "p", "r")
+    sink.close()
+
+    stats = sink.stats()
+    assert stats["failed_batches"] == 1
+    assert stats["dropped"] == 1
@@ -0,0 +1,104 @@
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import agents.query_runner
+from agents.data_handler import DELETE_CONFIRM_MAX_ROWS, DataHandler
+from agents.query_runner import QueryRunner
+
+
+@pytest.fixture
+def transactions_engine(tmp_path, monkeypatch):
+    """A private transactions table; the shared test database is never touched"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'delete_preview.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE transactions (id INTEGER PRIMARY KEY, user_id INTEGER, "
+                          "amount NUMERIC, category_id INTEGER, created_at TEXT)"))
+    monkeypatch.setattr(agents.query_runner, "SessionLocal", sessionmaker(bind=engine, autoflush=False))
+    return engine
+
+
+def make_handler(engine, rows):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO transactions VALUES (:id, :user_id, :amount, :category_id, :created_at)"), rows)
+    query_runner = QueryRunner(llm=MagicMock(), enhancer=MagicMock())
+    query_runner.execute_read_only = MagicMock(wraps=query_runner.execute_read_only)
+    handler = DataHandler(llm=MagicMock(), query_runner=query_runner)
+    handler.log_interaction = MagicMock()
+    return handler
+
+
+def remaining_ids(engine):
+    with engine.connect() as conn:
+        return [r[0] for r in conn.execute(text("SELECT id FROM transactions ORDER BY id"))]
+
+
+def test_preview_counts_and_samples_in_one_query(transactions_engine):
+    rows = [{"id": i, "user_id": 1, "amount": -10 - i, "category_id": 4, "created_at": f"2026-01-{i:02d}"}
+            for i in range(1, 21)]
+    rows.append({"id": 99, "user_id": 2, "amount": -1, "category_id": 4, "created_at": "2026-01-30"})
+    handler = make_handler(transactions_engine, rows)
+
+    preview = handler._preview_delete("DELETE FROM transactions WHERE user_id = 1 AND category_id = 4;", 1)
+
+    assert handler.query_runner.execute_read_only.call_count == 1
+    assert preview["record_count"] == 20
+    assert [r["id"] for r in preview["sample_records"]] == [20, 19, 18, 17, 16]
+    assert sorted(preview["matched_ids"]) == list(range(1, 21))
+    assert "and 15 more" in preview["message"]
+
+
+def test_confirm_deletes_exactly_the_previewed_rows(transactions_engine):
+    rows = [{"id": i, "user_id": 1, "amount": -75, "category_id": 10, "created_at": f"2026-02-{i:02d}"}
+            for i in range(1, 4)]
+    handler = make_handler(transactions_engine, rows)
+
+    result = handler.process_natural_language_delete(
+        "", "delete the $75 expense I just added", 1,
+        llm_response="DELETE FROM transactions WHERE user_id = :user_id AND amount = -75 -- latest one\nORDER BY created_at DESC LIMIT 1"
+    )
+    assert result["status"] == "CONFIRM_REQUIRED"
+    assert result["preview"]["matched_ids"] == [3]
+
+    confirmed = handler.confirm_delete(1, result["confirmation_id"])
+
+    assert confirmed["rows_deleted"] == 1
+    assert remaining_ids(transactions_engine) == [1, 2]
+
+
+def test_large_previews_keep_every_id_and_later_rows_are_spared(transactions_engine):
+    rows = [{"id": i, "user_id": 1, "amount": -5, "category_id": 4, "created_at": "2026-03-01"} for i in range(1, 151)]
+    handler = make_handler(transactions_engine, rows)
+
+    result = handler.process_natural_language_delete(
+        "", "delete all my grocery expenses", 1,
+        llm_response="DELETE FROM transactions WHERE user_id = :user_id AND category_id = 4"
+    )
+    assert len(result["preview"]["matched_ids"]) == 150
+
+    # Inserted after the preview: matches the predicate, but the user never saw it
+    make_handler(transactions_engine, [{"id": 151, "user_id": 1, "amount": -5, "category_id": 4, "created_at": "2026-03-02"}])
+    confirmed = handler.confirm_delete(1, result["confirmation_id"])
+
+    assert confirmed["rows_deleted"] == 150
+    assert remaining_ids(transactions_engine) == [151]
+
+
+def test_too_many_matches_cannot_be_confirmed(transactions_engine):
+    count = DELETE_CONFIRM_MAX_ROWS + 1
+    rows = [{"id": i, "user_id": 1, "amount": -5, "category_id": 4, "created_at": "2026-03-01"} for i in range(1, count + 1)]
+    handler = make_handler(transactions_engine, rows)
+
+    result = handler.process_natural_language_delete(
+        "", "delete all my grocery expenses", 1,
+        llm_response="DELETE FROM transactions WHERE user_id = :user_id AND category_id = 4"
+    )
+    assert result["preview"]["record_count"] == count
+    assert result["preview"]["matched_ids"] is None
+
+    confirmed = handler.confirm_delete(1, result["confirmation_id"])
+
+    assert confirmed["status"] == "ERROR"
+    assert len(remaining_ids(transactions_engine)) == count
@@ -0,0 +1,46 @@
+from unittest.mock import MagicMock
+
+from agents.intent_classifier import IntentClassifier
+
+
+def make_classifier():
+    llm = MagicMock()
+    query_runner = MagicMock()
+    query_runner.process_natural_language_query.return_value = ("answer", "SELECT 1")
+    data_handler = MagicMock()
+    data_handler.process_natural_language_create.return_value = {"status": "COMPLETE", "message": "ok"}
+    return IntentClassifier(llm=llm, query_runner=query_runner, data_handler=data_handler)
+
+
+def test_score_intent_matches_keyword_precedence():
+    classifier = make_classifier()
+    assert classifier._score_intent("I spent $60 on shoes")["intent"] == "CREATE"
+    assert classifier._score_intent("delete my last transaction")["intent"] == "DELETE"
+    assert classifier._score_intent("set up a new budget")["intent"] == "CREATE"
+    assert classifier._score_intent("add up my expenses")["intent"] == "VIEW"
+    assert classifier._keyword_classify_intent("change my grocery budget to $600") == "UPDATE"
+
+
+def test_keywords_match_whole_words():
+    classifier = make_classifier()
+    assert classifier._score_intent("show my address")["intent"] == "VIEW"
+    assert "insert" not in classifier._match_groups("my mailing address")
+    assert "insert" not in classifier._match_groups("open my settings")
+    assert "insert" in classifier._match_groups("i added two expenses")
+    assert "delete" in classifier._match_groups("deleted it")
+
+
+def test_confident_keyword_match_skips_llm():
+    classifier = make_classifier()
+    result = classifier.classify_intent("how much did I spend this month", 1)
+    assert result["intent"] == "VIEW"
+    classifier.llm.invoke.assert_not_called()
+    assert classifier.gating_stats()["llm_skipped"] == 1
+
+
+def test_ambiguous_query_still_asks_llm():
+    classifier = make_classifier()
+    classifier.llm.invoke.return_value = '{"intent": "VIEW", "confidence": 0.9, "reason": "question"}'
+    classifier.classify_intent("I'd like some advice about saving money for retirement next year please", 1)
+    classifier.llm.invoke.assert_called_once()
+    assert classifier.gating_stats()["llm_called"] == 1
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from agents.intent_classifier import IntentClassifier
+from agents.llm_backends import FakeLLM, RecordingLLM, ReplayLLM, create_llm
+from agents.query_runner import QueryRunner
+
+
+def test_recorded_responses_replay_by_prompt(tmp_path):
+    path = tmp_path / "recordings.jsonl"
+    inner = MagicMock()
+    inner.model = "qwen3:0.6b"
+    inner.invoke.side_effect = lambda prompt: f"answer to {prompt}"
+    inner.stream.return_value = iter(["streamed ", "answer"])
+
+    recorder = RecordingLLM(inner, str(path))
+    recorder.invoke("first")
+    recorder.invoke("second")
+    assert "".join(recorder.stream("third")) == "streamed answer"
+
+    replay = ReplayLLM(str(path), model="qwen3:0.6b")
+    assert replay.invoke("second") == "answer to second"
+    assert asyncio.run(replay.ainvoke("first")) == "answer to first"
+    assert "".join(replay.stream("third")) == "streamed answer"
+    with pytest.raises(LookupError):
+        replay.invoke("never recorded")
+    assert replay.stats() == {"recorded_prompts": 3, "hits": 3, "misses": 1}
+
+
+def test_replay_applies_synthetic_latency_and_fallback(tmp_path):
+    path = tmp_path / "recordings.jsonl"
+    inner = MagicMock()
+    inner.model = "replay"
+    inner.invoke.return_value = "recorded"
+    RecordingLLM(inner, str(path)).invoke("hello")
+
+    replay = ReplayLLM(str(path), latency_ms=30, fallback=FakeLLM())
+    start = time.perf_counter()
+    assert replay.invoke("hello") == "recorded"
+    assert time.perf_counter() - start >= 0.03
+
+    assert replay.invoke("not recorded") == FakeLLM().respond("not recorded")
+    assert replay.stats()["misses"] == 1
+
+
+def test_fake_llm_drives_intent_classification_and_sql():
+    llm = FakeLLM()
+    classifier = IntentClassifier(llm=llm, query_runner=MagicMock(), data_handler=MagicMock())
+
+    assert classifier._llm_classify_intent("whatever happened to my savings")["intent"] == "VIEW"
+    assert classifier._llm_classify_intent("please remove that one")["intent"] == "DELETE"
+
+    query_runner = QueryRunner(llm=llm, enhancer=MagicMock())
+    assert "user_id = :user_id" in llm.invoke(query_runner._build_sql_prompt("how much did I spend", "schema"))
+
+
+def test_create_llm_backends():
+    assert isinstance(create_llm("qwen3:0.6b", "fake"), FakeLLM)
+    with pytest.raises(ValueError):
+        create_llm("qwen3:0.6b", "nope")
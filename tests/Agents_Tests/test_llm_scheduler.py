@@ -0,0 +1,140 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agents.llm_scheduler import LLMOverloadedError, LLMScheduler, llm_user
+
+
+def wait_for_queue(scheduler, depth):
+    deadline = time.monotonic() + 2
+    while scheduler.queue_depth < depth:
+        assert time.monotonic() < deadline, "waiter never queued"
+        time.sleep(0.001)
+
+
+def queue_call(scheduler, stage, user, served):
+    def run():
+        with llm_user(user):
+            with scheduler.slot(stage):
+                served.append((stage, user))
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_in_flight_is_bounded():
+    scheduler = LLMScheduler(max_in_flight=2)
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def call():
+        with scheduler.slot("answer"):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] == 2
+    assert scheduler.stats()["granted"] == 8
+    assert scheduler.in_flight == 0
+
+
+def test_answer_stage_jumps_ahead_of_new_classifications():
+    scheduler = LLMScheduler(max_in_flight=1)
+    served = []
+    with scheduler.slot("sql_gen"):
+        first = queue_call(scheduler, "classify", 1, served)
+        wait_for_queue(scheduler, 1)
+        second = queue_call(scheduler, "answer", 2, served)
+        wait_for_queue(scheduler, 2)
+    first.join()
+    second.join()
+
+    assert served == [("answer", 2), ("classify", 1)]
+
+
+def test_user_with_fewer_calls_in_flight_goes_first():
+    scheduler = LLMScheduler(max_in_flight=2)
+    served = []
+    holding, release_a = threading.Event(), threading.Event()
+
+    def busy_user_a():
+        with llm_user("a"):
+            with scheduler.slot("answer"):
+                holding.set()
+                release_a.wait(2)
+
+    holder = threading.Thread(target=busy_user_a)
+    holder.start()
+    holding.wait(2)
+    with llm_user("b"):
+        with scheduler.slot("answer"):
+            first = queue_call(scheduler, "answer", "a", served)
+            wait_for_queue(scheduler, 1)
+            second = queue_call(scheduler, "answer", "b", served)
+            wait_for_queue(scheduler, 2)
+    second.join()
+    release_a.set()
+    first.join()
+    holder.join()
+
+    assert served == [("answer", "b"), ("answer", "a")]
+
+
+def test_full_queue_and_long_waits_are_shed():
+    scheduler = LLMScheduler(max_in_flight=1, max_queue=0)
+    with scheduler.slot("answer"):
+        with pytest.raises(LLMOverloadedError) as shed:
+            with scheduler.slot("classify"):
+                pass
+    assert shed.value.reason == "queue_full"
+
+    scheduler = LLMScheduler(max_in_flight=1, max_queue=4, queue_timeout_seconds=0.02)
+    with scheduler.slot("answer"):
+        with pytest.raises(LLMOverloadedError) as shed:
+            with scheduler.slot("classify"):
+                pass
+    assert shed.value.reason == "timeout"
+    assert scheduler.stats()["shed"] == {"timeout": 1}
+    assert scheduler.queue_depth == 0 and scheduler.in_flight == 0
+
+
+def test_overload_is_not_swallowed_by_catch_all_handlers():
+    def agent_fallback():
+        try:
+            raise LLMOverloadedError("classify", "queue_full")
+        except Exception:
+            return "fallback"
+
+    with pytest.raises(LLMOverloadedError):
+        agent_fallback()
+
+
+def test_async_waiters_are_granted_in_priority_order():
+    scheduler = LLMScheduler(max_in_flight=1)
+    served = []
+
+    async def call(stage):
+        async with scheduler.aslot(stage):
+            served.append(stage)
+
+    async def main():
+        async with scheduler.aslot("sql_gen"):
+            classify = asyncio.create_task(call("classify"))
+            answer = asyncio.create_task(call("answer"))
+            await asyncio.sleep(0.01)
+            assert scheduler.queue_depth == 2
+        await asyncio.gather(classify, answer)
+
+    asyncio.run(main())
+    assert served == ["answer", "classify"]
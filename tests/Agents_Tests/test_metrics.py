@@ -0,0 +1,66 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from agents import metrics as metrics_module
+from agents.metrics import MetricsRegistry, ainvoke_llm, db_span, invoke_llm, stream_llm
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics_module, "metrics", registry)
+    return registry
+
+
+def make_llm(response="SELECT 1"):
+    llm = MagicMock()
+    llm.model = "qwen3:0.6b"
+    llm.invoke.return_value = response
+    llm.ainvoke = AsyncMock(return_value=response)
+    llm.stream.return_value = iter(["SELECT", " 1"])
+    return llm
+
+
+def test_invoke_records_latency_and_sizes(fresh_registry):
+    assert invoke_llm(make_llm(), "prompt", "sql_gen") == "SELECT 1"
+
+    snapshot = fresh_registry.snapshot()
+    assert snapshot["chat_llm_call_seconds"]["model=qwen3:0.6b,stage=sql_gen"]["count"] == 1
+    assert "p99" in snapshot["chat_llm_call_seconds"]["model=qwen3:0.6b,stage=sql_gen"]
+
+    text = fresh_registry.render_prometheus()
+    assert 'chat_llm_prompt_chars_sum{stage="sql_gen"} 6' in text
+    assert 'chat_llm_response_chars_sum{stage="sql_gen"} 8' in text
+
+
+def test_failed_call_counts_error_and_reraises(fresh_registry):
+    llm = make_llm()
+    llm.invoke.side_effect = RuntimeError("model unavailable")
+
+    with pytest.raises(RuntimeError):
+        invoke_llm(llm, "prompt", "classify")
+
+    assert 'chat_llm_errors_total{model="qwen3:0.6b",stage="classify"} 1.0' in fresh_registry.render_prometheus()
+
+
+def test_async_and_stream_are_tagged(fresh_registry):
+    llm = make_llm()
+    asyncio.run(ainvoke_llm(llm, "prompt", "enhance"))
+    assert "".join(stream_llm(llm, "prompt", "answer")) == "SELECT 1"
+
+    text = fresh_registry.render_prometheus()
+    assert 'chat_llm_call_seconds_count{model="qwen3:0.6b",stage="enhance"} 1' in text
+    assert 'chat_llm_first_token_seconds_count{model="qwen3:0.6b",stage="answer"} 1' in text
+    assert "# TYPE chat_llm_call_seconds summary" in text
+
+
+def test_db_span_times_failures(fresh_registry):
+    with pytest.raises(ValueError):
+        with db_span("execute"):
+            raise ValueError("bad sql")
+
+    text = fresh_registry.render_prometheus()
+    assert 'chat_db_errors_total{operation="execute"} 1.0' in text
+    assert 'chat_db_query_seconds_count{operation="execute"} 1' in text
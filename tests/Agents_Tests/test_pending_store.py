@@ -0,0 +1,68 @@
+import time
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from agents.data_handler import DataHandler
+from agents.pending_store import MemoryPendingStore, SQLPendingStore, create_pending_store
+
+
+@pytest.fixture(params=["memory", "sql"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryPendingStore()
+    return SQLPendingStore(f"sqlite:///{tmp_path / 'pending.db'}")
+
+
+def test_entries_are_keyed_by_user_and_confirmation(store):
+    store.put(1, "abc", {"sql_query": "DELETE ...", "created_at": datetime(2026, 1, 1)}, ttl_seconds=60)
+    store.put(1, "def", {"sql_query": "DELETE 2"}, ttl_seconds=60)
+    store.put(2, "abc", {"sql_query": "other user"}, ttl_seconds=60)
+
+    assert store.get(1, "abc")["sql_query"] == "DELETE ..."
+    assert list(store.list(1)) == ["abc", "def"]
+    assert store.pop(1, "abc")["sql_query"] == "DELETE ..."
+    assert store.pop(1, "abc") is None
+    assert store.get(2, "abc")["sql_query"] == "other user"
+    assert list(store.pop_all(1)) == ["def"]
+    assert store.list(1) == {}
+
+
+def test_expired_entries_disappear(store):
+    store.put(1, "old", {"sql_query": "DELETE old"}, ttl_seconds=0.01)
+    store.put(1, "new", {"sql_query": "DELETE new"}, ttl_seconds=60)
+    time.sleep(0.02)
+
+    assert store.get(1, "old") is None
+    assert list(store.list(1)) == ["new"]
+    assert store.stats()["pending"] == 1
+
+
+def test_sql_store_is_shared_between_workers(tmp_path):
+    url = f"sqlite:///{tmp_path / 'pending.db'}"
+    worker_a, worker_b = SQLPendingStore(url), SQLPendingStore(url)
+
+    worker_a.put(7, "xyz", {"sql_query": "DELETE ..."}, ttl_seconds=60)
+
+    assert worker_b.pop(7, "xyz") == {"sql_query": "DELETE ..."}
+    assert worker_a.pop(7, "xyz") is None
+
+
+def test_confirmation_survives_a_fresh_data_handler():
+    store = create_pending_store("memory")
+    first = DataHandler(llm=MagicMock(), query_runner=MagicMock(), pending_store=store)
+    first.pending_deletes.put(3, "c0ffee", {
+        "sql_query": "DELETE FROM transactions WHERE user_id = 3 AND id = 9",
+        "original_query": "delete transaction 9",
+        "preview": {"matched_ids": [9], "message": "1 record will be deleted.", "record_count": 1},
+        "created_at": datetime.now(),
+    }, ttl_seconds=60)
+
+    second = DataHandler(llm=MagicMock(), query_runner=MagicMock(), pending_store=store)
+    second.query_runner.execute_query_with_params.return_value = {"rowcount": 1}
+    second.log_interaction = MagicMock()
+
+    assert second.list_pending_deletes(3)["pending_count"] == 1
+    assert second.confirm_delete(3, "c0ffee")["status"] == "COMPLETE"
+    assert second.confirm_delete(3, "c0ffee")["status"] == "ERROR"
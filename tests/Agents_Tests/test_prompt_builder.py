@@ -0,0 +1,51 @@
+from agents.prompt_builder import SchemaPromptBuilder, estimate_tokens
+from agents.schema_cache import SchemaInfoCache
+
+VIEWS = {
+    'llm_transaction_summary': [(column, 'text', 'YES') for column in [
+        'transaction_id', 'user_id', 'amount', 'absolute_amount', 'category_name', 'category_kind', 'created_at', 'month', 'year',
+    ]],
+    'llm_budget_overview': [(column, 'text', 'YES') for column in [
+        'user_id', 'category_name', 'category_kind', 'month', 'budgeted_amount', 'actual_expenses', 'actual_income',
+    ]],
+    'llm_financial_overview': [(column, 'text', 'YES') for column in [
+        'user_id', 'amount', 'absolute_amount', 'category_name', 'month', 'budgeted_amount', 'actual_income', 'actual_expenses',
+    ]],
+    'llm_user_profile': [(column, 'text', 'YES') for column in [
+        'user_id', 'display_name', 'email', 'role_name', 'business_name', 'occupation',
+    ]],
+    'llm_business_hierarchy': [(column, 'text', 'YES') for column in [
+        'user_id', 'display_name', 'email', 'role_name', 'admin_display_name', 'admin_user_email',
+    ]],
+}
+
+
+def kept_views(schema_info):
+    return [line[len("VIEW: "):] for line in schema_info.splitlines() if line.startswith("VIEW: ")]
+
+
+def test_spending_question_keeps_only_transactions():
+    schema_info = SchemaPromptBuilder(token_budget=600).build("how much did I spend on food last month", VIEWS)
+    assert kept_views(schema_info) == ['llm_transaction_summary']
+
+
+def test_profile_and_team_questions_pick_their_views():
+    builder = SchemaPromptBuilder(token_budget=600)
+    assert kept_views(builder.build("what is my name", VIEWS))[0] == 'llm_user_profile'
+    assert kept_views(builder.build("who works under me", VIEWS))[0] == 'llm_business_hierarchy'
+    assert 'llm_budget_overview' in kept_views(builder.build("am I over budget", VIEWS))
+
+
+def test_unmatched_question_falls_back_to_transactions():
+    assert kept_views(SchemaPromptBuilder(token_budget=600).build("hello there", VIEWS)) == ['llm_transaction_summary']
+
+
+def test_budget_caps_prompt_and_is_smaller_than_full_schema():
+    full = SchemaInfoCache._build_schema_info(VIEWS)
+    builder = SchemaPromptBuilder(token_budget=120)
+    schema_info = builder.build("compare my budget and spending by category this month", VIEWS)
+
+    assert len(kept_views(schema_info)) >= 1
+    assert estimate_tokens(schema_info) <= 120
+    assert estimate_tokens(schema_info) < estimate_tokens(full) / 3
+    assert builder.stats()["builds"] == 1
@@ -0,0 +1,39 @@
+from unittest.mock import MagicMock
+
+from agents.data_handler import CREATE_PROMPT_PREFIX, DELETE_PROMPT_PREFIX, UPDATE_PROMPT_PREFIX, DataHandler
+from agents.intent_classifier import CLASSIFICATION_PROMPT_PREFIX, IntentClassifier
+from agents.llm_backends import FakeLLM
+from agents.prompt_enhancer import ENHANCER_PROMPT_PREFIX, PromptEnhancer
+from agents.query_runner import ANSWER_PROMPT_PREFIX, SQL_PROMPT_PREFIX, QueryRunner
+
+
+def test_every_prompt_starts_with_its_static_prefix():
+    llm = FakeLLM()
+    query_runner = QueryRunner(llm=llm, enhancer=PromptEnhancer(llm=llm))
+    data_handler = DataHandler(llm=llm, query_runner=query_runner)
+    classifier = IntentClassifier(llm=llm, query_runner=query_runner, data_handler=data_handler)
+
+    for question in ["how much did I spend", "add $20 for lunch"]:
+        assert classifier._classification_prompt(question).startswith(CLASSIFICATION_PROMPT_PREFIX)
+        assert query_runner.enhancer._build_prompt(question, "schema").startswith(ENHANCER_PROMPT_PREFIX)
+        assert query_runner._build_sql_prompt(question, "schema").startswith(SQL_PROMPT_PREFIX)
+        assert query_runner._build_answer_prompt(question, {"columns": ["total"], "data": [[12.5]]}).startswith(ANSWER_PROMPT_PREFIX)
+        assert data_handler._create_prompt(question).startswith(CREATE_PROMPT_PREFIX)
+        assert data_handler._update_prompt(question).startswith(UPDATE_PROMPT_PREFIX)
+        assert data_handler._delete_prompt(question).startswith(DELETE_PROMPT_PREFIX)
+
+
+def test_generated_sql_binds_the_user_instead_of_inlining_it():
+    data_handler = DataHandler(llm=FakeLLM(), query_runner=MagicMock())
+    sql = "DELETE FROM transactions WHERE user_id = :user_id AND note = ':user_ids'"
+    assert data_handler._bind_user_id(sql, 7) == "DELETE FROM transactions WHERE user_id = 7 AND note = ':user_ids'"
+
+
+def test_category_ids_come_from_the_reference_data():
+    from backend.core.reference_data import CategoryRef, ReferenceData
+    from agents.data_handler import CATEGORY_IDS_UNAVAILABLE, format_category_ids
+
+    refs = ReferenceData([CategoryRef(4, "Groceries", "expense", "personal"), CategoryRef(11, "Salary", "income", "personal")], [])
+    block = format_category_ids(refs)
+    assert "- Groceries (expense): category_id = 4\n        - Salary (income): category_id = 11" in block
+    assert format_category_ids(ReferenceData([], [])) == CATEGORY_IDS_UNAVAILABLE
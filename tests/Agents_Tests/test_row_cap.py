@@ -0,0 +1,61 @@
+import asyncio
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+from sqlalchemy import text
+
+from agents.query_runner import QueryRunner, RowCollector
+from backend.database.connection import engine
+
+
+def test_collector_caps_rows_and_keeps_running_totals():
+    rows = ((i, Decimal("1.50"), "note") for i in range(1_000_000))
+
+    result = RowCollector.collect(["id", "amount", "note"], rows, max_rows=3)
+
+    assert result["rowcount"] == 3
+    assert result["truncated"] is True
+    assert result["stats"] == {"id": {"count": 3, "sum": 3.0}, "amount": {"count": 3, "sum": 4.5}}
+
+
+def test_capped_select_streams_from_the_database():
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS row_cap_sample"))
+        conn.execute(text("CREATE TABLE row_cap_sample (id INTEGER, amount NUMERIC)"))
+        conn.execute(text("INSERT INTO row_cap_sample VALUES (:id, :amount)"),
+                     [{"id": i, "amount": -2} for i in range(50)])
+    runner = QueryRunner(llm=MagicMock(), enhancer=MagicMock())
+
+    capped = runner.execute_query("SELECT id, amount FROM row_cap_sample ORDER BY id", max_rows=10)
+    assert capped["rowcount"] == 10 and capped["truncated"] is True
+    assert capped["stats"]["amount"] == {"count": 10, "sum": -20.0}
+
+    whole = runner.execute_query_with_params("SELECT id FROM row_cap_sample WHERE id < :n", {"n": 5}, max_rows=10)
+    assert whole["rowcount"] == 5 and whole["truncated"] is False
+
+    uncapped = runner.execute_query("SELECT id FROM row_cap_sample")
+    assert uncapped["rowcount"] == 50 and "truncated" not in uncapped
+
+    read_only = asyncio.run(runner.aexecute_read_only("SELECT id FROM row_cap_sample", {}))
+    assert read_only["rowcount"] == 50 and read_only["truncated"] is False
+
+
+def test_extraction_summary_uses_streamed_totals():
+    runner = QueryRunner(llm=MagicMock(), enhancer=MagicMock())
+    raw_data = RowCollector.collect(["amount"], [(-5,), (-7,), (-9,)], max_rows=2)
+
+    summary = runner._format_data_for_extraction(raw_data)
+
+    assert "cut off at 2 rows" in summary
+    assert "amount: 2 values, sum: -12.00, avg: -6.00" in summary
+
+
+def test_direct_totals_from_a_capped_result_are_labelled_partial():
+    runner = QueryRunner(llm=MagicMock(), enhancer=MagicMock())
+    capped = RowCollector.collect(["amount"], [(-5,), (-7,), (-9,)], max_rows=2)
+    complete = RowCollector.collect(["amount"], [(-5,), (-7,)], max_rows=2)
+
+    assert runner._create_direct_response(capped, "how much have I spent") == \
+        "Total expenses (first 2 rows only; more matched): $-12.00"
+    assert runner._create_direct_response(complete, "how much have I spent") == "Total expenses: $-12.00"
+    assert runner._fallback_formatting(capped, "list my amounts").startswith("The total amount (first 2 rows only")
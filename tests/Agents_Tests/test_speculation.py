@@ -0,0 +1,46 @@
+import threading
+from unittest.mock import MagicMock
+
+from agents.intent_classifier import IntentClassifier
+from agents.speculation import SpeculativeEnhancer
+
+
+def make_query_runner(enhanced="enhanced question", gate=None):
+    query_runner = MagicMock()
+    query_runner._get_schema_info.return_value = "schema"
+
+    def enhance(user_query, schema_info):
+        if gate is not None:
+            gate.wait(5)
+        return enhanced
+
+    query_runner.enhancer.enhance_query.side_effect = enhance
+    return query_runner
+
+
+def test_take_returns_speculated_enhancement():
+    enhancer = SpeculativeEnhancer(max_workers=1)
+    speculation = enhancer.start(make_query_runner(), "what did I do with my money")
+
+    assert speculation.take() == ("schema", "enhanced question")
+    assert enhancer.stats()["hit"] == 1
+
+
+def test_discard_records_wasted_time_once_finished():
+    enhancer = SpeculativeEnhancer(max_workers=1)
+    gate = threading.Event()
+    speculation = enhancer.start(make_query_runner(gate=gate), "question")
+
+    speculation.discard()
+    gate.set()
+    enhancer._pool.shutdown(wait=True)
+
+    stats = enhancer.stats()
+    assert stats["discarded"] + stats["cancelled"] == 1
+    assert speculation.take() is None
+
+
+def test_confident_queries_do_not_speculate():
+    classifier = IntentClassifier(llm=MagicMock(), query_runner=make_query_runner(), data_handler=MagicMock())
+    for query in ("delete my last transaction", "how much did I spend this month"):
+        assert classifier._start_speculation(query, classifier._score_intent(query)) is None
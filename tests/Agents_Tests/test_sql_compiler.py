@@ -0,0 +1,54 @@
+from datetime import date, datetime
+
+from agents.sql_compiler import compile_question, coverage_report
+
+
+TODAY = date(2024, 4, 15)
+
+
+def test_total_with_category_and_period():
+    compiled = compile_question("How much did I spend on groceries last month?", today=TODAY)
+    assert compiled.shape == "total"
+    assert compiled.params == {
+        "kind": "expense",
+        "category": "Food & Dining",
+        "start_date": datetime(2024, 3, 1),
+        "end_date": datetime(2024, 4, 1),
+    }
+    assert ":user_id" in compiled.sql
+    assert "Food" not in compiled.sql
+
+
+def test_bare_month_means_most_recent_occurrence():
+    compiled = compile_question("spending by category in june", today=TODAY)
+    assert compiled.shape == "by_category"
+    assert compiled.params["start_date"] == datetime(2023, 6, 1)
+
+
+def test_top_and_latest_limits():
+    assert compile_question("top 3 purchases", today=TODAY).params["limit"] == 3
+    assert compile_question("what was my last purchase", today=TODAY).params["limit"] == 1
+    assert compile_question("show my recent transactions", today=TODAY).params["limit"] == 10
+
+
+def test_income_vs_expense():
+    compiled = compile_question("income vs expenses this year", today=TODAY)
+    assert compiled.shape == "income_vs_expense"
+    assert "kind" not in compiled.params
+
+
+def test_unrecognized_questions_fall_back():
+    for question in [
+        "what is my budget",
+        "who works under me",
+        "show transactions over $100",
+        "how much did I spend on salary",
+        "compare this month to last month",
+    ]:
+        assert compile_question(question, today=TODAY) is None
+
+
+def test_coverage_report():
+    report = coverage_report(["how much did I spend this month", "what is my role"])
+    assert report["compiled"] == 1
+    assert report["unparsed_sample"] == ["what is my role"]
@@ -0,0 +1,107 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from agents.query_runner import QueryRunner
+from agents.sql_guard import SQLGuard, UnsafeSQLError
+
+
+def test_standard_functions_are_allowed():
+    guard = SQLGuard(max_rows=100)
+    guarded = guard.guard(
+        "SELECT DATE_TRUNC('month', created_at) AS m, ROUND(SUM(ABS(amount)), 2), TO_CHAR(created_at, 'YYYY'), "
+        "AGE(created_at), COALESCE(MAX(amount), 0), LOWER(category_name) FROM llm_transaction_summary "
+        "WHERE user_id = :user_id GROUP BY 1, 3, 4, 6"
+    )
+    assert guarded.endswith("LIMIT 101")
+
+
+def test_scoped_query_only_gains_a_limit():
+    guard = SQLGuard(max_rows=100)
+    sql = "SELECT SUM(amount) AS total_spent FROM llm_transaction_summary WHERE user_id = :user_id AND amount < 0"
+    assert guard.guard(sql) == sql + " LIMIT 101"
+
+
+def test_every_view_read_is_scoped_to_the_user():
+    guard = SQLGuard(max_rows=100)
+    guarded = guard.guard(
+        "SELECT t.amount, b.budgeted_amount FROM llm_transaction_summary t "
+        "LEFT JOIN llm_budget_overview b ON b.category_name = t.category_name LIMIT 1000"
+    )
+    assert "ON b.category_name = t.category_name AND b.user_id = :user_id" in guarded
+    assert "WHERE t.user_id = :user_id" in guarded
+    assert guarded.endswith("LIMIT 101")
+
+    # An inlined id for someone else narrows the result instead of widening it
+    guarded = guard.guard("SELECT * FROM llm_transaction_summary WHERE user_id = 7 OR 1 = 1")
+    assert "(user_id = 7 OR 1 = 1) AND llm_transaction_summary.user_id = :user_id" in guarded
+
+
+def test_smaller_limits_and_ctes_are_kept():
+    guard = SQLGuard(max_rows=100)
+    guarded = guard.guard(
+        "WITH m AS (SELECT month, SUM(amount) AS s FROM llm_transaction_summary GROUP BY month) "
+        "SELECT * FROM m ORDER BY s LIMIT 5"
+    )
+    assert "FROM llm_transaction_summary WHERE llm_transaction_summary.user_id = :user_id GROUP BY" in guarded
+    assert guarded.endswith("LIMIT 5")
+
+
+@pytest.mark.parametrize("join", ["RIGHT JOIN", "RIGHT OUTER JOIN", "FULL JOIN", "FULL OUTER JOIN"])
+def test_preserved_side_of_an_outer_join_is_scoped_in_where(join):
+    guard = SQLGuard(max_rows=100)
+    guarded = guard.guard(f"SELECT t.* FROM (SELECT 1 AS k) s {join} llm_transaction_summary t ON TRUE")
+    assert "ON TRUE WHERE t.user_id = :user_id" in guarded
+
+    # An ON clause filter does not restrict the preserved side either
+    guarded = guard.guard(f"SELECT t.* FROM (SELECT 1 AS k) s {join} llm_transaction_summary t ON t.user_id = :user_id")
+    assert "WHERE t.user_id = :user_id" in guarded
+
+def test_budget_overview_reads_can_go_to_the_materialized_view():
+    sql = "SELECT category_name, actual_expenses FROM llm_budget_overview WHERE user_id = :user_id"
+    assert "llm_budget_overview_mv" not in SQLGuard(max_rows=100).guard(sql)
+
+    guarded = SQLGuard(max_rows=100, use_materialized=True).guard(sql)
+    # The original name stays as the alias, so qualified column references still resolve
+    assert "FROM llm_budget_overview_mv AS llm_budget_overview WHERE user_id = :user_id" in guarded
+
+@pytest.mark.parametrize("sql, reason", [
+    ("SELECT email FROM users", "relation_not_allowed"),
+    ("SELECT * FROM pg_catalog.llm_fake", "relation_not_allowed"),
+    ("SELECT 1; DELETE FROM transactions", "multiple_statements"),
+    ("DELETE FROM llm_transaction_summary", "not_select"),
+    ("WITH d AS (DELETE FROM transactions RETURNING *) SELECT * FROM d", "not_select"),
+    ("SELECT pg_sleep(60) FROM llm_user_profile", "blocked_function"),
+    ("SELECT query_to_xml('select * from users', true, true, '') FROM llm_user_profile", "blocked_function"),
+    ("SELECT pg_catalog.query_to_xml('select * from users', true, true, '')", "blocked_function"),
+    ("SELECT table_to_xml('users', true, true, '') FROM llm_user_profile", "blocked_function"),
+    ("SELECT cursor_to_xml('c', 10, true, true, '') FROM llm_user_profile", "blocked_function"),
+    ("SELECT query_to_xml_and_xmlschema('select * from users', true, true, '')", "blocked_function"),
+    ("SELECT table_to_xmlschema('users', true, true, '')", "blocked_function"),
+    ("SELECT current_setting('data_directory') FROM llm_user_profile", "blocked_function"),
+    ("SELECT pg_read_file('/etc/passwd') FROM llm_user_profile", "blocked_function"),
+    ("SELEC amount FROM (", "unparseable"),
+])
+def test_unsafe_sql_is_rejected(sql, reason):
+    guard = SQLGuard()
+    with pytest.raises(UnsafeSQLError) as rejected:
+        guard.guard(sql)
+    assert rejected.value.reason == reason
+    assert guard.stats()["rejected"] == {reason: 1}
+
+
+def test_rejected_generation_never_reaches_the_database():
+    llm = MagicMock()
+    llm.invoke.return_value = "SELECT email FROM users"
+    enhancer = MagicMock()
+    enhancer.enhance_query.return_value = "list every email"
+    runner = QueryRunner(llm=llm, enhancer=enhancer)
+    runner._check_user_llm_access = MagicMock(return_value={"has_access": True, "message": "Access granted"})
+    runner._schema_fingerprint = MagicMock(return_value="v1")
+    runner._get_schema_info = MagicMock(return_value="schema")
+    runner.execute_read_only = MagicMock()
+
+    answer, sql = runner.process_natural_language_query("list every email in the system", 1)
+
+    runner.execute_read_only.assert_not_called()
+    assert "relation_not_allowed" in answer
@@ -0,0 +1,107 @@
+from unittest.mock import MagicMock
+
+import agents.query_runner
+from agents.prompt_enhancer import category_synonym_lookup
+from agents.query_runner import QueryRunner
+from agents.sql_template_cache import SQLTemplateCache, normalize_question, parameterize_sql
+
+
+SPEND_SQL = (
+    "SELECT SUM(amount) AS total_spent FROM llm_transaction_summary "
+    "WHERE user_id = 42 AND category_name = 'Food & Dining' "
+    "AND EXTRACT(MONTH FROM created_at) = 3 AND EXTRACT(YEAR FROM created_at) = 2024"
+)
+
+
+def test_normalize_question_lifts_values():
+    template = normalize_question("How much did I spend on groceries in March 2024?", category_synonym_lookup())
+    assert template.text == "how much did i spend on <category> in <month> <year>"
+    assert template.slots == [("category", "Food & Dining"), ("month", 3), ("year", 2024)]
+
+
+def test_parameterize_sql_binds_user_and_slots():
+    template = normalize_question("how much did i spend on food in march 2024", category_synonym_lookup())
+    sql, bound = parameterize_sql(SPEND_SQL, template, 42)
+    assert "42" not in sql
+    assert ":user_id" in sql
+    assert bound == {0: "slot_0", 1: "slot_1", 2: "slot_2"}
+
+
+def test_parameterize_sql_rejects_unscoped_user_id():
+    template = normalize_question("show transactions over 42")
+    assert parameterize_sql("SELECT * FROM llm_transaction_summary WHERE user_id = 42 AND amount > 42", template, 42) is None
+
+
+def test_string_literals_are_not_rebound():
+    template = normalize_question("what did i spend in the last 5 days")
+    sql, bound = parameterize_sql(
+        "SELECT SUM(amount) FROM llm_transaction_summary WHERE user_id = 1 AND created_at > NOW() - INTERVAL '5 days'",
+        template, 1
+    )
+    assert "'5 days'" in sql.lower()
+    assert bound == {}
+
+
+def test_cache_hit_rebinds_for_another_user():
+    cache = SQLTemplateCache(max_size=4, ttl_seconds=60)
+    words = category_synonym_lookup()
+    assert cache.store(normalize_question("how much did i spend on food in march 2024", words), 42, SPEND_SQL, "v1")
+
+    sql, params = cache.lookup(normalize_question("How much did I spend on rent in June 2023?", words), 7, "v1")
+    assert params == {"user_id": 7, "slot_0": "Housing", "slot_1": 6, "slot_2": 2023}
+    assert cache.stats()["hits"] == 1
+
+
+def test_cache_misses_on_schema_change_and_evicts_lru():
+    cache = SQLTemplateCache(max_size=1, ttl_seconds=60)
+    first = normalize_question("how much did i spend in 2024")
+    second = normalize_question("what is my income in 2024")
+    cache.store(first, 1, "SELECT SUM(amount) FROM llm_transaction_summary WHERE user_id = 1 AND year = 2024", "v1")
+    assert cache.lookup(first, 1, "v2") is None
+
+    cache.store(first, 1, "SELECT SUM(amount) FROM llm_transaction_summary WHERE user_id = 1 AND year = 2024", "v1")
+    cache.store(second, 1, "SELECT SUM(amount) FROM llm_transaction_summary WHERE user_id = 1 AND year = 2024 AND amount > 0", "v1")
+    assert cache.lookup(first, 1, "v1") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_user_id_equal_to_a_question_literal_is_not_cached():
+    cache = SQLTemplateCache(max_size=4, ttl_seconds=60)
+    march = normalize_question("how much did i spend in march")
+    month_sql = ("SELECT SUM(amount) FROM llm_transaction_summary "
+                 "WHERE user_id = {} AND EXTRACT(MONTH FROM created_at) = 3")
+
+    # Guarded SQL already filters on :user_id; the month literal still equals user 3's id
+    assert not cache.store(march, 3, month_sql.format(":user_id"), "v1")
+    assert not cache.store(march, 3, month_sql.format(3), "v1")
+    assert cache.lookup(march, 7, "v1") is None
+
+    day = normalize_question("what did i spend on 2024-03-05")
+    assert parameterize_sql("SELECT SUM(amount) FROM llm_transaction_summary WHERE user_id = 5 "
+                            "AND EXTRACT(DAY FROM created_at) = 5", day, 5) is None
+    amount = normalize_question("show purchases over $60")
+    assert parameterize_sql("SELECT * FROM llm_transaction_summary WHERE user_id = 60 AND ABS(amount) > 60", amount, 60) is None
+
+    # Another user's copy of the same question caches, and re-binds the month for user 3
+    assert cache.store(march, 8, month_sql.format(8), "v1")
+    sql, params = cache.lookup(march, 3, "v1")
+    assert params == {"user_id": 3, "slot_0": 3}
+    assert "user_id = :user_id" in sql and "= :slot_0" in sql
+
+
+def test_cache_hit_skips_the_schema_prompt(monkeypatch):
+    cache = SQLTemplateCache(max_size=4, ttl_seconds=60)
+    cache.store(normalize_question("how much did i spend on food in march 2024", category_synonym_lookup()), 42, SPEND_SQL, "v1")
+    monkeypatch.setattr(agents.query_runner, "sql_template_cache", cache)
+    monkeypatch.setattr(agents.query_runner.sql_compiler, "compile", lambda question, user_id: None)
+
+    runner = QueryRunner(llm=MagicMock(), enhancer=MagicMock())
+    runner._check_user_llm_access = MagicMock(return_value={"has_access": True})
+    runner._schema_fingerprint = MagicMock(return_value="v1")
+    runner._get_schema_info = MagicMock()
+    runner.execute_read_only = MagicMock(return_value={"columns": ["total_spent"], "data": [(12.5,)], "rowcount": 1})
+
+    answer, sql = runner.process_natural_language_query("How much did I spend on rent in June 2023?", 7)
+
+    assert runner.execute_read_only.call_args.args == (sql, {"user_id": 7, "slot_0": "Housing", "slot_1": 6, "slot_2": 2023})
+    runner._get_schema_info.assert_not_called()
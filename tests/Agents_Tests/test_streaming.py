@@ -0,0 +1,52 @@
+from unittest.mock import MagicMock
+
+from agents.intent_classifier import IntentClassifier
+from agents.query_runner import QueryRunner
+
+
+def drain(generator):
+    events = []
+    try:
+        while True:
+            events.append(next(generator))
+    except StopIteration as stop:
+        return events, stop.value
+
+
+def test_iter_answer_streams_llm_tokens_for_open_ended_results():
+    llm = MagicMock()
+    llm.stream.return_value = iter(["You have ", "five ", "columns."])
+    runner = QueryRunner(llm=llm, enhancer=MagicMock())
+    raw_data = {"columns": ["a", "b", "c", "d", "e"], "data": [(1, 2, 3, 4, 5), (6, 7, 8, 9, 10)], "rowcount": 2}
+
+    events, answer = drain(runner._iter_answer("explain", "explain", raw_data, "SELECT 1", None, True))
+
+    assert [payload for _, payload in events] == ["You have ", "five ", "columns."]
+    assert answer == "You have five columns."
+
+
+def test_iter_answer_renders_without_llm_when_possible():
+    llm = MagicMock()
+    runner = QueryRunner(llm=llm, enhancer=MagicMock())
+    raw_data = {"columns": ["total_spent"], "data": [(-12,)], "rowcount": 1}
+
+    events, answer = drain(runner._iter_answer("how much did I spend", "", raw_data, "SELECT 1", None, True))
+
+    assert events == [("token", "You spent $12.00.")]
+    llm.stream.assert_not_called()
+
+
+def test_iter_intent_emits_stage_events_before_result():
+    query_runner = MagicMock()
+    query_runner.iter_natural_language_query.return_value = iter([
+        ("sql", {"sql": "SELECT 1", "source": "compiled"}),
+        ("rows", {"columns": ["total_spent"], "rowcount": 1}),
+        ("token", "You spent $12.00."),
+        ("answer", {"answer": "You spent $12.00.", "sql": "SELECT 1"}),
+    ])
+    classifier = IntentClassifier(llm=MagicMock(), query_runner=query_runner, data_handler=MagicMock())
+
+    events = list(classifier.iter_intent("how much did I spend this month", 1))
+
+    assert [event for event, _ in events] == ["intent", "sql", "rows", "token", "result"]
+    assert events[-1][1]["result"]["answer"] == "You spent $12.00."
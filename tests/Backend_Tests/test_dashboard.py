@@ -6,3 +6,113 @@ def test_dashboard_summary_unauthorized(client):
 def test_dashboard_recent_purchases_unauthorized(client):
     response = client.get("/dashboard/recent-purchases")
     assert response.status_code == 401
+
+
+def test_expense_categories_read_monthly_rollups():
+    from datetime import date
+    from database.connection import SessionLocal
+    from models.categories import Category
+    from models.transaction_rollups import TransactionRollup
+    from routers.dashboard_router import fetch_expense_categories_helper
+
+    db = SessionLocal()
+    try:
+        db.add_all([
+            Category(id=901, name="Rollup Rent", kind="expense"),
+            Category(id=902, name="Rollup Salary", kind="income"),
+            TransactionRollup(user_id=9001, category_id=901, month=date(2026, 1, 1), amount_sum=-1200.0, txn_count=1),
+            TransactionRollup(user_id=9001, category_id=901, month=date(2026, 2, 1), amount_sum=-1250.0, txn_count=1),
+            TransactionRollup(user_id=9001, category_id=902, month=date(2026, 1, 1), amount_sum=5000.0, txn_count=2),
+            # Every transaction of the month was deleted
+            TransactionRollup(user_id=9001, category_id=901, month=date(2026, 3, 1), amount_sum=0.0, txn_count=0),
+        ])
+        db.commit()
+
+        assert [(c["name"], c["value"]) for c in fetch_expense_categories_helper(9001, db, month="2026-02")] == [
+            ("Rollup Rent", 1250.0)
+        ]
+        assert fetch_expense_categories_helper(9001, db)[0]["value"] == 2450.0
+        assert fetch_expense_categories_helper(9001, db, month="2026-03") == []
+    finally:
+        db.rollback()
+        db.query(TransactionRollup).filter(TransactionRollup.user_id == 9001).delete()
+        db.query(Category).filter(Category.id.in_([901, 902])).delete()
+        db.commit()
+        db.close()
+
+
+def test_business_summary_takes_three_queries(client):
+    from datetime import date, datetime
+    from core.reference_data import reference_data
+    from database.connection import SessionLocal, engine
+    from main import app
+    from models.budget_entries import BudgetEntry
+    from models.categories import Category
+    from models.profile import Profile
+    from models.role import Role
+    from models.transaction_rollups import TransactionRollup
+    from models.transactions import Transaction
+    from models.user import User
+    from routers.auth_router import verify_token
+
+    year = datetime.now().year
+    db = SessionLocal()
+    try:
+        db.add_all([
+            Role(id=92, role_name="business_admin", permission_level="admin"),
+            Role(id=93, role_name="business_subuser", permission_level="user"),
+            User(id=9101, email="admin@summary.test", role_id=92, business_id=91),
+            User(id=9102, email="sub@summary.test", role_id=93, business_id=91),
+            Profile(user_id=9102, business_name="Summary Co"),
+            BudgetEntry(budget_id=1, category_id=22, planned=1000.0, user_id=9101),
+            Category(id=17, name="Summary Sales", kind="income", scope="business"),
+            Category(id=22, name="Summary Rent", kind="expense", scope="business"),
+            # Personal categories of the admin stay off the business dashboard
+            Category(id=1, name="Summary Groceries", kind="expense"),
+            TransactionRollup(user_id=9101, category_id=1, month=date(year, 2, 1), amount_sum=-80.0, txn_count=1),
+            TransactionRollup(user_id=9101, category_id=17, month=date(year, 2, 1), amount_sum=1200.0, txn_count=12),
+            TransactionRollup(user_id=9101, category_id=22, month=date(year, 5, 1), amount_sum=-300.0, txn_count=3),
+            TransactionRollup(user_id=9101, category_id=22, month=date(year - 1, 5, 1), amount_sum=-200.0, txn_count=1),
+        ])
+        db.add_all(
+            [Transaction(user_id=9101, category_id=17, amount=100.0, created_at=datetime(year, 2, d)) for d in range(1, 13)]
+            + [Transaction(user_id=9101, category_id=22, amount=-100.0, created_at=datetime(year, 5, d)) for d in range(1, 4)]
+        )
+        db.add(Transaction(user_id=9101, category_id=1, amount=-80.0, created_at=datetime(year, 5, 20)))
+        db.commit()
+        subuser = db.get(User, 9102)
+
+        # Categories and roles changed; load them before counting
+        reference_data.invalidate()
+        reference_data.get(engine)
+
+        app.dependency_overrides[verify_token] = lambda: subuser
+        response = client.get("/dashboard/business/summary")
+        assert response.status_code == 200
+        assert response.headers["X-DB-Query-Count"] == "3"
+
+        data = response.json()
+        assert data["business_name"] == "Summary Co"
+        assert data["budget"] == {"used": 500.0, "total": 1000.0}
+        assert data["stats"]["total_income"] == 1200.0
+        assert [q["amount"] for q in data["incomeData"]] == [1200.0, 0.0, 0.0, 0.0]
+        assert [q["amount"] for q in data["expenseData"]] == [0.0, 300.0, 0.0, 0.0]
+        assert len(data["recentIncome"]) == 10
+        assert data["recentIncome"][0] == {
+            "id": data["recentIncome"][0]["id"], "description": "Summary Sales",
+            "date": f"{year}-02-12", "amount": "$100.00"
+        }
+        assert [e["date"] for e in data["recentExpenses"]] == [f"{year}-05-03", f"{year}-05-02", f"{year}-05-01"]
+    finally:
+        app.dependency_overrides.pop(verify_token, None)
+        db.rollback()
+        db.query(Transaction).filter(Transaction.user_id == 9101).delete()
+        db.query(TransactionRollup).filter(TransactionRollup.user_id == 9101).delete()
+        db.query(BudgetEntry).filter(BudgetEntry.user_id == 9101).delete()
+        db.query(Profile).filter(Profile.user_id == 9102).delete()
+        db.query(Category).filter(Category.id.in_([1, 17, 22])).delete()
+        db.query(User).filter(User.id.in_([9101, 9102])).delete()
+        db.query(Role).filter(Role.id.in_([92, 93])).delete()
+        db.commit()
+        db.close()
+        reference_data.invalidate()
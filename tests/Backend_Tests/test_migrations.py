@@ -0,0 +1,69 @@
+import importlib.util
+import os
+
+from sqlalchemy import create_engine, inspect, text
+
+DATABASE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "database")
+
+
+def load_script(name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(DATABASE_DIR, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+migrate = load_script("migrate")
+
+
+def test_migrations_apply_in_order_and_only_once(tmp_path):
+    migrations = tmp_path / "migrations"
+    migrations.mkdir()
+    (migrations / "0002_index.sql").write_text(
+        "-- migrate: no-transaction\nCREATE INDEX ix_items_name ON items (name);\n"
+    )
+    (migrations / "0001_items.sql").write_text(
+        "-- items table\nCREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT);\n"
+        "INSERT INTO items (name) VALUES ('a;b');\n"
+    )
+    (migrations / "notes.sql").write_text("not a migration")
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+
+    assert migrate.migrate(engine, str(migrations)) == ["0001", "0002"]
+    assert migrate.migrate(engine, str(migrations)) == []
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT name FROM items")).scalar() == "a;b"
+    assert [index["name"] for index in inspect(engine).get_indexes("items")] == ["ix_items_name"]
+
+
+def test_index_migration_is_concurrent_and_idempotent():
+    (version, name, path), *_ = migrate.discover()
+    with open(path, encoding="utf-8") as f:
+        sql = f.read()
+
+    assert version == "0001"
+    assert migrate.NO_TRANSACTION in sql
+    statements = migrate.split_statements(sql)
+    assert statements and all(s.startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS") for s in statements)
+
+
+def test_model_indexes_match_the_migration():
+    from database.connection import Base
+    import main  # noqa: F401  registers every model
+
+    with open(migrate.discover()[0][2], encoding="utf-8") as f:
+        migration = f.read()
+    declared = {index.name for table in Base.metadata.tables.values() for index in table.indexes}
+    assert declared and all(name in migration for name in declared)
+
+
+def test_check_flags_seq_scans_on_core_tables_only():
+    check_indexes = load_script("check_indexes")
+    plan = {"Node Type": "Hash Join", "Plans": [
+        {"Node Type": "Seq Scan", "Relation Name": "categories"},
+        {"Node Type": "Index Scan", "Relation Name": "transactions"},
+        {"Node Type": "Nested Loop", "Plans": [{"Node Type": "Seq Scan", "Relation Name": "budgets"}]},
+    ]}
+
+    assert check_indexes.seq_scans(plan) == ["budgets"]
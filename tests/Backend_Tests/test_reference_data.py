@@ -0,0 +1,83 @@
+from sqlalchemy import create_engine, text
+
+
+def reference_engine(tmp_path, with_version=True):
+    engine = create_engine(f"sqlite:///{tmp_path / 'reference.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE categories (id INTEGER PRIMARY KEY, name TEXT, kind TEXT, scope TEXT)"))
+        conn.execute(text("CREATE TABLE roles (id INTEGER PRIMARY KEY, role_name TEXT, permission_level TEXT)"))
+        conn.execute(text(
+            "INSERT INTO categories VALUES (1, 'Food', 'expense', 'personal'), "
+            "(17, 'Sales', 'income', 'business'), (22, 'Office', 'expense', 'business')"
+        ))
+        conn.execute(text("INSERT INTO roles VALUES (2, 'business_admin', 'admin')"))
+        if with_version:
+            conn.execute(text("CREATE TABLE reference_data_version (id INTEGER PRIMARY KEY, version INTEGER)"))
+            conn.execute(text("INSERT INTO reference_data_version VALUES (1, 1)"))
+    return engine
+
+
+def test_reference_data_loads_once_until_the_version_moves(tmp_path):
+    from core.reference_data import ReferenceDataCache
+
+    engine = reference_engine(tmp_path)
+    cache = ReferenceDataCache(check_interval_seconds=0)
+
+    refs = cache.get(engine)
+    assert refs.category_ids(kind="expense", scope="business") == [22]
+    assert refs.role_by_name("business_admin").id == 2
+    assert refs.role(3) is None
+    assert cache.get(engine) is refs
+
+    # A write elsewhere bumps the shared version (the migration 0004 trigger)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE categories SET name = 'Groceries' WHERE id = 1"))
+        conn.execute(text("UPDATE reference_data_version SET version = 2"))
+    assert cache.get(engine).category(1).name == "Groceries"
+    assert cache.stats()["loads"] == 2
+
+
+def test_invalidate_reloads_without_a_version_table(tmp_path):
+    from core.reference_data import ReferenceDataCache
+
+    engine = reference_engine(tmp_path, with_version=False)
+    cache = ReferenceDataCache(check_interval_seconds=3600)
+
+    refs = cache.get(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO roles VALUES (3, 'business_subuser', 'user')"))
+    assert cache.get(engine) is refs
+
+    cache.invalidate()
+    assert cache.get(engine).role_by_name("business_subuser").id == 3
+    assert cache.stats()["hits"] == 1
+
+
+def test_recent_purchases_name_items_from_cached_categories():
+    from datetime import datetime
+    from core.reference_data import reference_data
+    from database.connection import SessionLocal
+    from models.categories import Category
+    from models.transactions import Transaction
+    from routers.dashboard_router import fetch_recent_purchases_helper
+
+    db = SessionLocal()
+    try:
+        db.add_all([
+            Category(id=801, name="Food", kind="expense"),
+            Category(id=802, name="Pet Care", kind="expense"),
+            Transaction(user_id=9201, category_id=801, amount=-12.5, created_at=datetime(2026, 3, 3)),
+            Transaction(user_id=9201, category_id=802, amount=-40.0, created_at=datetime(2026, 3, 2)),
+            Transaction(user_id=9201, category_id=None, amount=-5.0, created_at=datetime(2026, 3, 1)),
+        ])
+        db.commit()
+        reference_data.invalidate()
+
+        assert [p["item"] for p in fetch_recent_purchases_helper(9201, db)] == ["Coffee Shop", "Pet Care", "Purchase"]
+    finally:
+        db.rollback()
+        db.query(Transaction).filter(Transaction.user_id == 9201).delete()
+        db.query(Category).filter(Category.id.in_([801, 802])).delete()
+        db.commit()
+        db.close()
+        reference_data.invalidate()
@@ -0,0 +1,205 @@
+"""
+llm_budget_overview plans on synthetic data: EXTRACT join vs. half-open range vs. rollups vs. materialized.
+
+Builds a scratch schema in a Postgres database (default: DATABASE_URL), fills
+it with generate_series data and EXPLAIN ANALYZEs one user's budget overview
+through each variant:
+
+    python tests/Benchmarks/bench_budget_overview.py --transactions 1000000 --users 2000 --rounds 5
+
+- extract: the original view, matching months with EXTRACT(MONTH/YEAR)
+- half_open: budget_overview_from_transactions, created_at in [month, month + 1)
+- rollups: the current llm_budget_overview over transaction_rollups
+- materialized: llm_budget_overview_mv
+- financial_old / financial_new: llm_financial_overview's budget rows with
+  and without the self-join back onto llm_budget_overview
+
+The schema has the indexes from migrations 0001-0003 and is dropped
+afterwards unless --keep is given. Loading 1M rows takes a minute or so.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SCHEMA = "bench_budget_overview"
+
+SETUP = """
+CREATE TABLE categories (id INTEGER PRIMARY KEY, name VARCHAR(100) UNIQUE NOT NULL, kind VARCHAR(20) NOT NULL);
+INSERT INTO categories SELECT i, 'category ' || i, CASE WHEN i <= 4 THEN 'income' ELSE 'expense' END
+FROM generate_series(1, 20) AS i;
+
+CREATE TABLE budgets (id SERIAL PRIMARY KEY, user_id INTEGER NOT NULL, month DATE NOT NULL);
+INSERT INTO budgets (user_id, month)
+SELECT u, (DATE '2024-01-01' + (m || ' month')::INTERVAL)::DATE
+FROM generate_series(1, :users) AS u, generate_series(0, :months - 1) AS m;
+
+CREATE TABLE budgetentries (id SERIAL PRIMARY KEY, budget_id INTEGER NOT NULL, category_id INTEGER NOT NULL,
+                            planned NUMERIC(10,2) NOT NULL, user_id INTEGER NOT NULL);
+INSERT INTO budgetentries (budget_id, category_id, planned, user_id)
+SELECT b.id, c, 100 + c * 10, b.user_id FROM budgets b, generate_series(5, 12) AS c;
+
+CREATE TABLE transactions (id SERIAL PRIMARY KEY, user_id INTEGER NOT NULL, category_id INTEGER,
+                           amount NUMERIC(10,2) NOT NULL, created_at TIMESTAMP);
+INSERT INTO transactions (user_id, category_id, amount, created_at)
+SELECT 1 + (i % :users), 1 + (i * 7 % 20),
+       CASE WHEN i * 7 % 20 < 4 THEN 1 ELSE -1 END * (5 + (i * 13 % 500)),
+       TIMESTAMP '2024-01-01' + ((i * 37 % (:months * 30 * 24)) || ' hours')::INTERVAL
+FROM generate_series(1, :transactions) AS i;
+
+CREATE INDEX ix_transactions_user_created_at ON transactions (user_id, created_at);
+CREATE INDEX ix_transactions_user_category_created_at ON transactions (user_id, category_id, created_at);
+CREATE INDEX ix_budgets_user_month ON budgets (user_id, month);
+CREATE INDEX ix_budgetentries_budget_id ON budgetentries (budget_id);
+
+CREATE TABLE transaction_rollups (
+    user_id INTEGER NOT NULL, category_id INTEGER NOT NULL, month DATE NOT NULL,
+    amount_sum NUMERIC(14,2) NOT NULL, income_sum NUMERIC(14,2) NOT NULL,
+    expense_sum NUMERIC(14,2) NOT NULL, txn_count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, category_id, month)
+);
+INSERT INTO transaction_rollups
+SELECT user_id, category_id, date_trunc('month', created_at)::DATE,
+       SUM(amount), SUM(GREATEST(amount, 0)), SUM(GREATEST(-amount, 0)), COUNT(*)
+FROM transactions GROUP BY 1, 2, 3;
+
+CREATE VIEW budget_overview_extract AS
+SELECT b.user_id, b.month, c.name AS category_name, c.kind AS category_kind, be.planned AS budgeted_amount,
+       COALESCE(SUM(CASE WHEN t.amount < 0 THEN ABS(t.amount) ELSE 0 END), 0) AS actual_expenses,
+       COALESCE(SUM(CASE WHEN t.amount >= 0 THEN t.amount ELSE 0 END), 0) AS actual_income
+FROM budgets b
+JOIN budgetentries be ON b.id = be.budget_id
+JOIN categories c ON be.category_id = c.id
+LEFT JOIN transactions t ON (
+    t.user_id = b.user_id AND t.category_id = c.id
+    AND EXTRACT(MONTH FROM t.created_at) = EXTRACT(MONTH FROM b.month)
+    AND EXTRACT(YEAR FROM t.created_at) = EXTRACT(YEAR FROM b.month)
+)
+GROUP BY b.user_id, b.month, c.name, c.kind, be.planned;
+
+CREATE VIEW budget_overview_half_open AS
+SELECT b.user_id, b.month, c.name AS category_name, c.kind AS category_kind, be.planned AS budgeted_amount,
+       COALESCE(SUM(CASE WHEN t.amount < 0 THEN ABS(t.amount) ELSE 0 END), 0) AS actual_expenses,
+       COALESCE(SUM(CASE WHEN t.amount >= 0 THEN t.amount ELSE 0 END), 0) AS actual_income
+FROM budgets b
+JOIN budgetentries be ON b.id = be.budget_id
+JOIN categories c ON be.category_id = c.id
+LEFT JOIN transactions t ON (
+    t.user_id = b.user_id AND t.category_id = c.id
+    AND t.created_at >= date_trunc('month', b.month)
+    AND t.created_at < date_trunc('month', b.month) + INTERVAL '1 month'
+)
+GROUP BY b.user_id, b.month, c.name, c.kind, be.planned;
+
+CREATE VIEW budget_overview_rollups AS
+SELECT b.user_id, b.month, c.name AS category_name, c.kind AS category_kind, be.planned AS budgeted_amount,
+       COALESCE(SUM(r.expense_sum), 0) AS actual_expenses,
+       COALESCE(SUM(r.income_sum), 0) AS actual_income
+FROM budgets b
+JOIN budgetentries be ON b.id = be.budget_id
+JOIN categories c ON be.category_id = c.id
+LEFT JOIN transaction_rollups r ON (
+    r.user_id = b.user_id AND r.category_id = c.id AND r.month = date_trunc('month', b.month)::DATE
+)
+GROUP BY b.user_id, b.month, c.name, c.kind, be.planned;
+
+CREATE MATERIALIZED VIEW budget_overview_mv AS SELECT * FROM budget_overview_rollups;
+CREATE UNIQUE INDEX ux_budget_overview_mv ON budget_overview_mv (user_id, month, category_name, budgeted_amount);
+
+ANALYZE
+"""
+
+VARIANTS = {
+    "extract": "SELECT * FROM budget_overview_extract WHERE user_id = :user_id",
+    "half_open": "SELECT * FROM budget_overview_half_open WHERE user_id = :user_id",
+    "rollups": "SELECT * FROM budget_overview_rollups WHERE user_id = :user_id",
+    "materialized": "SELECT * FROM budget_overview_mv WHERE user_id = :user_id",
+    "financial_old": """
+        SELECT b.user_id, b.month, c.name, be.planned, bov.actual_income, bov.actual_expenses
+        FROM budgets b
+        JOIN budgetentries be ON b.id = be.budget_id
+        JOIN categories c ON be.category_id = c.id
+        LEFT JOIN budget_overview_extract bov
+            ON bov.user_id = b.user_id AND bov.month = b.month AND bov.category_name = c.name
+        WHERE b.user_id = :user_id
+    """,
+    "financial_new": """
+        SELECT user_id, month, category_name, budgeted_amount, actual_income, actual_expenses
+        FROM budget_overview_rollups WHERE user_id = :user_id
+    """,
+}
+
+
+def statements(sql: str):
+    return [statement.strip() for statement in sql.split(";\n") if statement.strip()]
+
+
+def scans(plan, found=None):
+    """Scan nodes in a plan, as 'Node Type on relation'"""
+    found = [] if found is None else found
+    if "Relation Name" in plan:
+        found.append(f"{plan['Node Type']} on {plan['Relation Name']}")
+    for child in plan.get("Plans", []):
+        scans(child, found)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", default=None, help="defaults to DATABASE_URL from the backend settings")
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help=f"leave the {SCHEMA} schema in place")
+    args = parser.parse_args()
+
+    url = args.database_url
+    if url is None:
+        sys.path.insert(0, PROJECT_ROOT)
+        from backend.core.config import settings
+        url = settings.DATABASE_URL
+    engine = create_engine(url)
+    params = {"users": args.users, "months": args.months, "transactions": args.transactions}
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        conn.execute(text(f"SET LOCAL search_path TO {SCHEMA}"))
+        for statement in statements(SETUP):
+            conn.execute(text(statement), params)
+    print(f"Loaded {args.transactions} transactions for {args.users} users in {time.perf_counter() - start:.1f}s\n")
+
+    try:
+        print(f"{'variant':<14} {'p50 ms':>9} {'mean ms':>9} {'buffers':>9}  scans")
+        with engine.connect() as conn:
+            conn.execute(text(f"SET search_path TO {SCHEMA}"))
+            for name, sql in VARIANTS.items():
+                times, buffers, plan = [], [], None
+                for i in range(args.rounds):
+                    # A different user each round, so later rounds are not just cache hits on the first
+                    user_id = 1 + (i * 7919) % args.users
+                    result = conn.execute(
+                        text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"), {"user_id": user_id}
+                    ).scalar()
+                    result = json.loads(result) if isinstance(result, str) else result
+                    plan = result[0]["Plan"]
+                    times.append(result[0]["Execution Time"])
+                    buffers.append(plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0))
+                print(f"{name:<14} {statistics.median(times):>9.2f} {statistics.fmean(times):>9.2f} "
+                      f"{int(statistics.fmean(buffers)):>9}  {', '.join(sorted(set(scans(plan))))}")
+            conn.rollback()
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Sustained concurrent chat benchmark: /chatbot/message (threadpool) vs /chatbot/message/async.
+
+Runs against a live backend with Ollama and Postgres behind it:
+
+    python tests/Benchmarks/bench_chat_concurrency.py --email me@example.com --password secret \
+        --concurrency 8 32 64 --duration 60
+
+Each worker sends chats back to back for the duration; the report shows
+completed chats per second and latency percentiles for each mode.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+MESSAGES = [
+    "how much did I spend this month",
+    "what is my income",
+    "show my expenses",
+    "what business am I in",
+]
+MODES = {
+    "sync": "/chatbot/message",
+    "async": "/chatbot/message/async",
+}
+
+
+async def login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    response = await client.post("/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def worker(client: httpx.AsyncClient, path: str, headers: dict, deadline: float, latencies: list, errors: list):
+    i = 0
+    while time.perf_counter() < deadline:
+        message = MESSAGES[i % len(MESSAGES)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = await client.post(path, json={"message": message, "session_id": "bench"}, headers=headers)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_mode(base_url: str, path: str, token: str, concurrency: int, duration: float) -> dict:
+    latencies: list = []
+    errors: list = []
+    headers = {"Authorization": f"Bearer {token}"}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(
+            worker(client, path, headers, deadline, latencies, errors) for _ in range(concurrency)
+        ))
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else float("nan")
+
+    return {
+        "completed": len(latencies),
+        "errors": len(errors),
+        "chats_per_s": len(latencies) / duration,
+        "p50_s": percentile(0.50),
+        "p95_s": percentile(0.95),
+        "mean_s": statistics.fmean(latencies) if latencies else float("nan"),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 64])
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.base_url) as client:
+        token = await login(client, args.email, args.password)
+
+    print(f"{'mode':<6} {'conc':>5} {'done':>6} {'err':>4} {'chats/s':>8} {'p50 s':>7} {'p95 s':>7}")
+    for concurrency in args.concurrency:
+        for mode in args.modes:
+            result = await run_mode(args.base_url, MODES[mode], token, concurrency, args.duration)
+            print(f"{mode:<6} {concurrency:>5} {result['completed']:>6} {result['errors']:>4} "
+                  f"{result['chats_per_s']:>8.2f} {result['p50_s']:>7.2f} {result['p95_s']:>7.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""
+Framework overhead of the chat pipeline with the model taken out of the loop.
+
+Drives IntentClassifier.classify_intent in-process against Postgres, with
+either the scripted FakeLLM or responses recorded earlier with
+LLM_BACKEND=record:
+
+    python tests/Benchmarks/bench_pipeline_overhead.py --user-id 1 --iterations 200
+    python tests/Benchmarks/bench_pipeline_overhead.py --user-id 1 --replay llm_recordings.jsonl --latency-ms 50
+
+Wall time minus the synthetic LLM latency is what prompt building, SQL
+cleaning, the database and answer formatting cost per chat.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for path in (PROJECT_ROOT, os.path.join(PROJECT_ROOT, "backend")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from agents.data_handler import DataHandler
+from agents.intent_classifier import IntentClassifier
+from agents.llm_backends import FakeLLM, ReplayLLM
+from agents.metrics import metrics
+from agents.query_runner import QueryRunner
+from backend.core.config import settings
+
+MESSAGES = [
+    "how much did I spend this month",
+    "what is my income",
+    "show my expenses",
+    "what business am I in",
+    "what did I spend the most on recently",
+]
+
+
+def build_classifier(replay_path, latency_ms: float) -> IntentClassifier:
+    fake = FakeLLM(model=settings.LLM_MODEL, latency_ms=latency_ms)
+    llm = ReplayLLM(replay_path, model=settings.LLM_MODEL, latency_ms=latency_ms, fallback=fake) if replay_path else fake
+    query_runner = QueryRunner(llm=llm)
+    return IntentClassifier(llm=llm, query_runner=query_runner, data_handler=DataHandler(llm=llm, query_runner=query_runner))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--replay", help="JSONL file recorded with LLM_BACKEND=record; FakeLLM when omitted")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="synthetic latency per LLM call")
+    args = parser.parse_args()
+
+    classifier = build_classifier(args.replay, args.latency_ms)
+    classifier.classify_intent(MESSAGES[0], args.user_id)  # fill the schema cache
+
+    latencies = {message: [] for message in MESSAGES}
+    for i in range(args.iterations):
+        message = MESSAGES[i % len(MESSAGES)]
+        start = time.perf_counter()
+        classifier.classify_intent(message, args.user_id)
+        latencies[message].append((time.perf_counter() - start) * 1000)
+
+    print(f"{'message':<42} {'n':>5} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}")
+    for message, samples in latencies.items():
+        if not samples:
+            continue
+        samples.sort()
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        print(f"{message:<42} {len(samples):>5} {statistics.median(samples):>8.2f} {p95:>8.2f} {statistics.fmean(samples):>8.2f}")
+
+    snapshot = metrics.snapshot()
+    print("\nPer-stage p50 (s):")
+    for name in ("chat_llm_call_seconds", "chat_db_query_seconds"):
+        for series, values in sorted(snapshot.get(name, {}).items()):
+            print(f"  {name:<24} {series:<40} n={values['count']:<6} p50={values['p50']:.4f}")
+    if isinstance(classifier.llm, ReplayLLM):
+        print(f"\nReplay: {classifier.llm.stats()}")
+
+
+if __name__ == "__main__":
+    main()
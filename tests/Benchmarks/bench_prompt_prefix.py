@@ -0,0 +1,113 @@
+"""
+Prompt prefill cost with the static instructions first vs. last.
+
+Sends each pipeline prompt straight to Ollama's /api/generate twice per
+question: as the agents build it (static prefix, then schema and question)
+and with the same dynamic part moved in front of the instructions. No
+database is needed; the schema is a fixed sample.
+
+    python tests/Benchmarks/bench_prompt_prefix.py --ollama-url http://localhost:11434 --rounds 3
+
+Ollama reports prompt_eval_count as the prompt tokens it actually had to
+evaluate, so tokens served from its prefix cache do not count; the
+static-first layout should evaluate only the question-sized tail after the
+first call of each stage.
+"""
+import argparse
+import os
+import statistics
+import sys
+
+import httpx
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for path in (PROJECT_ROOT, os.path.join(PROJECT_ROOT, "backend")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from agents.data_handler import CREATE_PROMPT_PREFIX, DataHandler
+from agents.intent_classifier import CLASSIFICATION_PROMPT_PREFIX, IntentClassifier
+from agents.llm_backends import FakeLLM
+from agents.prompt_enhancer import ENHANCER_PROMPT_PREFIX, PromptEnhancer
+from agents.query_runner import SQL_PROMPT_PREFIX, QueryRunner
+from backend.core.config import settings
+
+QUESTIONS = [
+    "how much did I spend this month",
+    "what is my income",
+    "show my expenses by category",
+    "what business am I in",
+    "what did I spend the most on recently",
+    "add $25 for lunch today",
+]
+
+SCHEMA = """
+llm_transaction_summary: transaction_id, user_id, amount, category_name, category_kind, occurred_at, note
+llm_budget_overview: user_id, category_name, budget_amount, spent_amount, remaining_amount
+llm_user_profile: user_id, full_name, email, business_name, role
+"""
+
+
+def build_stages():
+    llm = FakeLLM()
+    enhancer = PromptEnhancer(llm=llm)
+    query_runner = QueryRunner(llm=llm, enhancer=enhancer)
+    data_handler = DataHandler(llm=llm, query_runner=query_runner)
+    classifier = IntentClassifier(llm=llm, query_runner=query_runner, data_handler=data_handler)
+    return {
+        "classify": (CLASSIFICATION_PROMPT_PREFIX, classifier._classification_prompt),
+        "enhance": (ENHANCER_PROMPT_PREFIX, lambda q: enhancer._build_prompt(q, SCHEMA)),
+        "sql_gen": (SQL_PROMPT_PREFIX, lambda q: query_runner._build_sql_prompt(q, SCHEMA)),
+        "create": (CREATE_PROMPT_PREFIX, data_handler._create_prompt),
+    }
+
+
+def dynamic_first(prefix: str, prompt: str) -> str:
+    """The same prompt with its dynamic tail moved ahead of the static instructions"""
+    return prompt[len(prefix):] + prefix
+
+
+def prefill(client: httpx.Client, model: str, prompt: str, keep_alive: str):
+    response = client.post("/api/generate", json={
+        "model": model,
+        "prompt": prompt,
+        "stream": False,
+        "keep_alive": keep_alive,
+        "options": {"num_predict": 1},
+    })
+    response.raise_for_status()
+    body = response.json()
+    return body.get("prompt_eval_count", 0), body.get("prompt_eval_duration", 0) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ollama-url", default="http://localhost:11434")
+    parser.add_argument("--model", default=settings.LLM_MODEL)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--keep-alive", default=settings.LLM_KEEP_ALIVE or "10m")
+    args = parser.parse_args()
+
+    stages = build_stages()
+    layouts = {
+        "static-first": lambda prefix, prompt: prompt,
+        "dynamic-first": dynamic_first,
+    }
+
+    print(f"{'stage':<10} {'layout':<14} {'n':>4} {'eval tokens':>12} {'p50 ms':>8} {'mean ms':>8}")
+    with httpx.Client(base_url=args.ollama_url, timeout=300) as client:
+        for stage, (prefix, build) in stages.items():
+            for layout, arrange in layouts.items():
+                tokens, durations = [], []
+                # Interleaving questions means a layout only benefits from what all of them share
+                for _ in range(args.rounds):
+                    for question in QUESTIONS:
+                        count, ms = prefill(client, args.model, arrange(prefix, build(question)), args.keep_alive)
+                        tokens.append(count)
+                        durations.append(ms)
+                print(f"{stage:<10} {layout:<14} {len(durations):>4} {statistics.fmean(tokens):>12.1f} "
+                      f"{statistics.median(durations):>8.1f} {statistics.fmean(durations):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()